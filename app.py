@@ -1,7 +1,9 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import asyncio
 import sys
+import time
 import traceback
 from datetime import datetime
 from http import HTTPStatus
@@ -15,8 +17,10 @@ from botbuilder.core.integration import aiohttp_error_middleware
 from botbuilder.integration.aiohttp import CloudAdapter, ConfigurationBotFrameworkAuthentication
 from botbuilder.schema import Activity, ActivityTypes
 
-from bots import EchoBot
+from bots import EchoBot, DiaryJobQueue
 from config import DefaultConfig
+from helpers import AsyncNotionHelpers, LLM_REGISTRY, PROMPT_STORE, METRICS, TRACER
+from helpers.telemetry import HTTP_LATENCY, HTTP_REQUESTS, QUEUE_DEPTH, TURNS_IN_FLIGHT, monitor_event_loop_lag
 
 CONFIG = DefaultConfig()
 
@@ -55,8 +59,13 @@ async def on_error(context: TurnContext, error: Exception):
 
 ADAPTER.on_turn_error = on_error
 
-# Create the Bot
-BOT = EchoBot()
+# Create the background job queue (job mode only) and the Bot
+JOB_QUEUE = (
+    DiaryJobQueue(ADAPTER, CONFIG.APP_ID, workers=CONFIG.DIARY_WORKERS, max_size=CONFIG.DIARY_QUEUE_SIZE)
+    if CONFIG.DIARY_JOB_MODE
+    else None
+)
+BOT = EchoBot(job_queue=JOB_QUEUE, streaming=CONFIG.DIARY_STREAMING)
 
 
 # Listen for incoming requests on /api/messages
@@ -64,9 +73,69 @@ async def messages(req: Request) -> Response:
     return await ADAPTER.process(req, BOT)
 
 
+# Prometheus scrape target
+async def metrics(req: Request) -> Response:
+    return Response(body=METRICS.render().encode("utf-8"),
+                    headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+if JOB_QUEUE is not None:
+    METRICS.add_collector(lambda: QUEUE_DEPTH.set(JOB_QUEUE.depth()))
+
+
+# Count, time and trace every request; a turn is every request on /api/messages
+@web.middleware
+async def telemetry_middleware(req: Request, handler):
+    resource = req.match_info.route.resource
+    route = resource.canonical if resource is not None else "unmatched"
+    is_turn = route == "/api/messages"
+    if is_turn:
+        TURNS_IN_FLIGHT.inc()
+    started = time.monotonic()
+    status = HTTPStatus.INTERNAL_SERVER_ERROR.value
+    try:
+        with TRACER.span("turn" if is_turn else f"{req.method} {route}", method=req.method, route=route):
+            response = await handler(req)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        if is_turn:
+            TURNS_IN_FLIGHT.dec()
+        HTTP_REQUESTS.inc(route=route, method=req.method, status=status)
+        HTTP_LATENCY.observe(time.monotonic() - started, route=route)
+
+
+
+LOOP_LAG_MONITOR = web.AppKey("loop_lag_monitor", asyncio.Task)
+
+
+# Open the shared Notion connection pool, load the prompts, build the LLM chains
+# and start the diary workers and the event loop lag monitor on startup, stop them
+# again on shutdown.
+async def on_startup(app: web.Application):
+    await AsyncNotionHelpers.open_session(pool_size=CONFIG.NOTION_POOL_SIZE)
+    PROMPT_STORE.load_all()
+    LLM_REGISTRY.warm_up()
+    if JOB_QUEUE is not None:
+        await JOB_QUEUE.start()
+    app[LOOP_LAG_MONITOR] = asyncio.create_task(monitor_event_loop_lag())
+
+
+async def on_cleanup(app: web.Application):
+    app[LOOP_LAG_MONITOR].cancel()
+    if JOB_QUEUE is not None:
+        await JOB_QUEUE.stop()
+    await AsyncNotionHelpers.close_session()
+
 
-APP = web.Application(middlewares=[aiohttp_error_middleware])
+APP = web.Application(middlewares=[telemetry_middleware, aiohttp_error_middleware])
 APP.router.add_post("/api/messages", messages)
+APP.router.add_get("/metrics", metrics)
+APP.on_startup.append(on_startup)
+APP.on_cleanup.append(on_cleanup)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,5 @@
+"""
+Benchmarks of the diary pipeline against local stand-ins for Notion and OpenAI.
+
+Run `python -m benchmarks.run --help` from the repository root.
+"""
@@ -0,0 +1,251 @@
+import asyncio
+import random
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _title(text: str) -> List[dict]:
+    return [{"type": "text", "text": {"content": text}, "plain_text": text}]
+
+
+class FakeNotion:
+    """
+    In-memory stand-in for the parts of the Notion API the bot uses.
+
+    Serves database queries (with "or"/"and", relation, title and last_edited_time
+    filters), page creation, retrieval and updates, and block children with the
+    same cursor pagination as Notion. Every response can be delayed, and requests
+    can be answered with 429 and a Retry-After header, either every n-th request
+    or at random, to exercise the client's rate limiting.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, max_page_size: int = 100,
+                 throttle_every: int = 0, throttle_rate: float = 0.0, retry_after: float = 0.1,
+                 projects: int = 20, tasks_per_project: int = 5, projects_database_id: str = "projects",
+                 tasks_database_id: str = "tasks", seed: int = 0):
+        """
+        Args:
+            latency (float): Seconds every response is delayed.
+            jitter (float): Maximum extra random delay in seconds.
+            max_page_size (int): Largest page returned by queries and block listings.
+            throttle_every (int): Answer every n-th request with 429, 0 disables it.
+            throttle_rate (float): Probability of answering a request with 429.
+            retry_after (float): Seconds sent in the Retry-After header of a 429.
+            projects (int): Number of projects seeded into the projects database.
+            tasks_per_project (int): Number of tasks seeded per project.
+            projects_database_id (str): ID of the projects database.
+            tasks_database_id (str): ID of the tasks database.
+            seed (int): Seed for the jitter and random throttling.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.max_page_size = max_page_size
+        self.throttle_every = throttle_every
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.projects_database_id = projects_database_id
+        self.tasks_database_id = tasks_database_id
+        self.random = random.Random(seed)
+        self.pages: Dict[str, dict] = {}
+        self.children: Dict[str, List[dict]] = {}
+        self.requests: Counter = Counter()
+        self.throttled = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self.seed(projects, tasks_per_project)
+
+    def seed(self, projects: int, tasks_per_project: int):
+        """ Adds projects with tasks, a short page body and a relation in both directions."""
+        for number in range(1, projects + 1):
+            project = self._add_page(
+                {"database_id": self.projects_database_id},
+                {
+                    "Project name": {"type": "title", "title": _title(f"Project {number}")},
+                    "Status": {"type": "status", "status": {"name": "In progress", "color": "blue"}},
+                    "Summary": {"type": "rich_text", "rich_text": _title(f"Summary of project {number}.")},
+                    "Tasks": {"type": "relation", "relation": []},
+                },
+                [{"object": "block", "type": "paragraph", "paragraph": {"rich_text": _title(f"Notes on project {number}.")}}],
+            )
+            for task_number in range(1, tasks_per_project + 1):
+                task = self._add_page(
+                    {"database_id": self.tasks_database_id},
+                    {
+                        "Task name": {"type": "title", "title": _title(f"Task {task_number} of project {number}")},
+                        "Status": {"type": "status", "status": {"name": "Not Started", "color": "default"}},
+                        "Project": {"type": "relation", "relation": [{"id": project["id"]}]},
+                    },
+                )
+                project["properties"]["Tasks"]["relation"].append({"id": task["id"]})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": sum(self.requests.values()), "throttled": self.throttled, "by_endpoint": dict(self.requests)}
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware], client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/v1/databases/{database_id}/query", self.query)
+        app.router.add_post("/v1/pages", self.create_page)
+        app.router.add_get("/v1/pages/{page_id}", self.get_page)
+        app.router.add_patch("/v1/pages/{page_id}", self.update_page)
+        app.router.add_get("/v1/blocks/{block_id}/children", self.get_children)
+        app.router.add_patch("/v1/blocks/{block_id}/children", self.append_children)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        with self._lock:
+            self._count += 1
+            self.requests[f"{request.method} {route}"] += 1
+            throttle = ((self.throttle_every and self._count % self.throttle_every == 0)
+                        or (self.throttle_rate and self.random.random() < self.throttle_rate))
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if throttle:
+                self.throttled += 1
+        if delay:
+            await asyncio.sleep(delay)
+        if throttle:
+            return web.json_response(
+                {"object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited."},
+                status=429, headers={"Retry-After": str(self.retry_after)},
+            )
+        return await handler(request)
+
+    async def query(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        database_id = request.match_info["database_id"]
+        rows = [page for page in self.pages.values()
+                if page["parent"].get("database_id") == database_id and _matches(page, body.get("filter"))]
+        return web.json_response(self._paginate(rows, body.get("page_size"), body.get("start_cursor")))
+
+    async def create_page(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        children = body.get("children") or []
+        if len(children) > 100:
+            return _validation_error("body.children.length should be ≤ `100`.")
+        properties = {name: _normalise_property(value) for name, value in (body.get("properties") or {}).items()}
+        page = self._add_page(body["parent"], properties, children)
+        self._link_back(page)
+        return web.json_response(page)
+
+    async def get_page(self, request: web.Request) -> web.Response:
+        page = self.pages.get(request.match_info["page_id"])
+        if page is None:
+            return _not_found()
+        return web.json_response(page)
+
+    async def update_page(self, request: web.Request) -> web.Response:
+        page = self.pages.get(request.match_info["page_id"])
+        if page is None:
+            return _not_found()
+        body = await request.json()
+        for name, value in (body.get("properties") or {}).items():
+            page["properties"][name] = _normalise_property(value)
+        if "archived" in body:
+            page["archived"] = bool(body["archived"])
+        page["last_edited_time"] = _now()
+        return web.json_response(page)
+
+    async def get_children(self, request: web.Request) -> web.Response:
+        block_id = request.match_info["block_id"]
+        if block_id not in self.children:
+            return _not_found()
+        return web.json_response(self._paginate(self.children[block_id], request.query.get("page_size"),
+                                                request.query.get("start_cursor")))
+
+    async def append_children(self, request: web.Request) -> web.Response:
+        block_id = request.match_info["block_id"]
+        if block_id not in self.children:
+            return _not_found()
+        children = (await request.json()).get("children") or []
+        if len(children) > 100:
+            return _validation_error("body.children.length should be ≤ `100`.")
+        blocks = [dict(block, id=str(uuid.uuid4())) for block in children]
+        self.children[block_id].extend(blocks)
+        if block_id in self.pages:
+            self.pages[block_id]["last_edited_time"] = _now()
+        return web.json_response({"object": "list", "results": blocks, "has_more": False, "next_cursor": None})
+
+    def _add_page(self, parent: dict, properties: dict, children: Optional[List[dict]] = None) -> dict:
+        now = _now()
+        page = {"object": "page", "id": str(uuid.uuid4()), "created_time": now, "last_edited_time": now,
+                "archived": False, "parent": parent, "properties": properties}
+        self.pages[page["id"]] = page
+        self.children[page["id"]] = [dict(block, id=str(uuid.uuid4())) for block in (children or [])]
+        return page
+
+    def _link_back(self, task: dict):
+        """ Adds a new task to the "Tasks" relation of its projects, as Notion's two-way relation does."""
+        for relation in task["properties"].get("Project", {}).get("relation", []):
+            project = self.pages.get(relation.get("id"))
+            if project is not None:
+                project["properties"].setdefault("Tasks", {"type": "relation", "relation": []})["relation"].append({"id": task["id"]})
+                project["last_edited_time"] = task["last_edited_time"]
+
+    def _paginate(self, items: List[dict], page_size: Any, start_cursor: Optional[str]) -> dict:
+        size = min(int(page_size or self.max_page_size), self.max_page_size)
+        start = int(start_cursor or 0)
+        chunk = items[start:start + size]
+        has_more = start + size < len(items)
+        return {"object": "list", "results": chunk, "has_more": has_more,
+                "next_cursor": str(start + size) if has_more else None}
+
+
+def _normalise_property(value: dict) -> dict:
+    """ Fills in the fields Notion adds to property values, e.g. plain_text of rich text."""
+    value = dict(value)
+    for key in ("title", "rich_text"):
+        if key in value:
+            value[key] = [dict(item, plain_text=item.get("text", {}).get("content", "")) for item in value[key] or []]
+            value["type"] = key
+    return value
+
+
+def _matches(page: dict, query_filter: Optional[dict]) -> bool:
+    if not query_filter:
+        return True
+    if "or" in query_filter:
+        return any(_matches(page, condition) for condition in query_filter["or"])
+    if "and" in query_filter:
+        return all(_matches(page, condition) for condition in query_filter["and"])
+    if query_filter.get("timestamp") in ("last_edited_time", "created_time"):
+        field = query_filter["timestamp"]
+        condition = query_filter[field]
+        if "on_or_after" in condition:
+            return page[field] >= condition["on_or_after"]
+        if "after" in condition:
+            return page[field] > condition["after"]
+        if "before" in condition:
+            return page[field] < condition["before"]
+        return True
+    value = page["properties"].get(query_filter.get("property"), {})
+    if "relation" in query_filter:
+        ids = [relation.get("id", "").replace("-", "") for relation in value.get("relation", [])]
+        return query_filter["relation"].get("contains", "").replace("-", "") in ids
+    for key in ("title", "rich_text"):
+        if key in query_filter:
+            text = "".join(item.get("plain_text", "") for item in value.get(key, []))
+            condition = query_filter[key]
+            if "equals" in condition:
+                return text == condition["equals"]
+            if "contains" in condition:
+                return condition["contains"].lower() in text.lower()
+    return True
+
+
+def _validation_error(message: str) -> web.Response:
+    return web.json_response({"object": "error", "status": 400, "code": "validation_error", "message": message}, status=400)
+
+
+def _not_found() -> web.Response:
+    return web.json_response({"object": "error", "status": 404, "code": "object_not_found", "message": "Not found."}, status=404)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Rough number of characters per token, used for the reported usage and the simulated generation speed
+CHARS_PER_TOKEN = 4
+# Tokens sent per streamed chunk
+STREAM_CHUNK_TOKENS = 16
+
+_PROJECT_LINE = re.compile(r"Project-Id: ([^,\n]+), Project-Name: ([^\n]+)")
+_BATCH_PROJECT_LINE = re.compile(r"^Project (\d+): (.+)$", re.MULTILINE)
+_PROJECT_NAME_LINE = re.compile(r"Project Name: ([^\n]+)")
+
+
+def _read(file_name: str) -> str:
+    with open(os.path.join(DATA_DIR, file_name), "r", encoding="utf-8") as file:
+        return file.read()
+
+
+class FakeOpenAI:
+    """
+    Stand-in for the OpenAI chat completions endpoint.
+
+    Text stages are answered with the example outputs in `data/`, structured stages
+    (tool calls) with projects and tasks derived from the prompt: the extraction picks
+    some of the listed existing projects and adds new ones, task identification returns
+    a few tasks per project. Responses take a fixed latency plus the time to "generate"
+    the completion at the given token rate, and are streamed in chunks when requested.
+    """
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, existing_projects: int = 2,
+                 new_projects: int = 1, tasks_per_project: int = 2, summary: Optional[str] = None,
+                 next_steps: Optional[str] = None, seed: int = 0):
+        """
+        Args:
+            latency (float): Seconds until the first token.
+            tokens_per_second (float): Simulated generation speed, 0 answers instantly.
+            existing_projects (int): Number of listed projects the extraction returns.
+            new_projects (int): Number of new projects the extraction returns.
+            tasks_per_project (int): Number of tasks returned per project.
+            summary (str, optional): Answer of the summary stages, defaults to data/example_output.md.
+            next_steps (str, optional): Answer of the next steps stage, defaults to data/example_next_steps_output.md.
+            seed (int): Seed for the choice of existing projects.
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.existing_projects = existing_projects
+        self.new_projects = new_projects
+        self.tasks_per_project = tasks_per_project
+        self.summary = summary if summary is not None else _read("example_output.md")
+        self.next_steps = next_steps if next_steps is not None else _read("example_next_steps_output.md")
+        self.random = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": sum(self.requests.values()), "by_stage": dict(self.requests),
+                    "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/chat/completions", self.chat_completions)
+        return app
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        prompt = "\n".join(
+            message["content"] if isinstance(message.get("content"), str) else json.dumps(message.get("content"))
+            for message in body.get("messages", [])
+        )
+        stage, content, tool_call = self.respond(prompt, body)
+        completion = content if tool_call is None else tool_call["function"]["arguments"]
+        usage = {
+            "prompt_tokens": len(prompt) // CHARS_PER_TOKEN,
+            "completion_tokens": max(1, len(completion) // CHARS_PER_TOKEN),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        with self._lock:
+            self.requests[stage] += 1
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        model = body.get("model", "gpt-4o")
+        if body.get("stream") and tool_call is None:
+            return await self._stream(request, model, content, usage)
+        if self.tokens_per_second:
+            await asyncio.sleep(usage["completion_tokens"] / self.tokens_per_second)
+        message = {"role": "assistant", "content": content}
+        if tool_call is not None:
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+        return web.json_response({
+            "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": usage,
+        })
+
+    def respond(self, prompt: str, body: dict):
+        """
+        Returns the stage name used in the statistics, the text answer and the tool call (or None).
+        """
+        tools = body.get("tools") or []
+        if tools:
+            name = tools[0]["function"]["name"]
+            if name == "ProjectOutputList":
+                arguments = {"items": self._projects(prompt)}
+            elif name == "ProjectTasksList":
+                arguments = {"items": [
+                    {"project_ref": int(ref), "project_name": project_name.strip(), "tasks": self._tasks(project_name.strip())}
+                    for ref, project_name in _BATCH_PROJECT_LINE.findall(prompt)
+                ]}
+            else:
+                match = _PROJECT_NAME_LINE.search(prompt)
+                arguments = {"items": self._tasks(match.group(1).strip() if match else "Project")}
+            tool_call = {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                         "function": {"name": name, "arguments": json.dumps(arguments)}}
+            return name, "", tool_call
+        if "Next Steps" in prompt:
+            return "next_steps", self.next_steps, None
+        return "summary", self.summary, None
+
+    def _projects(self, prompt: str) -> List[dict]:
+        listed = _PROJECT_LINE.findall(prompt)
+        with self._lock:
+            chosen = self.random.sample(listed, min(self.existing_projects, len(listed)))
+        projects = [{"project_id": project_id.strip(), "project_name": project_name.strip(),
+                     "summary": "Mentioned in the diary.", "new_project": False} for project_id, project_name in chosen]
+        projects.extend({"project_id": None, "project_name": f"New project {number}",
+                         "summary": "A project first mentioned in this diary.", "new_project": True}
+                        for number in range(1, self.new_projects + 1))
+        return projects
+
+    def _tasks(self, project_name: str) -> List[dict]:
+        return [{"project_name": project_name, "task_name": f"Diary task {number} of {project_name}",
+                 "status": "Not Started", "due_date": None, "new_task": True}
+                for number in range(1, self.tasks_per_project + 1)]
+
+    async def _stream(self, request: web.Request, model: str, content: str, usage: dict) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        async def send(delta: dict, finish_reason=None, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        step = STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+        for start in range(0, len(content), step):
+            await send({"content": content[start:start + step]})
+            if self.tokens_per_second:
+                await asyncio.sleep(STREAM_CHUNK_TOKENS / self.tokens_per_second)
+        await send({}, "stop")
+        # Sent because the client asks for stream usage
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [], "usage": usage}
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,351 @@
+"""
+Load test of one bot server process with simulated concurrent users.
+
+Starts the stand-in Notion and OpenAI servers, a stand-in Bot Connector that receives
+the bot's replies, and the bot itself as a separate process (gunicorn with the aiohttp
+worker, as deployed, or plain aiohttp) with authentication disabled. Every simulated
+user then posts Bot Framework message activities built from the diary fixture to
+/api/messages, one after the other, each waiting for the final reply.
+
+Reports the latency distribution until the HTTP response and until the final reply,
+the error rate, throughput, and the bot's event loop lag (from its /metrics). The
+--mode option compares the synchronous pipeline with the streaming and queued modes:
+
+    python -m benchmarks.load --users 20 --diaries 2 --mode sync
+    python -m benchmarks.load --users 20 --diaries 2 --mode queued
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from .fake_notion import FakeNotion
+from .fake_openai import FakeOpenAI
+from .run import DIARY_DATABASE_ID, PROJECTS_DATABASE_ID, REPO_DIR, TASKS_DATABASE_ID
+from .server import BackgroundServer
+
+# Environment of the bot process per mode
+MODES = {
+    "sync": {"DiaryJobMode": "false", "DiaryStreaming": "false"},
+    "streaming": {"DiaryJobMode": "false", "DiaryStreaming": "true"},
+    "queued": {"DiaryJobMode": "true", "DiaryStreaming": "false"},
+    "queued-streaming": {"DiaryJobMode": "true", "DiaryStreaming": "true"},
+}
+
+# Beginnings of the replies that end a diary, see EchoBot and AsyncNotionHelpers
+FINAL_REPLIES = ("Page created successfully.",)
+FAILED_REPLIES = (
+    "Failed to create page.",
+    "Page created, but",
+    "An error occurred",
+    "Too many diary entries",
+    "The bot encountered an error",
+)
+
+PERCENTILES = (50, 90, 95, 99)
+
+_BUCKET_LINE = re.compile(r'^bot_event_loop_lag_seconds_bucket\{le="([^"]+)"\} ([0-9.e+]+)$', re.MULTILINE)
+
+
+class FakeConnector:
+    """
+    Stand-in for the Bot Connector service the bot posts its replies to.
+
+    Records every reply per conversation and resolves the future of a conversation
+    once its final (or a failure) reply arrives.
+    """
+
+    def __init__(self):
+        self.replies: Dict[str, List[dict]] = {}
+        self._waiting: Dict[str, asyncio.Future] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities", self.activity)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities/{activity_id}", self.activity)
+        return app
+
+    def expect(self, conversation_id: str) -> asyncio.Future:
+        """ Returns a future resolved with (ok, text) by the next final reply to the conversation."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[conversation_id] = future
+        return future
+
+    async def activity(self, request: web.Request) -> web.Response:
+        conversation_id = request.match_info["conversation_id"]
+        activity = await request.json()
+        self.replies.setdefault(conversation_id, []).append(
+            {"time": time.monotonic(), "type": activity.get("type"), "text": activity.get("text")}
+        )
+        text = activity.get("text") or ""
+        if activity.get("type") == "message":
+            ok = text.startswith(FINAL_REPLIES)
+            if ok or text.startswith(FAILED_REPLIES):
+                future = self._waiting.pop(conversation_id, None)
+                if future is not None and not future.done():
+                    future.set_result((ok, text))
+        return web.json_response({"id": uuid.uuid4().hex})
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="Concurrent conversations.")
+    parser.add_argument("--diaries", type=int, default=1, help="Diaries each user sends, one after the other.")
+    parser.add_argument("--mode", choices=tuple(MODES), default="sync", help="How the bot processes diaries.")
+    parser.add_argument("--server", choices=("gunicorn", "aiohttp"), default="gunicorn",
+                        help="Run the bot under gunicorn's aiohttp worker or with aiohttp's own runner.")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes.")
+    parser.add_argument("--diary", default=os.path.join(REPO_DIR, "data", "example_input.md"), help="Diary fixture.")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for the final reply of a diary.")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds over which the users start.")
+    parser.add_argument("--notion-latency", type=float, default=0.05, help="Seconds per Notion response.")
+    parser.add_argument("--notion-429-rate", type=float, default=0.0, help="Probability of a 429 per Notion request.")
+    parser.add_argument("--notion-rate-limit", type=float, default=None,
+                        help="Client-side Notion requests per second (NotionRateLimit), defaults to the bot's setting.")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="Seconds until the first token.")
+    parser.add_argument("--openai-tps", type=float, default=0.0, help="Simulated tokens per second, 0 is instant.")
+    parser.add_argument("--bot-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment variable for the bot process, e.g. DiaryWorkers=8.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the result to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot process output.")
+    return parser.parse_args(argv)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_bot(args: argparse.Namespace, port: int, notion_url: str, openai_url: str) -> subprocess.Popen:
+    """ Starts the bot server process pointed at the stand-ins, with authentication disabled."""
+    env = dict(os.environ)
+    env.update({
+        "MicrosoftAppId": "",
+        "MicrosoftAppPassword": "",
+        "NotionAPIKey": "benchmark",
+        "NotionDatabaseId": DIARY_DATABASE_ID,
+        "ProjectsDatabaseId": PROJECTS_DATABASE_ID,
+        "TasksDatabaseId": TASKS_DATABASE_ID,
+        "OpenAIKey": "benchmark",
+        "NotionApiUrl": f"{notion_url}/v1",
+        "OpenAIBaseUrl": f"{openai_url}/v1",
+        "LLMCache": "false",
+        # The stand-in starts empty on every run, a mirror from an earlier run would not match it
+        "NotionMirrorPath": ":memory:",
+        **MODES[args.mode],
+    })
+    if args.notion_rate_limit is not None:
+        env["NotionRateLimit"] = str(args.notion_rate_limit)
+    for assignment in args.bot_env:
+        name, _, value = assignment.partition("=")
+        env[name] = value
+
+    if args.server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "app:APP", "--worker-class", "aiohttp.worker.GunicornWebWorker",
+                   "--workers", str(args.workers), "--bind", f"127.0.0.1:{port}", "--timeout", str(int(args.timeout))]
+    else:
+        command = [sys.executable, "-c",
+                   f"from aiohttp import web; import app; web.run_app(app.APP, host='127.0.0.1', port={port}, print=None)"]
+    output = None if args.verbose else subprocess.DEVNULL
+    return subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=output, stderr=output)
+
+
+async def wait_until_ready(session: aiohttp.ClientSession, bot_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Bot process exited with code {process.returncode}, rerun with --verbose.")
+        try:
+            async with session.get(f"{bot_url}/metrics") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Bot did not start within {timeout:.0f}s.")
+
+
+async def scrape_loop_lag(session: aiohttp.ClientSession, bot_url: str) -> Dict[float, float]:
+    """ Returns the cumulative bucket counts of the bot's event loop lag histogram."""
+    async with session.get(f"{bot_url}/metrics") as response:
+        text = await response.text()
+    return {float(le): float(count) for le, count in _BUCKET_LINE.findall(text)}
+
+
+def lag_percentiles(before: Dict[float, float], after: Dict[float, float]) -> Dict[str, Any]:
+    """ Percentiles of the lag observed between two scrapes, as the upper bound of their bucket."""
+    bounds = sorted(after)
+    counts = [after[bound] - before.get(bound, 0.0) for bound in bounds]
+    total = counts[-1] if counts else 0
+    result: Dict[str, Any] = {"samples": int(total)}
+    for percentile in PERCENTILES:
+        rank = percentile / 100 * total
+        bound = next((bound for bound, count in zip(bounds, counts) if total and count >= rank), None)
+        result[f"p{percentile}"] = bound
+    return result
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f"p{p}": round(ordered[max(0, -(-p * len(ordered) // 100) - 1)], 3) for p in PERCENTILES}
+    result["max"] = round(ordered[-1], 3)
+    return result
+
+
+def build_activity(conversation_id: str, user: int, text: str, connector_url: str) -> dict:
+    return {
+        "type": "message",
+        "id": uuid.uuid4().hex,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "channelId": "loadtest",
+        "serviceUrl": connector_url,
+        "from": {"id": f"user-{user}", "name": f"User {user}"},
+        "conversation": {"id": conversation_id},
+        "recipient": {"id": "bot", "name": "Bot"},
+        "text": text,
+    }
+
+
+async def simulate_user(user: int, args: argparse.Namespace, session: aiohttp.ClientSession, bot_url: str,
+                        connector: FakeConnector, connector_url: str, diary: str, samples: List[dict]):
+    if args.ramp_up:
+        await asyncio.sleep(args.ramp_up * user / max(1, args.users))
+    conversation_id = f"load-{user}-{uuid.uuid4().hex[:8]}"
+    for _ in range(args.diaries):
+        sample = {"user": user, "ok": False, "status": None, "http_latency": None, "latency": None, "error": None}
+        final = connector.expect(conversation_id)
+        started = time.monotonic()
+        try:
+            async with session.post(f"{bot_url}/api/messages",
+                                    json=build_activity(conversation_id, user, diary, connector_url)) as response:
+                await response.read()
+                sample["status"] = response.status
+            sample["http_latency"] = time.monotonic() - started
+            if sample["status"] >= 400:
+                sample["error"] = f"HTTP {sample['status']}"
+            else:
+                ok, text = await asyncio.wait_for(final, timeout=max(0.0, args.timeout - sample["http_latency"]))
+                sample["latency"] = time.monotonic() - started
+                sample["ok"] = ok
+                if not ok:
+                    sample["error"] = text.splitlines()[0][:80]
+        except asyncio.TimeoutError:
+            sample["error"] = "timeout"
+        except aiohttp.ClientError as e:
+            sample["error"] = type(e).__name__
+        samples.append(sample)
+
+
+async def run_load(args: argparse.Namespace, diary: str, notion_url: str, openai_url: str) -> Dict[str, Any]:
+    connector = FakeConnector()
+    runner = web.AppRunner(connector.app(), access_log=None)
+    await runner.setup()
+    connector_port = _free_port()
+    await web.TCPSite(runner, "127.0.0.1", connector_port).start()
+    connector_url = f"http://127.0.0.1:{connector_port}"
+
+    bot_port = _free_port()
+    bot_url = f"http://127.0.0.1:{bot_port}"
+    process = start_bot(args, bot_port, notion_url, openai_url)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector_limit = aiohttp.TCPConnector(limit=0)
+    samples: List[dict] = []
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector_limit) as session:
+            await wait_until_ready(session, bot_url, process)
+            lag_before = await scrape_loop_lag(session, bot_url)
+            started = time.monotonic()
+            await asyncio.gather(*(
+                simulate_user(user, args, session, bot_url, connector, connector_url, diary, samples)
+                for user in range(args.users)
+            ))
+            wall_time = time.monotonic() - started
+            lag_after = await scrape_loop_lag(session, bot_url)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await runner.cleanup()
+
+    errors: Dict[str, int] = {}
+    for sample in samples:
+        if not sample["ok"]:
+            errors[sample["error"] or "unknown"] = errors.get(sample["error"] or "unknown", 0) + 1
+    completed = [sample for sample in samples if sample["ok"]]
+    return {
+        "wall_time": wall_time,
+        "diaries": len(samples),
+        "completed": len(completed),
+        "errors": errors,
+        "http_latency": percentiles([sample["http_latency"] for sample in samples if sample["http_latency"] is not None]),
+        "latency": percentiles([sample["latency"] for sample in completed]),
+        "event_loop_lag": lag_percentiles(lag_before, lag_after),
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    config = result["config"]
+    print(f"Mode {config['mode']} on {config['server']} ({config['workers']} worker(s)), {config['users']} users x "
+          f"{config['diaries']} diaries: {result['completed']}/{result['diaries']} completed in {result['wall_time']:.2f}s, "
+          f"{result['diaries_per_second']:.3f} diaries/s, error rate {result['error_rate']:.1%}")
+    for name, count in sorted(result["errors"].items(), key=lambda item: -item[1]):
+        print(f"  {count} x {name}")
+    print(f"{'':<22}" + "".join(f"{key:>10}" for key in (*(f"p{p}" for p in PERCENTILES), "max")))
+    for label, key in (("HTTP response (s)", "http_latency"), ("final reply (s)", "latency")):
+        values = result[key]
+        print(f"{label:<22}" + "".join(f"{values.get(column, float('nan')):>10.3f}"
+                                      for column in (*(f"p{p}" for p in PERCENTILES), "max")))
+    lag = result["event_loop_lag"]
+    print(f"{'event loop lag (s) <=':<22}" + "".join(
+        f"{lag[f'p{p}']:>10}" if lag.get(f"p{p}") is not None else f"{'-':>10}" for p in PERCENTILES
+    ) + f"   ({lag['samples']} samples)")
+    if config["workers"] > 1:
+        print("  The event loop lag is that of the worker that answered the /metrics scrapes.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    with open(args.diary, "r", encoding="utf-8") as file:
+        diary = file.read()
+
+    fake_notion = FakeNotion(latency=args.notion_latency, throttle_rate=args.notion_429_rate,
+                             projects_database_id=PROJECTS_DATABASE_ID, tasks_database_id=TASKS_DATABASE_ID)
+    fake_openai = FakeOpenAI(latency=args.openai_latency, tokens_per_second=args.openai_tps)
+    with BackgroundServer(fake_notion.app()) as notion, BackgroundServer(fake_openai.app()) as openai:
+        run = asyncio.run(run_load(args, diary, notion.url, openai.url))
+
+    result = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json_path", "verbose")},
+        **run,
+        "diaries_per_second": round(run["completed"] / run["wall_time"], 4) if run["wall_time"] else 0.0,
+        "error_rate": (run["diaries"] - run["completed"]) / run["diaries"] if run["diaries"] else 0.0,
+        "notion": fake_notion.stats(),
+        "openai": fake_openai.stats(),
+    }
+    print_report(result)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+    return 0 if result["completed"] == result["diaries"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
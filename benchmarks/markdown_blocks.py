@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the Markdown to Notion block converter.
+
+Converts the example outputs in data/ as a whole, as a stream of small chunks (as
+streamed LLM output arrives) and repeated up to 100 times to check that the time
+grows linearly with the input:
+
+    python -m benchmarks.markdown_blocks
+"""
+import argparse
+import os
+import sys
+import timeit
+from typing import List, Optional
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from helpers.markdown_blocks import iter_notion_blocks  # noqa: E402
+
+FIXTURES = ("example_output.md", "example_next_steps_output.md")
+# Characters per chunk of the streamed input, roughly four tokens
+STREAM_CHUNK_CHARS = 16
+
+
+def measure(function, min_time: float) -> float:
+    """ Seconds per call, the best of three runs of at least `min_time` seconds each."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timing run.")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100], help="Repetitions of each fixture.")
+    args = parser.parse_args(argv)
+
+    print(f"{'fixture':<32}{'input':>8}{'chars':>10}{'blocks':>8}{'ms':>10}{'MB/s':>8}{'us/block':>10}")
+    for fixture in FIXTURES:
+        with open(os.path.join(REPO_DIR, "data", fixture), "r", encoding="utf-8") as file:
+            text = file.read()
+        for scale in args.scale:
+            document = "\n\n".join([text] * scale)
+            chunks = [document[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(document), STREAM_CHUNK_CHARS)]
+            blocks = sum(1 for _ in iter_notion_blocks(document))
+            for label, source in (("text", document), ("stream", chunks)):
+                seconds = measure(lambda: sum(1 for _ in iter_notion_blocks(source)), args.min_time)
+                print(f"{fixture + ' x' + str(scale):<32}{label:>8}{len(document):>10}{blocks:>8}"
+                      f"{seconds * 1000:>10.3f}{len(document.encode('utf-8')) / seconds / 1e6:>8.1f}"
+                      f"{seconds / blocks * 1e6:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
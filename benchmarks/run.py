@@ -0,0 +1,267 @@
+"""
+End-to-end benchmark of the diary pipeline against local stand-ins for Notion and OpenAI.
+
+Starts `FakeNotion` and `FakeOpenAI` on free local ports, points the helpers at them
+through the NotionApiUrl and OpenAIBaseUrl environment variables and processes the
+diary fixture a number of times, either through `EchoBot` (scenario "bot") or only
+through `ProManHelpers.generate_projects_and_tasks_in_notion` (scenario "projects").
+Reports diaries per second and per-stage percentiles from DIARY_METRICS, and compares
+them with a stored baseline so regressions fail the run:
+
+    python -m benchmarks.run --scenario bot --diaries 20 --concurrency 4
+    python -m benchmarks.run --scenario bot --diaries 20 --concurrency 4 --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .fake_notion import FakeNotion
+from .fake_openai import FakeOpenAI
+from .server import BackgroundServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+PROJECTS_DATABASE_ID = "bench-projects"
+TASKS_DATABASE_ID = "bench-tasks"
+DIARY_DATABASE_ID = "bench-diaries"
+
+# Latency percentiles may grow by this many seconds on top of the relative tolerance
+LATENCY_SLACK = 0.05
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", choices=("bot", "projects"), default="bot",
+                        help="Drive the whole EchoBot turn or only the project and task stage.")
+    parser.add_argument("--diaries", type=int, default=10, help="Number of diaries to process.")
+    parser.add_argument("--concurrency", type=int, default=2, help="Diaries processed at the same time.")
+    parser.add_argument("--diary", default=os.path.join(REPO_DIR, "data", "example_input.md"), help="Diary fixture.")
+    parser.add_argument("--streaming", action="store_true", help="Run EchoBot in streaming mode.")
+    parser.add_argument("--notion-latency", type=float, default=0.05, help="Seconds per Notion response.")
+    parser.add_argument("--notion-page-size", type=int, default=100, help="Largest page the fake Notion returns.")
+    parser.add_argument("--notion-429-every", type=int, default=0, help="Answer every n-th Notion request with 429.")
+    parser.add_argument("--notion-429-rate", type=float, default=0.0, help="Probability of a 429 per Notion request.")
+    parser.add_argument("--notion-rate-limit", type=float, default=None,
+                        help="Client-side Notion requests per second (NotionRateLimit), defaults to the bot's setting.")
+    parser.add_argument("--projects", type=int, default=20, help="Projects seeded into the fake Notion.")
+    parser.add_argument("--tasks-per-project", type=int, default=5, help="Tasks seeded per project.")
+    parser.add_argument("--openai-latency", type=float, default=0.2, help="Seconds until the first token.")
+    parser.add_argument("--openai-tps", type=float, default=0.0, help="Simulated tokens per second, 0 is instant.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=None, help="Baseline file, defaults to benchmarks/baselines/<scenario>.json.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the result as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression against the baseline.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the result to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the bot's INFO and DEBUG logging.")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, notion: BackgroundServer, openai: BackgroundServer):
+    """ Points the helpers at the stand-ins; has to run before they are imported."""
+    os.environ.update({
+        "NotionAPIKey": "benchmark",
+        "NotionDatabaseId": DIARY_DATABASE_ID,
+        "ProjectsDatabaseId": PROJECTS_DATABASE_ID,
+        "TasksDatabaseId": TASKS_DATABASE_ID,
+        "OpenAIKey": "benchmark",
+        "NotionApiUrl": f"{notion.url}/v1",
+        "OpenAIBaseUrl": f"{openai.url}/v1",
+        # Every diary has to reach the stand-ins, a warm response cache would measure nothing
+        "LLMCache": "false",
+        # The stand-in starts empty on every run, a mirror from an earlier run would not match it
+        "NotionMirrorPath": ":memory:",
+    })
+    if args.notion_rate_limit is not None:
+        os.environ["NotionRateLimit"] = str(args.notion_rate_limit)
+
+
+async def run_diaries(args: argparse.Namespace, diary: str) -> Dict[str, Any]:
+    """ Processes the diary `args.diaries` times, `args.concurrency` at a time."""
+    from botbuilder.core.adapters import TestAdapter
+    from botbuilder.schema import Activity, ActivityTypes
+
+    from bots import EchoBot
+    from helpers import AsyncNotionHelpers, DIARY_METRICS, LLM_REGISTRY, PROMPT_STORE, ProManHelpers
+
+    await AsyncNotionHelpers.open_session()
+    PROMPT_STORE.load_all()
+    LLM_REGISTRY.warm_up()
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+    errors = 0
+
+    if args.scenario == "bot":
+        bot = EchoBot(streaming=args.streaming)
+        adapter = TestAdapter()
+
+        async def process():
+            await adapter.process_activity(Activity(type=ActivityTypes.message, text=diary), bot.on_turn)
+    else:
+        notion_helper = AsyncNotionHelpers()
+        pm_helpers = ProManHelpers()
+
+        async def process():
+            with DIARY_METRICS.diary(), DIARY_METRICS.stage("projects"):
+                await pm_helpers.generate_projects_and_tasks_in_notion(notion_helper, diary)
+
+    async def limited():
+        nonlocal errors
+        async with semaphore:
+            try:
+                await process()
+            except Exception as e:
+                errors += 1
+                logging.getLogger(__name__).error(f"Diary failed: {e}", exc_info=True)
+
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(limited() for _ in range(args.diaries)))
+    finally:
+        await AsyncNotionHelpers.close_session()
+    wall_time = time.monotonic() - started
+
+    if args.scenario == "bot":
+        # EchoBot answers failures with an error message instead of raising
+        errors += sum(1 for activity in adapter.activity_buffer
+                      if activity.type == ActivityTypes.message and "error occurred" in (activity.text or ""))
+    return {"wall_time": wall_time, "errors": errors, "summary": DIARY_METRICS.summary()}
+
+
+def build_result(args: argparse.Namespace, run: Dict[str, Any], notion: FakeNotion, openai: FakeOpenAI) -> Dict[str, Any]:
+    stages = {}
+    for name, stats in run["summary"]["stages"].items():
+        stages[name] = {
+            "samples": stats["samples"],
+            "latency_p50": round(stats["wall_time"]["p50"], 4),
+            "latency_p95": round(stats["wall_time"]["p95"], 4),
+            "llm_calls_p50": stats["llm_calls"]["p50"],
+            "notion_requests_p50": stats["notion_requests"]["p50"],
+        }
+    return {
+        "scenario": args.scenario,
+        "config": {
+            "diaries": args.diaries,
+            "concurrency": args.concurrency,
+            "streaming": args.streaming,
+            "diary": os.path.relpath(args.diary, REPO_DIR),
+            "notion_latency": args.notion_latency,
+            "notion_page_size": args.notion_page_size,
+            "notion_429_every": args.notion_429_every,
+            "notion_429_rate": args.notion_429_rate,
+            "notion_rate_limit": args.notion_rate_limit,
+            "projects": args.projects,
+            "tasks_per_project": args.tasks_per_project,
+            "openai_latency": args.openai_latency,
+            "openai_tps": args.openai_tps,
+            "seed": args.seed,
+        },
+        "diaries": args.diaries,
+        "errors": run["errors"],
+        "wall_time": round(run["wall_time"], 3),
+        "diaries_per_second": round(args.diaries / run["wall_time"], 4) if run["wall_time"] else 0.0,
+        "stages": stages,
+        "notion": notion.stats(),
+        "openai": openai.stats(),
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Returns the regressions of a result against a baseline: lower throughput, higher
+    stage latency (beyond the tolerance) and more LLM calls or Notion requests per diary.
+    """
+    regressions = []
+    if result["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors: {result['errors']} > {baseline.get('errors', 0)}")
+    minimum = baseline["diaries_per_second"] * (1 - tolerance)
+    if result["diaries_per_second"] < minimum:
+        regressions.append(f"diaries/s: {result['diaries_per_second']:.3f} < {minimum:.3f} "
+                           f"(baseline {baseline['diaries_per_second']:.3f})")
+    for name, stage in baseline.get("stages", {}).items():
+        current = result["stages"].get(name)
+        if current is None:
+            continue
+        limit = stage["latency_p95"] * (1 + tolerance) + LATENCY_SLACK
+        if current["latency_p95"] > limit:
+            regressions.append(f"{name} p95: {current['latency_p95']:.3f}s > {limit:.3f}s "
+                               f"(baseline {stage['latency_p95']:.3f}s)")
+        for metric in ("llm_calls_p50", "notion_requests_p50"):
+            if current[metric] > stage[metric]:
+                regressions.append(f"{name} {metric}: {current[metric]} > {stage[metric]}")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"Scenario {result['scenario']}: {result['diaries']} diaries in {result['wall_time']:.2f}s, "
+          f"{result['diaries_per_second']:.3f} diaries/s, {result['errors']} errors")
+    print(f"Notion: {result['notion']['requests']} requests, {result['notion']['throttled']} answered with 429; "
+          f"OpenAI: {result['openai']['requests']} requests")
+    print(f"{'stage':<20}{'samples':>8}{'p50 s':>10}{'p95 s':>10}{'llm':>6}{'notion':>8}")
+    # Fastest stages first, the diary total last
+    for name, stage in sorted(result["stages"].items(), key=lambda item: (item[0] == "total", item[1]["latency_p50"])):
+        print(f"{name:<20}{stage['samples']:>8}{stage['latency_p50']:>10.3f}{stage['latency_p95']:>10.3f}"
+              f"{stage['llm_calls_p50']:>6}{stage['notion_requests_p50']:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    with open(args.diary, "r", encoding="utf-8") as file:
+        diary = file.read()
+
+    fake_notion = FakeNotion(
+        latency=args.notion_latency, max_page_size=args.notion_page_size, throttle_every=args.notion_429_every,
+        throttle_rate=args.notion_429_rate, projects=args.projects, tasks_per_project=args.tasks_per_project,
+        projects_database_id=PROJECTS_DATABASE_ID, tasks_database_id=TASKS_DATABASE_ID, seed=args.seed,
+    )
+    fake_openai = FakeOpenAI(latency=args.openai_latency, tokens_per_second=args.openai_tps, seed=args.seed)
+    with BackgroundServer(fake_notion.app()) as notion, BackgroundServer(fake_openai.app()) as openai:
+        configure_environment(args, notion, openai)
+        if REPO_DIR not in sys.path:
+            sys.path.insert(0, REPO_DIR)
+        run = asyncio.run(run_diaries(args, diary))
+    result = build_result(args, run, fake_notion, fake_openai)
+    print_report(result)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.scenario}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+            file.write("\n")
+        print(f"Saved baseline {os.path.relpath(baseline_path)}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {os.path.relpath(baseline_path)}, run with --save-baseline to create one.")
+        return 0
+
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("config") != result["config"]:
+        print("The baseline was recorded with a different configuration, not comparing:")
+        for key in sorted(set(baseline.get("config", {})) | set(result["config"])):
+            if baseline.get("config", {}).get(key) != result["config"].get(key):
+                print(f"  {key}: {baseline.get('config', {}).get(key)!r} -> {result['config'].get(key)!r}")
+        return 2
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressions against {os.path.relpath(baseline_path)}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"No regressions against {os.path.relpath(baseline_path)} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
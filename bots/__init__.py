@@ -2,5 +2,7 @@
 # Licensed under the MIT License.
 
 from .echo_bot import EchoBot
+from .diary_jobs import DiaryJobQueue
+from .activity_dedup import ActivityDeduplicator
 
-__all__ = ["EchoBot"]
\ No newline at end of file
+__all__ = ["EchoBot", "DiaryJobQueue", "ActivityDeduplicator"]
\ No newline at end of file
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from botbuilder.schema import Activity
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Number of activities remembered and for how many seconds
+ACTIVITY_DEDUP_SIZE = int(os.getenv("ActivityDedupSize", "1000"))
+ACTIVITY_DEDUP_TTL = float(os.getenv("ActivityDedupTTL", "3600"))
+# Seconds a duplicate delivery waits for the first one before giving up
+ACTIVITY_DEDUP_WAIT = float(os.getenv("ActivityDedupWait", "600"))
+
+
+class ActivityDeduplicator:
+    """
+    Runs the work of an activity once, even if the channel redelivers it.
+
+    Activities are keyed by conversation ID and activity ID. The first delivery
+    claims the key and its result is stored in a future; a redelivery that
+    arrives while the work is still running awaits the same future, and one that
+    arrives later gets the stored result. Failed work is forgotten, so a
+    redelivery after an error or a cancellation runs again. The store is bounded
+    by size and age.
+    """
+
+    def __init__(self, max_size: int = ACTIVITY_DEDUP_SIZE, ttl: float = ACTIVITY_DEDUP_TTL,
+                 wait: float = ACTIVITY_DEDUP_WAIT):
+        """
+        Args:
+            max_size (int): Maximum number of remembered activities, the oldest are dropped first.
+            ttl (float): Seconds an activity is remembered after it was first seen.
+            wait (float): Seconds a duplicate delivery waits for the result of the first one.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.wait = wait
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, asyncio.Future]]" = OrderedDict()
+
+    @staticmethod
+    def key(activity: Activity) -> Optional[Tuple[str, str]]:
+        """ Returns the dedup key of an activity, or None if it carries no IDs."""
+        conversation_id = activity.conversation.id if activity.conversation else None
+        if not conversation_id or not activity.id:
+            return None
+        return conversation_id, activity.id
+
+    def claim(self, key: Tuple[str, str]) -> Optional[asyncio.Future]:
+        """
+        Claims a key for the caller.
+
+        Returns:
+            Future: None if the key was free and is now claimed by the caller, who must
+                `resolve` or `discard` it. Otherwise the future of the first delivery.
+        """
+        self._evict()
+        entry = self._entries.get(key)
+        if entry is not None:
+            logger.info(f"Duplicate delivery of activity {key[1]} in conversation {key[0]}.")
+            return entry[1]
+        self._entries[key] = (time.monotonic(), asyncio.get_running_loop().create_future())
+        return None
+
+    async def resolve(self, key: Tuple[str, str], work: Awaitable[Any]) -> Any:
+        """
+        Runs the work of a claimed key and stores its result for duplicates.
+
+        Raises:
+            Exception: The error of the work, after the key was released.
+            asyncio.CancelledError: If the work was cancelled, the key is released and
+                the stored future cancelled, so a redelivery runs the work again.
+        """
+        entry = self._entries.get(key)
+        future = entry[1] if entry is not None else None
+        try:
+            result = await work
+        except asyncio.CancelledError:
+            self.discard(key)
+            if future is not None:
+                future.cancel()
+            raise
+        except Exception as e:
+            self.discard(key)
+            if future is not None and not future.done():
+                future.set_exception(e)
+                # Mark the error as retrieved, waiting duplicates still receive it
+                future.exception()
+            raise
+        if future is not None and not future.done():
+            future.set_result(result)
+        return result
+
+    async def run(self, key: Optional[Tuple[str, str]], factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `factory()` once per key and returns its result to every delivery.
+
+        Args:
+            key (tuple, optional): The activity key, None runs the work without dedup.
+            factory (callable): Coroutine function that does the work.
+
+        Raises:
+            asyncio.TimeoutError: A duplicate waited longer than `wait` seconds for the first delivery.
+        """
+        if key is None:
+            return await factory()
+        existing = self.claim(key)
+        if existing is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(existing), self.wait)
+            except asyncio.CancelledError:
+                if not existing.cancelled():
+                    raise
+                # The first delivery was cancelled and released the key, run the work here instead
+                return await self.run(key, factory)
+        return await self.resolve(key, factory())
+
+    def discard(self, key: Tuple[str, str]):
+        """ Forgets a key, e.g. when its work could not be started."""
+        self._entries.pop(key, None)
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, (created, _) = next(iter(self._entries.items()))
+            if created >= cutoff and len(self._entries) < self.max_size:
+                break
+            self._entries.popitem(last=False)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Union
+
+from botbuilder.core import BotAdapter, MessageFactory, TurnContext
+from botbuilder.schema import Activity, ConversationReference
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DiaryJob:
+    """ A diary entry waiting to be processed outside of its turn."""
+    reference: ConversationReference
+    raw_diary: str
+    handler: Callable[[str], Awaitable[str]]
+
+
+class DiaryJobQueue:
+    """
+    In-process worker pool for diary processing.
+
+    A turn only enqueues the diary and returns. A worker then runs the job
+    and posts the result back to the conversation via
+    `adapter.continue_conversation` using the stored conversation reference.
+    """
+
+    def __init__(self, adapter: BotAdapter, app_id: str, workers: int = 4, max_size: int = 100):
+        """
+        Args:
+            adapter (BotAdapter): The adapter used to send proactive replies.
+            app_id (str): The bot's Microsoft App ID.
+            workers (int): Number of diaries processed at the same time.
+            max_size (int): Maximum number of waiting diaries before new ones are rejected.
+        """
+        self.adapter = adapter
+        self.app_id = app_id
+        self.workers = workers
+        self.queue: "asyncio.Queue[DiaryJob]" = asyncio.Queue(maxsize=max_size)
+        self._tasks: List[asyncio.Task] = []
+
+    def depth(self) -> int:
+        """ Number of diaries waiting for a worker."""
+        return self.queue.qsize()
+
+    async def start(self):
+        """ Starts the worker tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} diary workers.")
+
+    async def stop(self):
+        """ Cancels the worker tasks. Diaries still in the queue are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Stopped diary workers.")
+
+    def submit(self, turn_context: TurnContext, handler: Callable[[str], Awaitable[str]]) -> bool:
+        """
+        Queues the diary of the current turn.
+
+        Args:
+            turn_context (TurnContext): The turn that received the diary.
+            handler (Callable): Coroutine function that turns the raw diary into the reply text.
+
+        Returns:
+            bool: False if the queue is full and the diary was not accepted.
+        """
+        reference = TurnContext.get_conversation_reference(turn_context.activity)
+        try:
+            self.queue.put_nowait(DiaryJob(reference, turn_context.activity.text, handler))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Diary queue is full, rejecting diary entry.")
+            return False
+
+    async def _worker(self, number: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Diary worker {number} failed: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: DiaryJob):
+        try:
+            reply = await job.handler(job.raw_diary)
+        except Exception as e:
+            logger.error(f"Error processing queued diary entry: {e}", exc_info=True)
+            reply = "An error occurred while processing your raw diary entry."
+        await self.send(job.reference, reply)
+
+    async def send(self, reference: ConversationReference, text: Union[str, Activity]):
+        """ Posts a message (or any activity, e.g. a typing indicator) to the referenced conversation outside of a turn."""
+        activity = MessageFactory.text(text) if isinstance(text, str) else text
+
+        async def callback(turn_context: TurnContext):
+            await turn_context.send_activity(activity)
+
+        await self.adapter.continue_conversation(reference, callback, self.app_id)
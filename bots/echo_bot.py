@@ -2,26 +2,14 @@
 # Licensed under the MIT License.
 
 from botbuilder.core import ActivityHandler, MessageFactory, TurnContext
-from botbuilder.schema import ChannelAccount
-from typing import List
-import json
+from botbuilder.schema import Activity, ActivityTypes, ChannelAccount
+import asyncio
 import logging
-import openai
 import os
-import sys
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
-import requests
-from datetime import datetime
-import os
-import re
-from typing import List, Optional
-from langchain_core.output_parsers import JsonOutputParser
-from pydantic import BaseModel, Field
-from langchain.output_parsers import OutputFixingParser
-from datetime import date
-from helpers import NotionHelpers, DairyHelpers, ProManHelpers
+from typing import Awaitable, Callable, List, Optional, Union
+from helpers import AsyncNotionHelpers, DairyHelpers, ProManHelpers, StageGraph, DIARY_METRICS
+from .activity_dedup import ActivityDeduplicator
+from .diary_jobs import DiaryJobQueue
 
 
 
@@ -48,6 +36,9 @@ REQUIRED_ENV_VARS = {
     "TasksDatabaseId": TASKS_DATABASE_ID
 }
 
+# Typing indicators expire after a few seconds on most channels
+TYPING_INTERVAL = 3.0
+
 
 def validate_env_variables():
     missing_vars = [key for key, value in REQUIRED_ENV_VARS.items() if not value]
@@ -61,6 +52,24 @@ validate_env_variables()
 
 
 class EchoBot(ActivityHandler):
+    def __init__(self, job_queue: Optional[DiaryJobQueue] = None, deduplicator: Optional[ActivityDeduplicator] = None,
+                 streaming: bool = False):
+        """
+        Args:
+            job_queue (DiaryJobQueue): If set, diaries are acknowledged right away and
+                processed in the background instead of inside the turn.
+            deduplicator (ActivityDeduplicator): Makes sure a redelivered activity is
+                processed only once, defaults to a new in-memory one.
+            streaming (bool): If set, typing indicators and each finished section of the
+                summary and next steps are sent while they are generated.
+        """
+        self.job_queue = job_queue
+        self.streaming = streaming
+        self.deduplicator = deduplicator or ActivityDeduplicator()
+        self.notion_helper = AsyncNotionHelpers()
+        self.dairy_helper = DairyHelpers()
+        self.pm_helpers = ProManHelpers()
+
     async def on_members_added_activity(
        self, members_added: List[ChannelAccount], turn_context: TurnContext
     ):
@@ -70,29 +79,127 @@ class EchoBot(ActivityHandler):
         pass
 
     async def on_message_activity(self, turn_context: TurnContext):
-        try:
-            notion_helper = NotionHelpers()
-            dairy_helper = DairyHelpers()
-            pm_helpers =  ProManHelpers()
-            raw_diary = turn_context.activity.text
-            logger.info(f"Received raw diary entry: {raw_diary}")
-
-            structured_summary = dairy_helper.generate_dairy(raw_diary)
-            next_steps = dairy_helper.generate_next_steps(structured_summary)
-            final_analysis = f"{structured_summary}\n\n---\n\n{next_steps}"
-            result_response = notion_helper.create_notion_page_with_case_study(final_analysis, raw_diary)
-            pm_helpers.generate_projects_and_tasks_in_notion(notion_helper, raw_diary)
-            await turn_context.send_activity(
-                MessageFactory.text(f"{result_response}\n\n{final_analysis}")
-                #MessageFactory.text(f"done.")
+        raw_diary = turn_context.activity.text
+        logger.info(f"Received raw diary entry: {raw_diary}")
+        key = self.deduplicator.key(turn_context.activity)
 
-            )
+        if self.job_queue is not None:
+            await self.submit_diary(turn_context, key)
+            return
+
+        try:
+            send = turn_context.send_activity if self.streaming else None
+            result = await self.deduplicator.run(key, lambda: self.process_diary(raw_diary, send))
+            await turn_context.send_activity(MessageFactory.text(result))
         except Exception as e:
             logger.error(f"Error in on_message_activity: {e}")
             await turn_context.send_activity(
                 MessageFactory.text("An error occurred while processing your raw diary entry.")
             )
 
+    async def submit_diary(self, turn_context: TurnContext, key):
+        """
+        Queues the diary of the turn unless the same activity was already queued.
+
+        A redelivery of a finished diary gets the stored reply; one of a diary that
+        is still queued or running is only acknowledged, the original job replies.
+        A cancelled diary releases its key, so its redelivery is queued again.
+        """
+        existing = self.deduplicator.claim(key) if key is not None else None
+        if existing is not None:
+            if existing.done() and not existing.cancelled() and existing.exception() is None:
+                await turn_context.send_activity(MessageFactory.text(existing.result()))
+            else:
+                await turn_context.send_activity(
+                    MessageFactory.text("This diary entry is already being processed. I will reply here once it is done.")
+                )
+            return
+
+        send = None
+        if self.streaming:
+            reference = TurnContext.get_conversation_reference(turn_context.activity)
+            send = lambda activity: self.job_queue.send(reference, activity)
+
+        def handler(raw_diary: str):
+            work = self.process_diary(raw_diary, send)
+            return self.deduplicator.resolve(key, work) if key is not None else work
+
+        if self.job_queue.submit(turn_context, handler):
+            await turn_context.send_activity(
+                MessageFactory.text("Received your diary entry. I will reply here once it is processed.")
+            )
+        else:
+            if key is not None:
+                self.deduplicator.discard(key)
+            await turn_context.send_activity(
+                MessageFactory.text("Too many diary entries are being processed right now. Please try again later.")
+            )
+
+    async def process_diary(self, raw_diary: str,
+                            send: Optional[Callable[[Union[str, Activity]], Awaitable]] = None) -> str:
+        """
+        Runs the full diary pipeline and returns the reply for the user.
+
+        The pipeline is a stage graph with two independent branches that only
+        need the raw diary: summary -> next steps -> Notion page, and project
+        extraction -> tasks. Both run concurrently and join in the reply.
+
+        Args:
+            raw_diary (str): The raw diary text as received from the user.
+            send (callable, optional): Sends an activity to the user. If given, typing
+                indicators are sent until the reply is ready and the summary and next
+                steps are streamed section by section.
+
+        Returns:
+            str: The Notion result followed by the structured analysis, or only the
+                Notion result if the analysis was already streamed.
+        """
+        async def summary():
+            if send is None:
+                return await self.dairy_helper.generate_dairy(raw_diary)
+            return await self.dairy_helper.stream_dairy(raw_diary, send)
+
+        async def next_steps(summary):
+            if send is None:
+                return await self.dairy_helper.generate_next_steps(summary)
+            return await self.dairy_helper.stream_next_steps(summary, send)
+
+        async def analysis(summary, next_steps):
+            return f"{summary}\n\n---\n\n{next_steps}"
+
+        async def page(analysis):
+            return await self.notion_helper.create_notion_page_with_case_study(analysis, raw_diary)
+
+        async def reply(analysis, page, projects):
+            return page if send is not None else f"{page}\n\n{analysis}"
+
+        graph = (
+            StageGraph()
+            .add("summary", summary)
+            .add("next_steps", next_steps, deps=("summary",))
+            .add("analysis", analysis, deps=("summary", "next_steps"))
+            .add("page", page, deps=("analysis",))
+            .add("projects", lambda: self.pm_helpers.generate_projects_and_tasks_in_notion(self.notion_helper, raw_diary))
+            .add("reply", reply, deps=("analysis", "page", "projects"))
+        )
+        typing = asyncio.ensure_future(self.keep_typing(send)) if send is not None else None
+        try:
+            with DIARY_METRICS.diary():
+                results = await graph.run()
+        finally:
+            if typing is not None:
+                typing.cancel()
+        return results["reply"]
+
+    async def keep_typing(self, send: Callable[[Activity], Awaitable], interval: float = TYPING_INTERVAL):
+        """ Sends a typing indicator every `interval` seconds until cancelled."""
+        while True:
+            try:
+                await send(Activity(type=ActivityTypes.typing))
+            except Exception as e:
+                logger.warning(f"Error sending typing indicator: {e}")
+            await asyncio.sleep(interval)
+
 
 
 # gunicorn --bind 0.0.0.0 --worker-class aiohttp.worker.GunicornWebWorker app:APP
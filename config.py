@@ -18,4 +18,9 @@ class DefaultConfig:
     OPENAI_KEY = os.environ.get("OpenAIKey", "")
     PROJECTS_DATABASE_ID = os.getenv("ProjectsDatabaseId", "")
     TASKS_DATABASE_ID = os.getenv("TasksDatabaseId", "")
+    NOTION_POOL_SIZE = int(os.getenv("NotionPoolSize", "20"))
+    DIARY_JOB_MODE = os.getenv("DiaryJobMode", "false").lower() == "true"
+    DIARY_WORKERS = int(os.getenv("DiaryWorkers", "4"))
+    DIARY_QUEUE_SIZE = int(os.getenv("DiaryQueueSize", "100"))
+    DIARY_STREAMING = os.getenv("DiaryStreaming", "false").lower() == "true"
     
\ No newline at end of file
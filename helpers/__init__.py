@@ -2,8 +2,19 @@
 # Licensed under the MIT License.
 
 from .notion_helpers import NotionHelpers
+from .async_notion_helpers import AsyncNotionHelpers
+from .notion_rate_limiter import NotionRateLimiter, NOTION_RATE_LIMITER
+from .llm_cache import LLMResponseCache, LLM_CACHE
+from .notion_mirror import NotionMirror, NOTION_MIRROR
+from .prompt_store import PromptStore, PROMPT_STORE
+from .llm_registry import LLMRegistry, LLM_REGISTRY
 from .dairy_helpers import DairyHelpers
+from .project_index import ProjectIndex
+from .semantic_index import SemanticIndex, SEMANTIC_INDEX
 from .pm_helpers import ProManHelpers
+from .stage_graph import StageGraph
+from .diary_metrics import DiaryMetrics, DIARY_METRICS
+from .telemetry import MetricsRegistry, Tracer, METRICS, TRACER
 
 
-__all__ = ["NotionHelpers", "DairyHelpers", "ProManHelpers"]
\ No newline at end of file
+__all__ = ["NotionHelpers", "AsyncNotionHelpers", "NotionRateLimiter", "NOTION_RATE_LIMITER", "LLMResponseCache", "LLM_CACHE", "NotionMirror", "NOTION_MIRROR", "PromptStore", "PROMPT_STORE", "LLMRegistry", "LLM_REGISTRY", "DairyHelpers", "ProjectIndex", "SemanticIndex", "SEMANTIC_INDEX", "ProManHelpers", "StageGraph", "DiaryMetrics", "DIARY_METRICS", "MetricsRegistry", "Tracer", "METRICS", "TRACER"]
\ No newline at end of file
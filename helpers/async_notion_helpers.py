@@ -0,0 +1,593 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from .notion_helpers import (
+    NotionHelpers, NOTION_API_URL, NOTION_MAX_CHILDREN, NOTION_PAGE_SIZE, NOTION_VERSION, PROJECT_DETAIL_FIELDS
+)
+from .diary_metrics import DIARY_METRICS
+from .notion_mirror import NOTION_MIRROR, NotionMirror
+from .notion_rate_limiter import NOTION_RATE_LIMITER
+from .telemetry import NOTION_LATENCY
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Validate environment variables
+NOTION_API_KEY = os.getenv("NotionAPIKey")
+DATABASE_ID = os.getenv("NotionDatabaseId")
+PROJECTS_DATABASE_ID = os.getenv("ProjectsDatabaseId")
+TASKS_DATABASE_ID = os.getenv("TasksDatabaseId")
+
+
+class AsyncNotionHelpers(NotionHelpers):
+    """
+    Awaitable counterpart of NotionHelpers.
+
+    All instances share one aiohttp.ClientSession (and therefore one keep-alive
+    connection pool) that is opened at app startup with `open_session` and
+    closed on shutdown with `close_session`. Parsing and payload building are
+    inherited from NotionHelpers, so both variants return the same shapes.
+
+    Projects and task names are read from the local `mirror` of the projects and
+    tasks databases when it is enabled, see `sync_mirror`.
+    """
+
+    _session: Optional[aiohttp.ClientSession] = None
+    mirror: Optional[NotionMirror] = NOTION_MIRROR
+
+    @classmethod
+    async def open_session(cls, pool_size: int = 20, timeout: float = 30.0) -> aiohttp.ClientSession:
+        """
+        Creates the shared HTTP session used by every AsyncNotionHelpers instance.
+
+        Args:
+            pool_size (int): Maximum number of simultaneous connections to Notion.
+            timeout (float): Total timeout per request in seconds.
+
+        Returns:
+            aiohttp.ClientSession: The shared session.
+        """
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60)
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                headers={
+                    "Authorization": f"Bearer {NOTION_API_KEY}",
+                    "Content-Type": "application/json",
+                    "Notion-Version": NOTION_VERSION,
+                },
+            )
+            logger.info(f"Opened shared Notion session with a pool of {pool_size} connections.")
+        return cls._session
+
+    @classmethod
+    async def close_session(cls):
+        """
+        Closes the shared HTTP session.
+        """
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+            logger.info("Closed shared Notion session.")
+        cls._session = None
+
+    async def _request(self, method: str, path: str, payload: Optional[dict] = None, params: Optional[dict] = None) -> dict:
+        """
+        Sends a request to the Notion API over the shared session.
+
+        Requests are throttled by the shared NOTION_RATE_LIMITER. 429 and 5xx responses
+        and connection errors are retried with jittered exponential backoff, honouring
+        the Retry-After header of 429 responses. Requests that create pages or append
+        blocks are only retried on 429 or if the connection could not be established,
+        so a lost response does not create the content twice.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path below the API root, e.g. "/pages".
+            payload (dict): Optional JSON body.
+            params (dict): Optional query string parameters.
+
+        Returns:
+            dict: The decoded JSON response.
+
+        Raises:
+            aiohttp.ClientError: If the request fails or returns an error status.
+        """
+        session = await self.open_session()
+        limiter = NOTION_RATE_LIMITER
+        endpoint = limiter.endpoint(method, path)
+        attempt = 0
+        while True:
+            await limiter.acquire_async()
+            limiter.record(endpoint, "requests")
+            DIARY_METRICS.add_notion_request()
+            try:
+                with NOTION_LATENCY.time(endpoint=endpoint):
+                    async with session.request(method, f"{NOTION_API_URL}{path}", json=payload, params=params) as response:
+                        if response.status < 400:
+                            return await response.json()
+                        text = await response.text()
+                        error = aiohttp.ClientResponseError(
+                            response.request_info,
+                            response.history,
+                            status=response.status,
+                            message=text,
+                        )
+                        retry_after = response.headers.get("Retry-After")
+            except aiohttp.ClientConnectionError as e:
+                # Timeouts are not retried, the request may already have been applied
+                sent = not isinstance(e, aiohttp.ClientConnectorError)
+                retry = not isinstance(e, asyncio.TimeoutError) and (limiter.idempotent(endpoint) or not sent)
+                delay = limiter.retry_delay(attempt) if retry else None
+                if delay is None:
+                    limiter.record(endpoint, "errors")
+                    raise
+                self.logger.warning(f"{endpoint} failed ({e}), retrying in {delay:.1f}s.")
+            else:
+                if error.status == 429:
+                    limiter.record(endpoint, "throttled")
+                delay = limiter.retry_delay(attempt, retry_after) if error.status in limiter.retry_statuses(endpoint) else None
+                if delay is None:
+                    limiter.record(endpoint, "errors")
+                    raise error
+                if error.status == 429:
+                    limiter.pause(delay)
+                self.logger.warning(f"{endpoint} returned {error.status}, retrying in {delay:.1f}s.")
+            limiter.record(endpoint, "retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _iter_query_pages(self, database_id: str, query_filter: Optional[dict], page_size: int) -> AsyncIterator[List[dict]]:
+        """
+        Yields the results of a database query page by page, following `next_cursor`.
+        """
+        payload = {"page_size": page_size}
+        if query_filter:
+            payload["filter"] = query_filter
+        while True:
+            data = await self._request("POST", f"/databases/{database_id}/query", payload)
+            yield data.get("results", [])
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            payload["start_cursor"] = data["next_cursor"]
+
+    async def sync_mirror(self) -> bool:
+        """
+        Brings the mirror of the projects and tasks databases up to date if its sync interval has passed.
+
+        Only pages edited since the last sync are queried, except for the periodic full sync.
+
+        Returns:
+            bool: Whether reads can be served from the mirror; False if it is disabled or cannot be opened.
+
+        Raises:
+            aiohttp.ClientError: If a page of the sync query cannot be retrieved.
+        """
+        mirror = self.mirror
+        if mirror is None or not mirror.available:
+            return False
+        async with mirror.sync_lock():
+            for database_id in (PROJECTS_DATABASE_ID, TASKS_DATABASE_ID):
+                started = time.time()
+                plan = mirror.sync_filter(database_id, started)
+                if plan is None:
+                    continue
+                pages = []
+                async for results in self._iter_query_pages(database_id, plan["filter"], NOTION_PAGE_SIZE):
+                    pages.extend(results)
+                # Storing thousands of pages takes a while, keep the event loop free meanwhile
+                await asyncio.to_thread(mirror.apply_sync, database_id, pages, plan["full"], started)
+                logger.debug(f"{'Fully' if plan['full'] else 'Incrementally'} synced {len(pages)} pages of database {database_id}.")
+        return True
+
+    async def _iter_children_pages(self, block_id: str, page_size: int) -> AsyncIterator[List[dict]]:
+        """
+        Yields the children of a block page by page, following `next_cursor`.
+        """
+        params = {"page_size": page_size}
+        while True:
+            data = await self._request("GET", f"/blocks/{block_id}/children", params=params)
+            yield data.get("results", [])
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            params["start_cursor"] = data["next_cursor"]
+
+    async def get_tasks_by_project(self, project_id: str) -> List[str]:
+        """
+        Retrieves all task names associated with a specific project by its ID.
+
+        Args:
+            project_id (str): The ID of the project to retrieve tasks for.
+
+        Returns:
+            List[str]: A list of task names associated with the project.
+        """
+        try:
+            return [task_name async for task_name in self.iter_tasks_by_project(project_id)]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Error retrieving tasks for project {project_id}: {e}")
+            return []
+
+    async def iter_tasks_by_project(self, project_id: str, page_size: int = NOTION_PAGE_SIZE) -> AsyncIterator[str]:
+        """
+        Yields the names of all tasks associated with a project, page by page.
+
+        Raises:
+            aiohttp.ClientError: If a page cannot be retrieved.
+        """
+        query_filter = {
+            "property": "Project",
+            "relation": {
+                "contains": project_id
+            }
+        }
+        if await self.sync_mirror():
+            for task_name in self.mirror.titles_by_relation(TASKS_DATABASE_ID, "Project", [project_id])[project_id]:
+                yield task_name
+            return
+        async for tasks in self._iter_query_pages(TASKS_DATABASE_ID, query_filter, page_size):
+            for task_name in self._parse_task_names(tasks):
+                yield task_name
+
+    async def get_tasks_by_projects(self, project_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Retrieves the task names of several projects with as few queries as possible.
+
+        Args:
+            project_ids (iterable of str): The IDs of the projects to retrieve tasks for.
+
+        Returns:
+            Dict[str, List[str]]: Task names per requested project ID, or an empty dict if an error occurs.
+        """
+        try:
+            project_ids = list(dict.fromkeys(project_ids))
+            if await self.sync_mirror():
+                return self.mirror.titles_by_relation(TASKS_DATABASE_ID, "Project", project_ids)
+            index = {project_id: [] for project_id in project_ids}
+            for query_filter, lookup in self._project_relation_filters(project_ids):
+                async for tasks in self._iter_query_pages(TASKS_DATABASE_ID, query_filter, NOTION_PAGE_SIZE):
+                    self._index_task_names(tasks, lookup, index)
+            return index
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Error retrieving tasks for projects {project_ids}: {e}")
+            return {}
+
+    async def create_notion_subpage(self, parent_page_id: str, title: str, text_chunks: List[str]):
+        """
+        Create a subpage under the given parent page with text content split into blocks.
+
+        Args:
+            parent_page_id (str): The ID of the parent page.
+            title (str): The title of the subpage.
+            text_chunks (list): A list of text chunks to be added to the subpage.
+
+        Returns:
+            str: Result message indicating success or failure.
+        """
+        try:
+            payload = self._subpage_payload(parent_page_id, title, text_chunks)
+            await self.create_page(payload)
+            logger.info("Subpage created successfully.")
+            return "Subpage created successfully."
+        except Exception as e:
+            logger.error(f"Error creating subpage: {e}")
+            return "Failed to create subpage."
+
+    async def create_notion_page_with_case_study(self, dairy_txt, raw_diary: str):
+        """
+        Creates a new page in a Notion database with the provided diary text.
+
+        The page is created with the first batch of blocks, then the remaining blocks
+        are appended and the raw diary subpage is created last, so its link always
+        follows the summary. If writing the content fails after the page exists, the
+        reply says so and links the incomplete page.
+        """
+        try:
+            payload, remaining = self._split_children(self._case_study_payload(dairy_txt))
+            data = await self._request("POST", "/pages", payload)
+            page_id = data.get("id")
+            logger.info(f"Created Notion page with ID: {page_id}")
+            text_chunks = self.split_text_into_chunks(raw_diary)
+            subpage_title = "Raw Diary Text"
+            try:
+                await self.append_blocks(page_id, remaining)
+                await self.create_page(self._subpage_payload(page_id, subpage_title, text_chunks))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Created Notion page {page_id}, but writing its content failed: {e}")
+                return f"Page created, but appending its content failed: {data.get('url') or page_id}"
+            return "Page created successfully."
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Failed to create page: {e.status} {e.message}")
+            return "Failed to create page."
+        except Exception as e:
+            logger.error(f"Error in create_notion_page_with_case_study: {e}")
+            return "An error occurred while creating the Notion page."
+
+    async def create_page(self, payload: dict) -> dict:
+        """
+        Creates a page with any number of child blocks.
+
+        Notion accepts at most NOTION_MAX_CHILDREN blocks per request, so the page is
+        created with the first batch and the remaining blocks are appended in batches.
+
+        Args:
+            payload (dict): The page payload, including all "children".
+
+        Returns:
+            dict: The created page as returned by Notion.
+
+        Raises:
+            aiohttp.ClientResponseError: If the page cannot be created or a batch cannot be appended.
+        """
+        first_batch, remaining = self._split_children(payload)
+        data = await self._request("POST", "/pages", first_batch)
+        await self.append_blocks(data.get("id"), remaining)
+        return data
+
+    async def append_blocks(self, block_id: str, blocks: List[dict]):
+        """
+        Appends blocks to a page or block in batches of at most NOTION_MAX_CHILDREN.
+
+        The batches are sent one after the other, since concurrent appends to the
+        same parent would interleave.
+
+        Raises:
+            aiohttp.ClientResponseError: If a batch cannot be appended.
+        """
+        for start in range(0, len(blocks), NOTION_MAX_CHILDREN):
+            await self._request("PATCH", f"/blocks/{block_id}/children", {"children": blocks[start:start + NOTION_MAX_CHILDREN]})
+
+    async def query_all_projects(self, fields: Optional[Iterable[str]] = None):
+        """
+        Queries all projects from the Notion Projects database and extracts all available details.
+
+        Args:
+            fields (iterable of str, optional): Keys to return per project, e.g. ("project_id", "project_name").
+                "page_content" and "tasks_details" need extra requests per project and are only fetched
+                if requested; use `load_project_details` to fetch them later. Defaults to all fields.
+
+        Returns:
+            list: A list of dictionaries containing detailed project information, or an empty list if an error occurs.
+        """
+        try:
+            return [project async for project in self.iter_projects(fields)]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error querying projects: {e}")
+            return []
+
+    async def iter_projects(self, fields: Optional[Iterable[str]] = None, page_size: int = NOTION_PAGE_SIZE) -> AsyncIterator[dict]:
+        """
+        Yields the projects of the Notion Projects database as the result pages arrive.
+
+        Details requested in `fields` are fetched concurrently for all projects of a result page.
+
+        Raises:
+            aiohttp.ClientError: If a page cannot be retrieved.
+        """
+        fields = self._project_fields(fields)
+        detail_fields = [field for field in PROJECT_DETAIL_FIELDS if field in fields]
+        async for projects in self._iter_project_pages(page_size):
+            project_details = [self._parse_project(project) for project in projects]
+            if detail_fields:
+                await asyncio.gather(*(self.load_project_details(details, detail_fields) for details in project_details))
+            for details in project_details:
+                yield {field: details[field] for field in fields}
+
+    async def _iter_project_pages(self, page_size: int) -> AsyncIterator[List[dict]]:
+        """
+        Yields the pages of the projects database from the mirror if it is enabled, else from Notion.
+        """
+        if await self.sync_mirror():
+            projects = await asyncio.to_thread(self.mirror.pages, PROJECTS_DATABASE_ID)
+            for start in range(0, len(projects), page_size):
+                yield projects[start:start + page_size]
+            return
+        async for projects in self._iter_query_pages(PROJECTS_DATABASE_ID, None, page_size):
+            yield projects
+
+    async def load_project_details(self, project: dict, fields: Iterable[str] = PROJECT_DETAIL_FIELDS) -> dict:
+        """
+        Fetches the expensive fields of a project returned by `query_all_projects` on demand.
+
+        Args:
+            project (dict): A project with at least "project_id" and, for "tasks_details", "tasks".
+            fields (iterable of str): Which of PROJECT_DETAIL_FIELDS to fetch.
+
+        Returns:
+            dict: The same project dictionary with the requested fields filled in.
+        """
+        if "page_content" in fields:
+            project["page_content"] = await self.get_page_content(project["project_id"])
+        if "tasks_details" in fields:
+            project["tasks_details"] = await self.get_all_tasks(project.get("tasks", []))
+        return project
+
+    async def query_all_tasks(self):
+        """
+        Queries all tasks from the Notion Tasks database.
+
+        Returns:
+            list: A list of task objects, or an empty list if an error occurs.
+        """
+        try:
+            return [task async for task in self.iter_tasks()]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error querying tasks: {e}")
+            return []
+
+    async def iter_tasks(self, page_size: int = NOTION_PAGE_SIZE) -> AsyncIterator[dict]:
+        """
+        Yields the raw task objects of the Notion Tasks database as the result pages arrive.
+
+        Raises:
+            aiohttp.ClientError: If a page cannot be retrieved.
+        """
+        async for tasks in self._iter_query_pages(TASKS_DATABASE_ID, None, page_size):
+            for task in tasks:
+                yield task
+
+    async def get_all_tasks(self, task_ids):
+        """
+        Retrieves details for all tasks associated with a project concurrently.
+
+        Args:
+            task_ids (list): A list of task IDs.
+
+        Returns:
+            list: A list of dictionaries containing task details.
+        """
+        tasks = await asyncio.gather(*(self.get_task_details(task_id) for task_id in task_ids))
+        return [task for task in tasks if task]
+
+    async def get_task_details(self, task_id):
+        """
+        Retrieves detailed information for a single task, including custom properties.
+
+        Args:
+            task_id (str): The ID of the task page.
+
+        Returns:
+            dict: A dictionary containing task details, or None if an error occurs.
+        """
+        try:
+            task = await self._request("GET", f"/pages/{task_id}")
+            return self._parse_task(task_id, task)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error retrieving task {task_id}: {e}")
+            return None
+        except AttributeError as e:
+            logger.error(f"Attribute error in task {task_id}: {e}")
+            return None
+
+    async def get_project_by_id(self, project_id):
+        """
+        Retrieves details of a specific project by its ID.
+
+        Args:
+            project_id (str): The ID of the project to retrieve.
+
+        Returns:
+            dict: A dictionary containing detailed project information, or None if the project is not found or an error occurs.
+        """
+        try:
+            project = await self._request("GET", f"/pages/{project_id}")
+            return self._parse_project_by_id(project)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error retrieving project {project_id}: {e}")
+            return None
+
+    async def get_page_content(self, page_id):
+        """
+        Retrieves and extracts only the text content from a Notion page, ignoring empty or irrelevant blocks.
+
+        Args:
+            page_id (str): The unique ID of the Notion page.
+
+        Returns:
+            list: A list of strings containing the page's text content.
+        """
+        try:
+            return [text async for text in self.iter_page_content(page_id)]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error retrieving page content: {e}")
+            return []
+
+    async def iter_page_content(self, page_id, page_size: int = NOTION_PAGE_SIZE) -> AsyncIterator[str]:
+        """
+        Yields the non-empty text of each block of a Notion page as the result pages arrive.
+
+        Raises:
+            aiohttp.ClientError: If a page cannot be retrieved.
+        """
+        async for blocks in self._iter_children_pages(page_id, page_size):
+            for text in self._parse_page_text(blocks):
+                yield text
+
+    async def get_page_content_block_id(self, page_id):
+        """
+        Retrieves the detailed content of a Notion page, including written text and blocks.
+
+        Args:
+            page_id (str): The unique ID of the Notion page.
+
+        Returns:
+            list: A list of dictionaries containing the page's block content, or an empty list if an error occurs.
+        """
+        try:
+            return [block async for block in self.iter_page_content_block_id(page_id)]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error retrieving page content: {e}")
+            return []
+
+    async def iter_page_content_block_id(self, page_id, page_size: int = NOTION_PAGE_SIZE) -> AsyncIterator[dict]:
+        """
+        Yields id, type, text and data of each block of a Notion page as the result pages arrive.
+
+        Raises:
+            aiohttp.ClientError: If a page cannot be retrieved.
+        """
+        async for blocks in self._iter_children_pages(page_id, page_size):
+            for block in self._parse_page_blocks(blocks):
+                yield block
+
+    async def add_tasks_to_project(self, project_id, tasks):
+        """
+        Adds one or more tasks to a project in the Notion database.
+
+        Args:
+            project_id (str): The ID of the project to which the tasks will be linked.
+            tasks (list of dict): A list of task dictionaries, see NotionHelpers.add_tasks_to_project.
+
+        Returns:
+            list of dict: Per task its "task_name", the new "task_id" (None on failure) and the
+                "error" (None on success), see `format_task_results` for a readable summary.
+        """
+        results = []
+
+        for task in tasks:
+            try:
+                data = await self._request("POST", "/pages", self._task_payload(project_id, task))
+                task_id = data.get("id", "")
+                if self.mirror is not None and self.mirror.available:
+                    self.mirror.upsert_pages(TASKS_DATABASE_ID, [data])
+                    # Notion adds the task to the project's side of the two-way relation
+                    self.mirror.add_relation(PROJECTS_DATABASE_ID, project_id, "Tasks", task_id)
+                results.append({"task_name": task["task_name"], "task_id": task_id, "error": None})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Error creating task '{task['task_name']}': {e}")
+                results.append({"task_name": task["task_name"], "task_id": None, "error": str(e)})
+
+        return results
+
+    async def add_project(self, project_name, status=None, owner=None, dates=None, priority=None, summary=None):
+        """
+        Adds a new project to the Notion Projects database.
+
+        Args:
+            project_name (str): The name of the project (required).
+            status (str): The status of the project (optional).
+            owner (list): List of owner IDs (optional).
+            dates (dict): A dictionary with "start" and "end" keys for project dates (optional).
+            priority (str): The priority of the project (optional).
+            summary (str): A brief summary of the project (optional).
+
+        Returns:
+            tuple: The new project ID (None on failure) and a message indicating success or failure.
+        """
+        try:
+            payload = self._project_payload(project_name, status, owner, dates, priority, summary)
+            data = await self._request("POST", "/pages", payload)
+            project_id = data.get("id", "")
+            if self.mirror is not None and self.mirror.available:
+                self.mirror.upsert_pages(PROJECTS_DATABASE_ID, [data])
+            logger.info(f"Project '{project_name}' created successfully with ID: {project_id}")
+            return project_id, f"Project '{project_name}' created successfully with ID: {project_id}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error adding project '{project_name}': {e}")
+            return None, f"Failed to add project '{project_name}': {e}"
@@ -1,12 +1,12 @@
+import asyncio
 import logging
 import os 
-import requests
+import re
 from datetime import datetime
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 
-from typing import List
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from .llm_registry import LLMRegistry, LLM_REGISTRY
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -19,6 +19,24 @@ OPENAI_KEY = os.getenv("OpenAIKey")
 PROJECTS_DATABASE_ID = os.getenv("ProjectsDatabaseId")
 TASKS_DATABASE_ID = os.getenv("TasksDatabaseId")
 
+# Diaries above this many estimated tokens are summarised chunk by chunk and then merged
+LONG_DIARY_TOKEN_THRESHOLD = int(os.getenv("LongDiaryTokenThreshold", "3000"))
+# Target size of one chunk of a long diary in estimated tokens
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SummaryChunkTokens", "1500"))
+# Maximum number of chunks summarised at the same time
+SUMMARY_CONCURRENCY = int(os.getenv("SummaryConcurrency", "4"))
+# Rough number of characters per token, used to estimate prompt sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s", re.MULTILINE)
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n|\n")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+# A weekday or a date like 11.11.2024 near the start of a sentence marks the start of a new day
+_DAY_PATTERN = re.compile(
+    r"(?i)\b(montag|dienstag|mittwoch|donnerstag|freitag|samstag|sonntag|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b|\b\d{1,2}\.\s?\d{1,2}\."
+)
+
 REQUIRED_ENV_VARS = {
     "NotionAPIKey": NOTION_API_KEY,
     "NotionDatabaseId": DATABASE_ID,
@@ -29,12 +47,23 @@ REQUIRED_ENV_VARS = {
 
 class DairyHelpers:
     """
-    A helper class for 
+    Turns a raw diary into a structured summary and next steps with the LLM stages.
     """
-    def __init__(self):
+    def __init__(self, llm: Optional[LLMRegistry] = None, long_diary_tokens: int = LONG_DIARY_TOKEN_THRESHOLD,
+                 chunk_tokens: int = SUMMARY_CHUNK_TOKENS, summary_concurrency: int = SUMMARY_CONCURRENCY):
         """
-        Initializes the NotionHelpers class.
+        Initializes the DairyHelpers class.
+
+        Args:
+            llm (LLMRegistry, optional): Source of the prebuilt LLM chains, defaults to LLM_REGISTRY.
+            long_diary_tokens (int): Estimated tokens above which a diary is summarised with map-reduce.
+            chunk_tokens (int): Target size of one map-reduce chunk in estimated tokens.
+            summary_concurrency (int): Maximum number of chunks summarised at the same time.
         """
+        self.llm = llm or LLM_REGISTRY
+        self.long_diary_tokens = long_diary_tokens
+        self.chunk_tokens = chunk_tokens
+        self.summary_concurrency = max(1, summary_concurrency)
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
         self.handler = logging.StreamHandler()
@@ -42,47 +71,195 @@ class DairyHelpers:
         self.handler.setFormatter(self.formatter)
         self.logger.addHandler(self.handler)
         
-    def generate_dairy(self, dairy_txt) -> str:
+    async def generate_dairy(self, dairy_txt) -> str:
         """ Generate a structured summary based on the provided diary text."""
         try:
-            model = ChatOpenAI(model_name='chatgpt-4o-latest', temperature = 0, api_key=OPENAI_KEY)
-            dairy_prompt = self.read_md_to_formattable_string(os.path.join('data', 'dairy_summary_prompt copy 2.md'))
-            prompt_template = ChatPromptTemplate.from_messages([("user", dairy_prompt)])
-            parser = StrOutputParser()
-            chain = prompt_template | model | parser
-            result = chain.invoke({"raw_dairy": dairy_txt})
+            if self.is_long_diary(dairy_txt):
+                partial_summaries = await self.summarise_chunks(dairy_txt)
+                return await self.llm.stage("summary_reduce").chain.ainvoke({"partial_summaries": partial_summaries})
+            result = await self.llm.stage("summary").chain.ainvoke({"raw_dairy": dairy_txt})
             return result
            
         except Exception as e:
             logging.error(f"Error generating diary summary: {e}", exc_info=True)
             return ""
         
-    def generate_next_steps(self, structured_summary) -> str:
+    async def generate_next_steps(self, structured_summary) -> str:
         """ Generate next steps based on the structured summary."""
         try:
-            model = ChatOpenAI(model_name='chatgpt-4o-latest', temperature = 0.5, api_key=OPENAI_KEY)
-            next_steps_prompt = self.read_md_to_formattable_string(os.path.join('data', 'dairy_next_steps_prompt.md'))
-            prompt_template = ChatPromptTemplate.from_messages([("system", next_steps_prompt), "user", structured_summary])
-            parser = StrOutputParser()
-            chain = prompt_template | model | parser
-            result = chain.invoke({})
+            result = await self.llm.stage("next_steps").chain.ainvoke({"structured_summary": structured_summary})
             logger.debug("Generated next steps successfully.")
             return result
            
         except Exception as e:
             logging.error(f"Error generating case study: {e}")
             return ""
-        
-    def read_md_to_formattable_string(self, file_path):
+
+    async def stream_dairy(self, dairy_txt, on_section: Callable[[str], Awaitable[None]]) -> str:
+        """ Like `generate_dairy`, but hands every finished section to `on_section` while the summary is generated."""
+        if self.is_long_diary(dairy_txt):
+            try:
+                partial_summaries = await self.summarise_chunks(dairy_txt)
+            except Exception as e:
+                logging.error(f"Error generating diary summary: {e}", exc_info=True)
+                return ""
+            return await self._stream_stage("summary_reduce", {"partial_summaries": partial_summaries}, on_section)
+        return await self._stream_stage("summary", {"raw_dairy": dairy_txt}, on_section)
+
+    def is_long_diary(self, dairy_txt) -> bool:
+        """ Whether a diary is long enough to be summarised with map-reduce."""
+        return self.long_diary_tokens > 0 and len(dairy_txt) // CHARS_PER_TOKEN > self.long_diary_tokens
+
+    async def summarise_chunks(self, dairy_txt) -> str:
         """
-        Read a markdown file and return its content as a string.
+        Map step of the long-diary mode: structures the chunks of a diary concurrently.
+
+        A chunk whose call fails is passed on unstructured, so the reduce step still sees all details.
+
+        Returns:
+            str: The structured parts in order, ready for the `summary_reduce` stage.
         """
-        try: 
-            
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            logger.debug(f"Successfully read markdown file: {file_path}")
-            return content
+        chunks = split_diary(dairy_txt, self.chunk_tokens * CHARS_PER_TOKEN)
+        logger.info(f"Summarising a long diary in {len(chunks)} chunks.")
+        stage = self.llm.stage("summary")
+        semaphore = asyncio.Semaphore(self.summary_concurrency)
+
+        async def summarise(number, chunk):
+            async with semaphore:
+                try:
+                    return await stage.chain.ainvoke({"raw_dairy": chunk})
+                except Exception as e:
+                    logging.error(f"Error summarising chunk {number} of the diary: {e}")
+                    return chunk
+
+        partials = await asyncio.gather(*(summarise(number, chunk) for number, chunk in enumerate(chunks, start=1)))
+        return "\n\n".join(f"Part {number}:\n{partial}" for number, partial in enumerate(partials, start=1))
+
+    async def stream_next_steps(self, structured_summary, on_section: Callable[[str], Awaitable[None]]) -> str:
+        """ Like `generate_next_steps`, but hands every finished section to `on_section` while they are generated."""
+        return await self._stream_stage("next_steps", {"structured_summary": structured_summary}, on_section)
+
+    async def _stream_stage(self, stage_name, inputs, on_section: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Streams a text stage and emits its output section by section. Streamed calls
+        bypass the LLM response cache.
+
+        Args:
+            stage_name (str): Name of the LLM stage.
+            inputs (dict): Inputs of the stage's prompt.
+            on_section (callable): Coroutine function called with each finished Markdown section.
+
+        Returns:
+            str: The complete output, or what was generated before an error.
+        """
+        text = ""
+        emitted = 0
+        try:
+            async for chunk in self.llm.stage(stage_name).chain.astream(inputs):
+                text += chunk
+                sections, rest = split_markdown_sections(text[emitted:])
+                for section in sections:
+                    await on_section(section)
+                emitted = len(text) - len(rest)
         except Exception as e:
-            logging.error(f"Error while reading markdown file {file_path}: {e}")
-            return "" 
\ No newline at end of file
+            logging.error(f"Error streaming {stage_name}: {e}", exc_info=True)
+        if text[emitted:].strip():
+            await on_section(text[emitted:].strip())
+        return text
+
+
+def split_markdown_sections(text: str) -> Tuple[List[str], str]:
+    """
+    Splits streamed Markdown into the sections that are complete and the rest.
+
+    A section runs from one heading to the next. Headings directly followed by
+    another heading (e.g. a day followed by its first topic) stay with the next
+    section, so no section consists of headings only.
+
+    Args:
+        text (str): Markdown generated so far.
+
+    Returns:
+        Tuple[List[str], str]: The complete sections and the text still in progress.
+    """
+    starts = [match.start() for match in _HEADING_PATTERN.finditer(text)]
+    sections = []
+    begin = 0
+    for start in starts:
+        if start == 0:
+            continue
+        section = text[begin:start]
+        body = "\n".join(line for line in section.splitlines() if not _HEADING_PATTERN.match(line))
+        if body.strip(" \n-"):
+            sections.append(section.strip())
+            begin = start
+    return sections, text[begin:]
+
+
+def split_diary(text: str, max_chars: int) -> List[str]:
+    """
+    Splits a diary into chunks of at most `max_chars` characters.
+
+    Chunks end at sentence boundaries. When a chunk is full, it is cut at the
+    last day boundary (a sentence naming a weekday or date near its start), else
+    at the last paragraph boundary, as long as that keeps at least half of the
+    chunk; otherwise right before the sentence that does not fit. Sentences
+    longer than `max_chars` are cut hard.
+
+    Args:
+        text (str): The raw diary text.
+        max_chars (int): Maximum chunk length in characters.
+
+    Returns:
+        List[str]: The chunks in order.
+    """
+    # Units are (sentence, starts a day, starts a paragraph)
+    units: List[Tuple[str, bool, bool]] = []
+    for paragraph in _PARAGRAPH_PATTERN.split(text):
+        sentences = [sentence for sentence in _SENTENCE_PATTERN.split(paragraph.strip()) if sentence]
+        for index, sentence in enumerate(sentences):
+            for start in range(0, len(sentence), max_chars):
+                piece = sentence[start:start + max_chars]
+                units.append((piece, start == 0 and bool(_DAY_PATTERN.search(piece[:40])), index == 0 and start == 0))
+
+    chunks: List[str] = []
+    current: List[Tuple[str, bool, bool]] = []
+    # ends[i] is the length of the first i + 1 units of the chunk once joined
+    ends: List[int] = []
+    for unit in units:
+        # The units left over after a split can still be too long together with this one
+        while current and ends[-1] + _separator_length(unit) + len(unit[0]) > max_chars:
+            split = len(current)
+            for flag in (1, 2):
+                offset = next((i for i in range(len(current) - 1, 0, -1)
+                               if current[i][flag] and ends[i - 1] >= max_chars // 2), None)
+                if offset is not None:
+                    split = offset
+                    break
+            chunks.append(_join_units(current[:split]))
+            if split < len(current):
+                # The first unit left over loses its separator
+                dropped = ends[split - 1] + _separator_length(current[split])
+                ends = [end - dropped for end in ends[split:]]
+            else:
+                ends = []
+            current = current[split:]
+        ends.append((ends[-1] + _separator_length(unit) if current else 0) + len(unit[0]))
+        current.append(unit)
+    if current:
+        chunks.append(_join_units(current))
+    return chunks
+
+
+def _separator_length(unit: Tuple[str, bool, bool]) -> int:
+    """ Characters `_join_units` puts before the unit: a blank line before a paragraph, else a space."""
+    return 2 if unit[2] else 1
+
+
+def _join_units(units: List[Tuple[str, bool, bool]]) -> str:
+    parts: List[str] = []
+    for sentence, _, paragraph_start in units:
+        if parts:
+            parts.append("\n\n" if paragraph_start else " ")
+        parts.append(sentence)
+    return "".join(parts)
@@ -0,0 +1,231 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .telemetry import STAGE_LATENCY, TRACER
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Number of recent diaries the percentiles are computed over
+METRICS_WINDOW = int(os.getenv("MetricsWindow", "1000"))
+
+# USD per million prompt and completion tokens, matched by the longest model name prefix
+LLM_PRICES: Dict[str, tuple] = {
+    "chatgpt-4o-latest": (5.00, 15.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class StageMetrics:
+    """ What one stage of a diary cost. Stages that run several times (e.g. per project) add up."""
+    calls: int = 0
+    wall_time: float = 0.0
+    llm_calls: int = 0
+    cached_llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    notion_requests: int = 0
+
+
+@dataclass
+class DiaryRecord:
+    """ Per-diary record of all stages plus the total wall time."""
+    diary_id: str
+    started: float = field(default_factory=time.monotonic)
+    wall_time: float = 0.0
+    stages: Dict[str, StageMetrics] = field(default_factory=lambda: defaultdict(StageMetrics))
+
+    def totals(self) -> StageMetrics:
+        """ Sums the LLM and Notion figures of all stages; wall time is the diary's own."""
+        total = StageMetrics(calls=1, wall_time=self.wall_time)
+        for metrics in self.stages.values():
+            total.llm_calls += metrics.llm_calls
+            total.cached_llm_calls += metrics.cached_llm_calls
+            total.prompt_tokens += metrics.prompt_tokens
+            total.completion_tokens += metrics.completion_tokens
+            total.cost += metrics.cost
+            total.notion_requests += metrics.notion_requests
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "diary_id": self.diary_id,
+            "total": asdict(self.totals()),
+            "stages": {name: asdict(metrics) for name, metrics in self.stages.items()},
+        }
+
+
+_CURRENT_RECORD: ContextVar[Optional[DiaryRecord]] = ContextVar("diary_record", default=None)
+_CURRENT_STAGE: ContextVar[str] = ContextVar("diary_stage", default="other")
+
+
+class _UsageCallback(BaseCallbackHandler):
+    """ Reports the token usage of every chat model call to the diary metrics."""
+
+    # Runs in the caller's context, so the current diary and stage are visible
+    run_inline = True
+
+    def __init__(self, metrics: "DiaryMetrics"):
+        self.metrics = metrics
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                metadata = getattr(message, "response_metadata", None) or {}
+                model = metadata.get("model_name") or (response.llm_output or {}).get("model_name", "")
+                self.metrics.add_llm_usage(
+                    model,
+                    usage.get("input_tokens", 0),
+                    usage.get("output_tokens", 0),
+                    # Cache hits are marked with a zero total_cost by langchain
+                    cached=usage.get("total_cost") == 0,
+                )
+
+
+class DiaryMetrics:
+    """
+    Per-diary accounting of wall time, tokens, cost and Notion requests by stage.
+
+    `diary` opens a record for the current task and `stage` attributes everything
+    that happens inside it (including tasks started from it) to a stage name, using
+    context variables so concurrent diaries and stages do not mix. Chat models report
+    their token usage through `callback`, Notion helpers call `add_notion_request`.
+    A finished record is logged as JSON and added to a sliding window from which
+    `summary` computes p50/p95/p99 per stage. Diaries and stages are also traced
+    as spans, and stage latencies feed the `bot_diary_stage_duration_seconds` histogram.
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW, prices: Optional[Dict[str, tuple]] = None):
+        """
+        Args:
+            window (int): Number of recent diaries kept for the percentiles.
+            prices (dict, optional): USD per million prompt/completion tokens by model prefix, defaults to LLM_PRICES.
+        """
+        self.prices = prices or LLM_PRICES
+        self.callback = _UsageCallback(self)
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[StageMetrics]] = defaultdict(lambda: deque(maxlen=window))
+        self._diaries = 0
+
+    @contextmanager
+    def diary(self, diary_id: Optional[str] = None) -> Iterator[DiaryRecord]:
+        """ Records everything inside the block as one diary, then logs and aggregates it."""
+        record = DiaryRecord(diary_id=diary_id or uuid.uuid4().hex[:12])
+        token = _CURRENT_RECORD.set(record)
+        try:
+            with TRACER.span("diary", diary_id=record.diary_id):
+                yield record
+        finally:
+            _CURRENT_RECORD.reset(token)
+            record.wall_time = time.monotonic() - record.started
+            self.finish(record)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Optional[StageMetrics]]:
+        """ Attributes the wall time, LLM usage and Notion requests inside the block to a stage."""
+        record = _CURRENT_RECORD.get()
+        with TRACER.span(f"stage {name}", stage=name), STAGE_LATENCY.time(stage=name):
+            if record is None:
+                yield None
+                return
+            token = _CURRENT_STAGE.set(name)
+            started = time.monotonic()
+            try:
+                yield record.stages[name]
+            finally:
+                _CURRENT_STAGE.reset(token)
+                metrics = record.stages[name]
+                metrics.calls += 1
+                metrics.wall_time += time.monotonic() - started
+
+    def add_llm_usage(self, model: str, prompt_tokens: int, completion_tokens: int, cached: bool = False):
+        """ Adds one chat model call to the current stage; cached calls cost nothing."""
+        metrics = self._current()
+        if metrics is None:
+            return
+        metrics.llm_calls += 1
+        if cached:
+            metrics.cached_llm_calls += 1
+            return
+        metrics.prompt_tokens += prompt_tokens
+        metrics.completion_tokens += completion_tokens
+        metrics.cost += self.cost(model, prompt_tokens, completion_tokens)
+
+    def add_notion_request(self, count: int = 1):
+        """ Counts Notion requests (including retries) for the current stage."""
+        metrics = self._current()
+        if metrics is not None:
+            metrics.notion_requests += count
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """ Estimated USD cost of a call, 0 for models without a known price."""
+        prefixes = [prefix for prefix in self.prices if model.startswith(prefix)]
+        if not prefixes:
+            return 0.0
+        prompt_price, completion_price = self.prices[max(prefixes, key=len)]
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def finish(self, record: DiaryRecord):
+        """ Logs a finished record and adds it to the aggregate."""
+        logger.info(f"Diary metrics: {json.dumps(record.to_dict())}")
+        with self._lock:
+            self._diaries += 1
+            self._samples["total"].append(record.totals())
+            for name, metrics in record.stages.items():
+                self._samples[name].append(metrics)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns p50/p95/p99 of every metric per stage over the recent diaries.
+
+        Returns:
+            dict: {"diaries": n, "stages": {stage: {"samples": n, metric: {"p50": ..., "p95": ..., "p99": ...}}}}
+        """
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            diaries = self._diaries
+        stages = {}
+        for name, values in samples.items():
+            stats: Dict[str, Any] = {"samples": len(values)}
+            for metric in StageMetrics.__dataclass_fields__:
+                ordered = sorted(getattr(value, metric) for value in values)
+                stats[metric] = {f"p{p}": _percentile(ordered, p) for p in PERCENTILES}
+            stages[name] = stats
+        return {"diaries": diaries, "stages": stages}
+
+    def _current(self) -> Optional[StageMetrics]:
+        record = _CURRENT_RECORD.get()
+        return record.stages[_CURRENT_STAGE.get()] if record is not None else None
+
+
+def _percentile(ordered: List[float], percentile: int) -> float:
+    """ Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+# Shared by all diaries in the process
+DIARY_METRICS = DiaryMetrics()
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# The cache lives next to data/, independent of the working directory
+LLM_CACHE_PATH = os.getenv(
+    "LLMCachePath",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_cache.sqlite"),
+)
+# Chat models only consult the cache for complete calls; streamed stages (DiaryStreaming=true) always call the model
+LLM_CACHE_ENABLED = os.getenv("LLMCache", "true").lower() == "true"
+# Number of responses kept in memory in front of the disk store
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLMCacheMemorySize", "256"))
+# Maximum number of responses kept on disk, least recently used ones are evicted first
+LLM_CACHE_DISK_SIZE = int(os.getenv("LLMCacheDiskSize", "10000"))
+# Seconds a response stays valid, 0 keeps responses until they are evicted by size
+LLM_CACHE_TTL = float(os.getenv("LLMCacheTTL", str(7 * 24 * 3600)))
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Content-addressed cache for chat model responses.
+
+    Entries are keyed by a SHA-256 of the model configuration (model name,
+    temperature, ...) and the fully rendered prompt, so the same stage on the
+    same input is answered without calling the model again. An in-memory LRU
+    sits in front of a SQLite file; both evict by size (least recently used
+    first) and by age (`ttl`). Hits and misses are counted per layer.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, memory_size: int = LLM_CACHE_MEMORY_SIZE,
+                 disk_size: int = LLM_CACHE_DISK_SIZE, ttl: float = LLM_CACHE_TTL):
+        """
+        Args:
+            path (str): SQLite file of the disk store, None keeps responses in memory only.
+            memory_size (int): Maximum number of responses in the in-memory LRU.
+            disk_size (int): Maximum number of responses in the disk store.
+            ttl (float): Seconds a response stays valid, 0 disables expiry.
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        # The disk store is opened on first use, so importing the helpers creates no files
+        self._connection: Optional[sqlite3.Connection] = None
+        self._opened = False
+        self._open_lock = threading.Lock()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """ Returns the cached generations for a prompt and model configuration, or None."""
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._memory[key]
+
+            value = self._disk_lookup(key, now)
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._remember(key, value[0], value[1])
+            return value[1]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        """ Stores the generations for a prompt and model configuration."""
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, return_val)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, used, value) VALUES (?, ?, ?, ?)",
+                    (key, now, now, self._dumps(return_val)),
+                )
+                self._evict_disk(now)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing LLM response to the disk cache: {e}")
+
+    def clear(self, **kwargs: Any):
+        """ Removes every cached response from memory and disk."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    # The async variants run in a worker thread, so disk reads and commits do not stall the event loop
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return await asyncio.to_thread(self.lookup, prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any):
+        await asyncio.to_thread(self.clear, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """ Returns a snapshot of the hit, miss and eviction counters and the current sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            if self._connection is not None:
+                stats["disk_entries"] = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return stats
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        """ Returns the content address of a prompt rendered for a model configuration."""
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """ The disk store, opened on first access; None if there is none."""
+        if not self._opened:
+            with self._open_lock:
+                if not self._opened:
+                    self._connection = self._open(self.path) if self.path else None
+                    self._opened = True
+        return self._connection
+
+    def _open(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, used REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            db.commit()
+            return db
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error opening the LLM disk cache {path}, caching in memory only: {e}")
+            return None
+
+    def _disk_lookup(self, key: str, now: float) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0], now):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0], self._loads(row[1])
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            logger.error(f"Error reading LLM response from the disk cache: {e}")
+            return None
+
+    def _remember(self, key: str, created: float, value: RETURN_VAL_TYPE):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        if self.ttl > 0:
+            expired = self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+            self._counters["evictions"] += max(expired, 0)
+        overflow = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.disk_size
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used LIMIT ?)", (overflow,)
+            )
+            self._counters["evictions"] += overflow
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl > 0 and now - created > self.ttl
+
+    @staticmethod
+    def _dumps(generations: Sequence[Generation]) -> str:
+        return json.dumps([
+            {"text": generation.text, "message": messages_to_dict([generation.message])[0]}
+            if isinstance(generation, ChatGeneration) else {"text": generation.text}
+            for generation in generations
+        ])
+
+    @staticmethod
+    def _loads(value: str) -> RETURN_VAL_TYPE:
+        return [
+            ChatGeneration(message=messages_from_dict([item["message"]])[0]) if "message" in item
+            else Generation(text=item["text"])
+            for item in json.loads(value)
+        ]
+
+
+# Shared by all chat models of the process, None if caching is disabled
+LLM_CACHE = LLMResponseCache() if LLM_CACHE_ENABLED else None
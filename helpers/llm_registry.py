@@ -0,0 +1,156 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Type
+
+from langchain_core.caches import BaseCache
+from langchain_core.output_parsers import BaseOutputParser, JsonOutputParser, StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from .diary_metrics import DIARY_METRICS
+from .llm_cache import LLM_CACHE
+from .telemetry import LLM_LATENCY_CALLBACK
+from .prompt_store import PromptStore, PROMPT_STORE
+from .structured_helper import (
+    Task, ProjectOutput, ProjectTasks, TaskList, ProjectOutputList, ProjectTasksList
+)
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Validate environment variables
+OPENAI_KEY = os.getenv("OpenAIKey")
+# OpenAI-compatible endpoint, unset uses the OpenAI API (or OPENAI_BASE_URL)
+OPENAI_BASE_URL = os.getenv("OpenAIBaseUrl")
+
+LLM_MODEL = "chatgpt-4o-latest"
+# chatgpt-4o-latest does not support tools or JSON schemas, structured stages use a snapshot that does
+STRUCTURED_LLM_MODEL = os.getenv("StructuredOutputModel", "gpt-4o")
+# "function_calling" or "json_schema", see ChatOpenAI.with_structured_output
+STRUCTURED_OUTPUT_METHOD = os.getenv("StructuredOutputMethod", "function_calling")
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    """
+    Describes the chain of one LLM stage of the diary pipeline.
+
+    The prompt file is used as a single message with the given role. Stages with a
+    schema get JSON format instructions as `json_format`. Stages with an `output` model
+    bind it as structured output (tool call or JSON schema) and return its validated
+    `items`, their format instructions describe that model, so the prompt asks for the
+    same shape as the tool. Other schema stages parse the free-form reply as JSON.
+    """
+    prompt_file: str
+    role: str = "system"
+    temperature: float = 0
+    schema: Optional[Type[BaseModel]] = None
+    extra_messages: Tuple[Tuple[str, str], ...] = ()
+    model_name: str = LLM_MODEL
+    output: Optional[Type[BaseModel]] = None
+    output_method: str = STRUCTURED_OUTPUT_METHOD
+
+
+STAGES: Dict[str, StageSpec] = {
+    "summary": StageSpec("dairy_summary_prompt copy 2.md", role="user"),
+    "summary_reduce": StageSpec("dairy_summary_reduce_prompt.md", role="user"),
+    "next_steps": StageSpec("dairy_next_steps_prompt.md", temperature=0.5, extra_messages=(("user", "{structured_summary}"),)),
+    "extract_projects": StageSpec("extract_projects_prompt_json.md", schema=ProjectOutput,
+                                  output=ProjectOutputList, model_name=STRUCTURED_LLM_MODEL),
+    "identify_all_projects": StageSpec("identify_all_projects.md", schema=ProjectOutput,
+                                       output=ProjectOutputList, model_name=STRUCTURED_LLM_MODEL),
+    "identify_tasks": StageSpec("identify_tasks_for_project.md", schema=Task,
+                                output=TaskList, model_name=STRUCTURED_LLM_MODEL),
+    "initial_tasks": StageSpec("initial_task_creation.md", schema=Task,
+                               output=TaskList, model_name=STRUCTURED_LLM_MODEL),
+    "identify_tasks_batch": StageSpec("identify_tasks_for_projects_batch.md", schema=ProjectTasks,
+                                      output=ProjectTasksList, model_name=STRUCTURED_LLM_MODEL),
+}
+
+
+@dataclass
+class Stage:
+    """ A prebuilt stage: prompt | model | parser (or prompt | structured model), plus its parts."""
+    chain: Runnable
+    model: ChatOpenAI
+    parser: BaseOutputParser
+
+
+class LLMRegistry:
+    """
+    Builds chat models and stage chains once and hands out the same instances on every call.
+
+    Models are keyed by (model name, temperature), so stages with equal settings share one
+    client and its pool of HTTP connections to the LLM endpoint. A stage is rebuilt when
+    the prompt store reports a new version of its prompt file. All models share one
+    response cache, so repeated prompts are answered without calling the model.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, stages: Optional[Dict[str, StageSpec]] = None,
+                 prompts: Optional[PromptStore] = None, cache: Optional[BaseCache] = LLM_CACHE):
+        """
+        Args:
+            api_key (str, optional): OpenAI API key, defaults to the OpenAIKey environment variable.
+            stages (dict, optional): Stage specifications, defaults to STAGES.
+            prompts (PromptStore, optional): Source of the prompt texts, defaults to PROMPT_STORE.
+            cache (BaseCache, optional): Response cache of the models, defaults to LLM_CACHE.
+        """
+        self.api_key = api_key or OPENAI_KEY
+        self.specs = stages or STAGES
+        self.prompts = prompts or PROMPT_STORE
+        self.cache = cache
+        self._models: Dict[Tuple[str, float], ChatOpenAI] = {}
+        self._stages: Dict[str, Tuple[float, Stage]] = {}
+
+    def model(self, model_name: str = LLM_MODEL, temperature: float = 0) -> ChatOpenAI:
+        """ Returns the shared chat model for the given model name and temperature."""
+        key = (model_name, float(temperature))
+        if key not in self._models:
+            # Token usage (also of streamed calls) and latency are reported to the metrics
+            self._models[key] = ChatOpenAI(model_name=model_name, temperature=temperature, api_key=self.api_key, base_url=OPENAI_BASE_URL,
+                                           cache=self.cache, stream_usage=True, callbacks=[DIARY_METRICS.callback, LLM_LATENCY_CALLBACK])
+            logger.debug(f"Created chat model {model_name} (temperature {temperature}).")
+        return self._models[key]
+
+    def stage(self, name: str) -> Stage:
+        """ Returns the prebuilt chain of a stage, building it on first use or after its prompt changed."""
+        spec = self.specs[name]
+        prompt, version = self.prompts.get(spec.prompt_file)
+        cached = self._stages.get(name)
+        if cached is None or cached[0] != version:
+            cached = (version, self._build_stage(spec, prompt))
+            self._stages[name] = cached
+        return cached[1]
+
+    def prompt_text(self, name: str) -> str:
+        """ Returns the current prompt text of a stage, e.g. to estimate the size of a call."""
+        return self.prompts.text(self.specs[name].prompt_file)
+
+    def warm_up(self):
+        """ Builds every model and stage chain up front, e.g. at app startup."""
+        for name in self.specs:
+            self.stage(name)
+        logger.info(f"Built {len(self._stages)} LLM stages on {len(self._models)} models.")
+
+    def _build_stage(self, spec: StageSpec, prompt: str) -> Stage:
+        model = self.model(spec.model_name, spec.temperature)
+        prompt_template = ChatPromptTemplate.from_messages([(spec.role, prompt), *spec.extra_messages])
+        if spec.schema is not None:
+            parser = JsonOutputParser(pydantic_object=spec.output or spec.schema)
+            if "json_format" in prompt_template.input_variables:
+                prompt_template = prompt_template.partial(json_format=parser.get_format_instructions())
+        else:
+            parser = StrOutputParser()
+        if spec.output is not None:
+            structured = model.with_structured_output(spec.output, method=spec.output_method)
+            chain = prompt_template | structured | RunnableLambda(lambda result: result.items)
+            return Stage(chain=chain, model=model, parser=parser)
+        return Stage(chain=prompt_template | model | parser, model=model, parser=parser)
+
+
+# Shared by all helpers in the process
+LLM_REGISTRY = LLMRegistry()
@@ -0,0 +1,328 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Maximum characters of one rich text object
+NOTION_TEXT_LIMIT = 2000
+# Maximum rich text objects per block
+NOTION_RICH_TEXT_LIMIT = 100
+# Nested blocks Notion creates in one request: a top-level block, its children and their children
+NOTION_MAX_DEPTH = 3
+
+# Code block languages Notion knows, with common fence aliases
+CODE_LANGUAGES = {
+    "bash": "bash", "sh": "shell", "shell": "shell", "zsh": "shell", "c": "c", "cpp": "c++", "c++": "c++",
+    "cs": "c#", "csharp": "c#", "css": "css", "diff": "diff", "go": "go", "html": "html", "java": "java",
+    "javascript": "javascript", "js": "javascript", "json": "json", "kotlin": "kotlin", "markdown": "markdown",
+    "md": "markdown", "powershell": "powershell", "python": "python", "py": "python", "ruby": "ruby",
+    "rust": "rust", "sql": "sql", "typescript": "typescript", "ts": "typescript", "xml": "xml",
+    "yaml": "yaml", "yml": "yaml",
+}
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_DIVIDER = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+_FENCE = re.compile(r"^(`{3,}|~{3,})\s*([\w+#-]*)")
+_LIST_ITEM = re.compile(r"^([-*+]|\d{1,9}[.)])\s+(?:\[([ xX])\]\s+)?(.*)$")
+_QUOTE = re.compile(r"^>\s?(.*)$")
+# Inline tokens: code spans, links, bare URLs and emphasis delimiters. Only web and mail links
+# are links, Notion rejects the page for other targets such as relative paths or anchors.
+_INLINE = re.compile(
+    r"(?P<code>`+)(?P<code_text>.+?)(?P=code)"
+    r"|\[(?P<link_text>[^\]\n]+)\]\((?P<link_url>(?i:https?://|mailto:)[^)\s]+)(?:\s+\"[^\"]*\")?\)"
+    r"|(?P<url>https?://[^\s<>()\[\]]+[^\s<>()\[\].,;:!?\"'])"
+    r"|(?P<delim>\*\*\*|___|\*\*|__|~~|\*|_)"
+)
+
+_ANNOTATIONS = {
+    "***": ("bold", "italic"), "___": ("bold", "italic"), "**": ("bold",), "__": ("bold",),
+    "*": ("italic",), "_": ("italic",), "~~": ("strikethrough",),
+}
+
+
+def _rich_text(content: str, annotations: Tuple[str, ...] = (), url: Optional[str] = None) -> dict:
+    text = {"content": content}
+    if url:
+        text["link"] = {"url": url}
+    item = {"type": "text", "text": text}
+    if annotations:
+        item["annotations"] = {annotation: True for annotation in annotations}
+    return item
+
+
+def _tokenize(text: str) -> List[list]:
+    """
+    Splits inline Markdown into text, code, link and delimiter tokens, then pairs the
+    delimiters with a stack. Unpaired delimiters and pairs around nothing become text,
+    so "2 * 3" and "****" stay as they are.
+    """
+    tokens: List[list] = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            tokens.append(["text", text[position:match.start()]])
+        position = match.end()
+        if match.group("code"):
+            tokens.append(["code", match.group("code_text").strip() or match.group("code_text")])
+        elif match.group("link_text"):
+            tokens.append(["link", match.group("link_text"), match.group("link_url")])
+        elif match.group("url"):
+            tokens.append(["url", match.group("url")])
+        else:
+            delim = match.group("delim")
+            before = text[match.start() - 1] if match.start() > 0 else " "
+            after = text[match.end()] if match.end() < len(text) else " "
+            # Underscores inside words (snake_case) are no emphasis
+            if delim[0] == "_" and before.isalnum() and after.isalnum():
+                tokens.append(["text", delim])
+            else:
+                tokens.append(["delim", delim, not after.isspace(), not before.isspace()])
+    if position < len(text):
+        tokens.append(["text", text[position:]])
+
+    openers: List[int] = []
+    for index, token in enumerate(tokens):
+        if token[0] != "delim":
+            continue
+        _, delim, can_open, can_close = token
+        match = next((depth for depth in range(len(openers) - 1, -1, -1) if tokens[openers[depth]][1] == delim), None)
+        if can_close and match is not None and openers[match] == index - 1:
+            # Nothing between opener and closer, keep the opener as text and let this one open
+            tokens[openers.pop()] = ["text", delim]
+            match = None
+        if can_close and match is not None:
+            for unmatched in openers[match + 1:]:
+                tokens[unmatched] = ["text", tokens[unmatched][1]]
+            tokens[openers[match]] = ["open", _ANNOTATIONS[delim]]
+            tokens[index] = ["close", _ANNOTATIONS[delim]]
+            del openers[match:]
+        elif can_open:
+            openers.append(index)
+        else:
+            tokens[index] = ["text", delim]
+    for unmatched in openers:
+        tokens[unmatched] = ["text", tokens[unmatched][1]]
+    return tokens
+
+
+def parse_inline(text: str) -> List[dict]:
+    """
+    Converts inline Markdown (bold, italics, strikethrough, code spans, links) into Notion
+    rich text. Adjacent runs with the same formatting are merged, runs longer than
+    NOTION_TEXT_LIMIT are split.
+
+    Args:
+        text (str): One paragraph, heading or list item without its block syntax.
+
+    Returns:
+        list: Notion rich text objects.
+    """
+    runs: List[Tuple[str, Tuple[str, ...], Optional[str]]] = []
+    active: Dict[str, int] = {}
+
+    def add(content: str, extra: Tuple[str, ...] = (), url: Optional[str] = None):
+        if not content:
+            return
+        annotations = tuple(sorted({name for name, count in active.items() if count > 0} | set(extra)))
+        if runs and runs[-1][1] == annotations and runs[-1][2] == url:
+            runs[-1] = (runs[-1][0] + content, annotations, url)
+        else:
+            runs.append((content, annotations, url))
+
+    for token in _tokenize(text):
+        kind = token[0]
+        if kind == "text":
+            add(token[1])
+        elif kind == "code":
+            add(token[1], ("code",))
+        elif kind == "url":
+            add(token[1], url=token[1])
+        elif kind == "link":
+            for item in parse_inline(token[1]):
+                add(item["text"]["content"], tuple(item.get("annotations", ())), token[2])
+        elif kind == "open":
+            for name in token[1]:
+                active[name] = active.get(name, 0) + 1
+        elif kind == "close":
+            for name in token[1]:
+                active[name] -= 1
+
+    rich_text = []
+    for content, annotations, url in runs:
+        for start in range(0, len(content), NOTION_TEXT_LIMIT):
+            rich_text.append(_rich_text(content[start:start + NOTION_TEXT_LIMIT], annotations, url))
+    return rich_text
+
+
+def _blocks(block_type: str, rich_text: List[dict], **extra) -> List[dict]:
+    """ One block, or several if the rich text has more objects than a block takes."""
+    chunks = [rich_text[start:start + NOTION_RICH_TEXT_LIMIT] for start in range(0, len(rich_text), NOTION_RICH_TEXT_LIMIT)]
+    return [{"object": "block", "type": block_type, block_type: {"rich_text": chunk, **extra}} for chunk in chunks or [[]]]
+
+
+def _code_blocks(lines: List[str], language: str) -> List[dict]:
+    """ A code block with its text split into rich text objects of at most NOTION_TEXT_LIMIT characters."""
+    content = "\n".join(lines)
+    rich_text = [_rich_text(content[start:start + NOTION_TEXT_LIMIT]) for start in range(0, len(content), NOTION_TEXT_LIMIT)]
+    return _blocks("code", rich_text, language=language)
+
+
+@dataclass
+class _ListItem:
+    indent: int
+    block_type: str
+    lines: List[str]
+    checked: Optional[bool] = None
+    children: List[dict] = field(default_factory=list)
+
+    def blocks(self) -> List[dict]:
+        extra = {"checked": self.checked} if self.block_type == "to_do" else {}
+        blocks = _blocks(self.block_type, parse_inline(_join_lines(self.lines)), **extra)
+        if self.children:
+            blocks[0][self.block_type]["children"] = self.children
+        return blocks
+
+
+def _join_lines(lines: List[str]) -> str:
+    """ Joins the lines of a block; lines ending in two spaces or a backslash keep their line break."""
+    parts = []
+    for number, line in enumerate(lines):
+        hard_break = line.endswith("  ") or line.endswith("\\")
+        text = line.rstrip().rstrip("\\") if hard_break else line.strip()
+        parts.append(text)
+        if number < len(lines) - 1:
+            parts.append("\n" if hard_break else " ")
+    return "".join(parts).strip()
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """ Yields complete lines from text that may arrive in arbitrary chunks."""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        if "\n" not in chunk:
+            continue
+        *lines, pending = pending.split("\n")
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_notion_blocks(markdown: Union[str, Iterable[str]]) -> Iterator[dict]:
+    """
+    Converts Markdown into Notion blocks in a single pass, yielding each block as soon as it is complete.
+
+    Supports headings (levels 4-6 become heading_3), paragraphs (consecutive lines are
+    merged), bulleted, numbered and task lists nested by indentation (up to the depth
+    Notion accepts in one request), block quotes, fenced code and dividers, with inline
+    bold, italics, strikethrough, code and web or mail links. Text over Notion's length
+    limits is split into several rich text objects or blocks.
+
+    Args:
+        markdown (str or iterable of str): The Markdown text, or chunks of it as they arrive.
+
+    Yields:
+        dict: Notion block objects.
+    """
+    chunks = [markdown] if isinstance(markdown, str) else markdown
+    paragraph: List[str] = []
+    quote: List[str] = []
+    items: List[_ListItem] = []
+    code: Optional[List[str]] = None
+    fence = ""
+    language = "plain text"
+
+    def close_item() -> Iterator[dict]:
+        item = items.pop()
+        blocks = item.blocks()
+        if items:
+            items[-1].children.extend(blocks)
+        else:
+            yield from blocks
+
+    def flush() -> Iterator[dict]:
+        if paragraph:
+            yield from _blocks("paragraph", parse_inline(_join_lines(paragraph)))
+            paragraph.clear()
+        if quote:
+            yield from _blocks("quote", parse_inline(_join_lines(quote)))
+            quote.clear()
+        while items:
+            yield from close_item()
+
+    for raw_line in _iter_lines(chunks):
+        raw_line = raw_line.rstrip("\r").expandtabs(4)
+
+        if code is not None:
+            if raw_line.strip().startswith(fence):
+                yield from _code_blocks(code, language)
+                code = None
+            else:
+                code.append(raw_line)
+            continue
+
+        line = raw_line.strip()
+        indent = len(raw_line) - len(raw_line.lstrip())
+        if not line:
+            if paragraph or quote:
+                yield from flush()
+            continue
+
+        fence_match = _FENCE.match(line)
+        if fence_match:
+            yield from flush()
+            fence = fence_match.group(1)
+            language = CODE_LANGUAGES.get(fence_match.group(2).lower(), "plain text")
+            code = []
+            continue
+
+        list_match = _LIST_ITEM.match(raw_line.lstrip())
+        if list_match and not _DIVIDER.match(line):
+            if paragraph or quote:
+                yield from flush()
+            # Close the previous siblings and their children
+            while items and items[-1].indent >= indent:
+                yield from close_item()
+            marker, checkbox, text = list_match.groups()
+            if checkbox is not None:
+                block_type, checked = "to_do", checkbox.lower() == "x"
+            else:
+                block_type = "bulleted_list_item" if marker in "-*+" else "numbered_list_item"
+                checked = None
+            # Deeper items than Notion accepts become siblings of the deepest allowed level
+            while len(items) >= NOTION_MAX_DEPTH:
+                yield from close_item()
+            items.append(_ListItem(indent, block_type, [text], checked))
+            continue
+
+        if items and indent > items[-1].indent:
+            # Continuation of the current list item
+            items[-1].lines.append(raw_line)
+            continue
+
+        heading_match = _HEADING.match(line)
+        if heading_match:
+            yield from flush()
+            level = min(len(heading_match.group(1)), 3)
+            yield from _blocks(f"heading_{level}", parse_inline(heading_match.group(2)))
+            continue
+
+        if _DIVIDER.match(line):
+            yield from flush()
+            yield {"object": "block", "type": "divider", "divider": {}}
+            continue
+
+        quote_match = _QUOTE.match(raw_line.lstrip())
+        if quote_match:
+            if paragraph or items:
+                yield from flush()
+            quote.append(quote_match.group(1))
+            continue
+
+        if quote or items:
+            yield from flush()
+        paragraph.append(raw_line)
+
+    if code is not None:
+        # Unterminated fence: keep the text as code
+        yield from _code_blocks(code, language)
+    yield from flush()
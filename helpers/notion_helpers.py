@@ -1,10 +1,18 @@
 import logging
 import os 
 import requests
+import time
 from datetime import datetime
 
 
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from urllib3.exceptions import NewConnectionError
+
+from .diary_metrics import DIARY_METRICS
+from .markdown_blocks import iter_notion_blocks
+from .notion_rate_limiter import NOTION_RATE_LIMITER
+from .telemetry import NOTION_LATENCY
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -25,9 +33,36 @@ REQUIRED_ENV_VARS = {
     "TasksDatabaseId": TASKS_DATABASE_ID
 }
 
+# Base URL of the Notion API, overridable to point at a stand-in server (see benchmarks/)
+NOTION_API_URL = os.getenv("NotionApiUrl", "https://api.notion.com/v1")
+NOTION_VERSION = "2022-06-28"
+# Number of rows or blocks requested per page of a paginated query (Notion allows at most 100)
+NOTION_PAGE_SIZE = int(os.getenv("NotionPageSize", "100"))
+# Maximum number of conditions in one compound ("or") filter
+NOTION_FILTER_LIMIT = 100
+# Maximum number of child blocks Notion accepts in one request
+NOTION_MAX_CHILDREN = 100
+
+# Keys returned per project by query_all_projects
+PROJECT_FIELDS = (
+    "project_id", "created_time", "last_edited_time", "created_by", "last_edited_by", "archived",
+    "icon", "cover", "parent", "parent_id", "url", "public_url",
+    "project_name", "status", "status_color", "owner", "completion_percentage", "dates", "priority",
+    "priority_color", "summary", "tasks", "is_blocking", "blocked_by", "sign_off_project",
+    "page_content", "tasks_details",
+)
+# Project fields that cost additional requests per project and are only fetched on demand
+PROJECT_DETAIL_FIELDS = ("page_content", "tasks_details")
+
+def _connection_refused(error: requests.exceptions.ConnectionError) -> bool:
+    """ Whether the connection could not be established, so nothing was sent."""
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
 class NotionHelpers:
     """
-    A helper class for converting Markdown text into Notion-compatible blocks.
+    Client for the Notion API: diary pages, projects and tasks.
     """
 
     def __init__(self):
@@ -45,32 +80,17 @@ class NotionHelpers:
         """
         Converts a Markdown string into a list of Notion-compatible block objects.
 
+        See `iter_notion_blocks` for the supported Markdown; text over Notion's length
+        limits is split.
+
         Args:
             markdown_text (str): The Markdown string to be converted.
 
         Returns:
             list: A list of Notion block objects.
         """
-        blocks = []
         try:
-            lines = markdown_text.split("\n")
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith("### "):
-                    blocks.append({"object": "block", "type": "heading_3", "heading_3": {"rich_text": [{"type": "text", "text": {"content": line[4:]}}]}})
-                elif line.startswith("## "):
-                    blocks.append({"object": "block", "type": "heading_2", "heading_2": {"rich_text": [{"type": "text", "text": {"content": line[3:]}}]}})
-                elif line.startswith("# "):
-                    blocks.append({"object": "block", "type": "heading_1", "heading_1": {"rich_text": [{"type": "text", "text": {"content": line[2:]}}]}})
-                elif line.startswith("- ") or line.startswith("* "):
-                    blocks.append({"object": "block", "type": "bulleted_list_item", "bulleted_list_item": {"rich_text": [{"type": "text", "text": {"content": line[2:]}}]}})
-                elif line == "---":
-                    blocks.append({"object": "block", "type": "divider", "divider": {}})
-                else:
-                    blocks.append({"object": "block", "type": "paragraph", "paragraph": {"rich_text": [{"type": "text", "text": {"content": line}}]}})
-            return blocks
+            return list(iter_notion_blocks(markdown_text))
         except Exception as e:
             self.logger.error("Error converting markdown to Notion blocks", exc_info=True)
             return []
@@ -85,38 +105,34 @@ class NotionHelpers:
         Returns:
             List[str]: A list of task names associated with the project.
         """
-        url = f"https://api.notion.com/v1/databases/{TASKS_DATABASE_ID}/query"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
-        
         try:
-            # Query the database for tasks
-            response = requests.post(url, headers=headers, json={
-                "filter": {
-                    "property": "Project",
-                    "relation": {
-                        "contains": project_id
-                    }
-                }
-            })
-            response.raise_for_status()
-            
-            # Parse the response
-            tasks = response.json().get("results", [])
-            task_names = []
-            for task in tasks:
-                task_name = task.get("properties", {}).get("Task name", {}).get("title", [])
-                if task_name:
-                    task_names.append(task_name[0].get("plain_text", ""))
-            
-            return task_names
-
+            return list(self.iter_tasks_by_project(project_id))
         except requests.exceptions.RequestException as e:
             self.logger.error(f"Error retrieving tasks for project {project_id}: {e}")
             return []
+
+    def iter_tasks_by_project(self, project_id: str, page_size: int = NOTION_PAGE_SIZE) -> Iterator[str]:
+        """
+        Yields the names of all tasks associated with a project, page by page.
+
+        Args:
+            project_id (str): The ID of the project to retrieve tasks for.
+            page_size (int): Number of tasks requested per page.
+
+        Yields:
+            str: The name of each task.
+
+        Raises:
+            requests.exceptions.RequestException: If a page cannot be retrieved.
+        """
+        query_filter = {
+            "property": "Project",
+            "relation": {
+                "contains": project_id
+            }
+        }
+        for tasks in self._iter_query_pages(TASKS_DATABASE_ID, query_filter, page_size):
+            yield from self._parse_task_names(tasks)
         
     # def get_tasks_by_project(self, project_id: str) -> List[str]:
     #     """
@@ -161,6 +177,30 @@ class NotionHelpers:
     #         logger.error(f"Error retrieving tasks for project {project_id}: {e}")
     #         return []
 
+    def get_tasks_by_projects(self, project_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Retrieves the task names of several projects with as few queries as possible.
+
+        The projects are combined into "or" relation filters of up to NOTION_FILTER_LIMIT
+        conditions, so one paginated query usually covers all of them.
+
+        Args:
+            project_ids (iterable of str): The IDs of the projects to retrieve tasks for.
+
+        Returns:
+            Dict[str, List[str]]: Task names per requested project ID, or an empty dict if an error occurs.
+        """
+        try:
+            project_ids = list(dict.fromkeys(project_ids))
+            index = {project_id: [] for project_id in project_ids}
+            for query_filter, lookup in self._project_relation_filters(project_ids):
+                for tasks in self._iter_query_pages(TASKS_DATABASE_ID, query_filter, NOTION_PAGE_SIZE):
+                    self._index_task_names(tasks, lookup, index)
+            return index
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Error retrieving tasks for projects {project_ids}: {e}")
+            return {}
+
     def split_text_into_chunks(self, text: str, chunk_size: int = 1900):
         """
         Split the input text into smaller chunks of a given size.
@@ -188,177 +228,141 @@ class NotionHelpers:
         Returns:
             str: Result message indicating success or failure.
         """
-        # Convert text chunks to Notion blocks
-        blocks = []
         try:
-
-            for chunk in text_chunks:
-                blocks.append({
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [{"type": "text", "text": {"content": chunk}}]
-                    }
-                })
-
             # Define the request payload
-            payload = {
-                "parent": {"page_id": parent_page_id},
-                "properties": {
-                    "Name": {
-                        "title": [{"text": {"content": title}}]
-                    }
-                },
-                "children": blocks
-            }
-
-            # Define the API endpoint and headers
-            url = "https://api.notion.com/v1/pages"
-            headers = {
-                "Authorization": f"Bearer {NOTION_API_KEY}",
-                "Content-Type": "application/json",
-                "Notion-Version": "2022-06-28"
-            }
-
-            # Make the POST request to create the subpage
-            response = requests.post(url, json=payload, headers=headers)
-            if response.status_code == 200:
-                logger.info("Subpage created successfully.")
-                return "Subpage created successfully."
-            else:
-                logging.error(f"Failed to create subpage: {response.status_code} {response.text}")
-                return "Failed to create subpage."
+            payload = self._subpage_payload(parent_page_id, title, text_chunks)
+
+            # Create the subpage, appending the chunks beyond the first batch
+            self.create_page(payload)
+            logger.info("Subpage created successfully.")
+            return "Subpage created successfully."
+        except requests.exceptions.HTTPError as e:
+            logging.error(f"Failed to create subpage: {e.response.status_code} {e.response.text}")
+            return "Failed to create subpage."
         except Exception as e:
             logger.error(f"Error creating subpage: {e}")
             return "Failed to create subpage."
 
     
     def create_notion_page_with_case_study(self, dairy_txt, raw_diary: str):
-        """ Creates a new page in a Notion database with the provided diary text."""
+        """
+        Creates a new page in a Notion database with the provided diary text.
+
+        If writing the content fails after the page exists, the reply says so and links
+        the incomplete page.
+        """
         try:
-            today_title = datetime.now().strftime("%d.%m.%Y")
-            blocks = self.markdown_to_notion_blocks(dairy_txt)
-            payload = {
-                "parent": {"database_id": DATABASE_ID},
-                "properties": {"Name": {"title": [{"text": {"content": today_title}}]}},
-                "children": blocks
-            }
-            url = "https://api.notion.com/v1/pages"
-            headers = {
-                "Authorization": f"Bearer {NOTION_API_KEY}",
-                "Content-Type": "application/json",
-                "Notion-Version": "2022-06-28"
-            }
-            response = requests.post(url, json=payload, headers=headers)
-            if response.status_code == 200:
-                page_id = response.json().get("id")
-                logger.info(f"Created Notion page with ID: {page_id}")
-                text_chunks = self.split_text_into_chunks(raw_diary)
-                subpage_title = "Raw Diary Text"
-                _ = self.create_notion_subpage(page_id, subpage_title, text_chunks)
-                return "Page created successfully."
-            else:
-                return "Failed to create page."
+            payload, remaining = self._split_children(self._case_study_payload(dairy_txt))
+            data = self._request("POST", "/pages", payload)
+            page_id = data.get("id")
+            logger.info(f"Created Notion page with ID: {page_id}")
+            text_chunks = self.split_text_into_chunks(raw_diary)
+            subpage_title = "Raw Diary Text"
+            try:
+                self.append_blocks(page_id, remaining)
+                self.create_page(self._subpage_payload(page_id, subpage_title, text_chunks))
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Created Notion page {page_id}, but writing its content failed: {e}")
+                return f"Page created, but appending its content failed: {data.get('url') or page_id}"
+            return "Page created successfully."
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Failed to create page: {e.response.status_code} {e.response.text}")
+            return "Failed to create page."
         except Exception as e:
             logger.error(f"Error in create_notion_page_with_case_study: {e}")
             return "An error occurred while creating the Notion page."
 
-    def query_all_projects(self):
+    def create_page(self, payload: dict) -> dict:
         """
-        Queries all projects from the Notion Projects database and extracts all available details.
+        Creates a page with any number of child blocks.
+
+        Notion accepts at most NOTION_MAX_CHILDREN blocks per request, so the page is
+        created with the first batch and the remaining blocks are appended in batches.
+
+        Args:
+            payload (dict): The page payload, including all "children".
 
         Returns:
-            list: A list of dictionaries containing detailed project information, or an empty list if an error occurs.
+            dict: The created page as returned by Notion.
+
+        Raises:
+            requests.exceptions.HTTPError: If the page cannot be created or a batch cannot be appended.
         """
-        url = f"https://api.notion.com/v1/databases/{PROJECTS_DATABASE_ID}/query"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
+        first_batch, remaining = self._split_children(payload)
+        data = self._request("POST", "/pages", first_batch)
+        self.append_blocks(data.get("id"), remaining)
+        return data
 
-        try:
-            response = requests.post(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            projects = data.get("results", [])
-            project_details = []
+    def append_blocks(self, block_id: str, blocks: List[dict]):
+        """
+        Appends blocks to a page or block in batches of at most NOTION_MAX_CHILDREN.
 
-            for project in projects:
-                properties = project.get("properties", {})
-
-                # Extract metadata and core project details
-                project_id = project.get("id", "") or ""
-                created_time = project.get("created_time", "") or ""
-                last_edited_time = project.get("last_edited_time", "") or ""
-                created_by = (project.get("created_by", {}) or {}).get("id", "") or ""
-                last_edited_by = (project.get("last_edited_by", {}) or {}).get("id", "") or ""
-                archived = project.get("archived", False)
-                icon = (project.get("icon", {}) or {}).get("emoji", "") or ""
-                cover = project.get("cover", None)
-                parent = (project.get("parent", {}) or {}).get("type", "") or ""
-                parent_id = (project.get("parent", {}) or {}).get("database_id", "") or ""
-                url = project.get("url", "") or ""
-                public_url = project.get("public_url", None)
-
-                # Safely extract project-specific fields from properties
-                project_name = (properties.get("Project name", {}).get("title", [{}])[0].get("plain_text", "") or "")
-                status = (properties.get("Status", {}).get("status", {}) or {}).get("name", "") or ""
-                status_color = (properties.get("Status", {}).get("status", {}) or {}).get("color", "") or ""
-                owner = [person.get("id", "") for person in (properties.get("Owner", {}).get("people", []) or [])]
-                completion_percentage = (properties.get("Completion", {}).get("rollup", {}) or {}).get("number", None)
-                dates = properties.get("Dates", {}).get("date", {}) or {}
-                priority = (properties.get("Priority", {}).get("select", {}) or {}).get("name", "") or ""
-                priority_color = (properties.get("Priority", {}).get("select", {}) or {}).get("color", "") or ""
-                summary = (properties.get("Summary", {}).get("rich_text", [{}])[0].get("plain_text", "") or "")
-                tasks = [task.get("id", "") for task in (properties.get("Tasks", {}).get("relation", []) or [])]
-                is_blocking = [relation.get("id", "") for relation in (properties.get("Is Blocking", {}).get("relation", []) or [])]
-                blocked_by = [relation.get("id", "") for relation in (properties.get("Blocked By", {}).get("relation", []) or [])]
-                sign_off_project = properties.get("Sign off project?", {}).get("type", "") or ""
+        The batches are sent one after the other, since concurrent appends to the
+        same parent would interleave.
 
-                # Fetch page content and task details
-                page_content = self.get_page_content(project_id)
-                task_details = self.get_all_tasks(tasks)           
-                # Append all extracted data to the project details list
-                project_details.append({
-                    # Metadata
-                    "project_id": project_id,
-                    "created_time": created_time,
-                    "last_edited_time": last_edited_time,
-                    "created_by": created_by,
-                    "last_edited_by": last_edited_by,
-                    "archived": archived,
-                    "icon": icon,
-                    "cover": cover,
-                    "parent": parent,
-                    "parent_id": parent_id,
-                    "url": url,
-                    "public_url": public_url,
-
-                    # Project Properties
-                    "project_name": project_name,
-                    "status": status,
-                    "status_color": status_color,
-                    "owner": owner,
-                    "completion_percentage": completion_percentage,
-                    "dates": dates,
-                    "priority": priority,
-                    "priority_color": priority_color,
-                    "summary": summary,
-                    "tasks": tasks,
-                    "is_blocking": is_blocking,
-                    "blocked_by": blocked_by,
-                    "sign_off_project": sign_off_project,
-                    "page_content": page_content,
-                    "tasks_details": task_details
-                })               
+        Raises:
+            requests.exceptions.HTTPError: If a batch cannot be appended.
+        """
+        for start in range(0, len(blocks), NOTION_MAX_CHILDREN):
+            self._request("PATCH", f"/blocks/{block_id}/children", {"children": blocks[start:start + NOTION_MAX_CHILDREN]})
 
-            return project_details
+    def query_all_projects(self, fields: Optional[Iterable[str]] = None):
+        """
+        Queries all projects from the Notion Projects database and extracts all available details.
 
+        Args:
+            fields (iterable of str, optional): Keys to return per project, e.g. ("project_id", "project_name").
+                "page_content" and "tasks_details" need extra requests per project and are only fetched
+                if requested; use `load_project_details` to fetch them later. Defaults to all fields.
+
+        Returns:
+            list: A list of dictionaries containing detailed project information, or an empty list if an error occurs.
+        """
+        try:
+            return list(self.iter_projects(fields))
         except requests.exceptions.RequestException as e:
             logging.error(f"Error querying projects: {e}")
             return []   
 
+    def iter_projects(self, fields: Optional[Iterable[str]] = None, page_size: int = NOTION_PAGE_SIZE) -> Iterator[dict]:
+        """
+        Yields the projects of the Notion Projects database as the result pages arrive.
+
+        Args:
+            fields (iterable of str, optional): Keys to return per project, see `query_all_projects`.
+            page_size (int): Number of projects requested per page.
+
+        Yields:
+            dict: The projected details of each project.
+
+        Raises:
+            requests.exceptions.RequestException: If a page cannot be retrieved.
+        """
+        fields = self._project_fields(fields)
+        detail_fields = [field for field in PROJECT_DETAIL_FIELDS if field in fields]
+        for projects in self._iter_query_pages(PROJECTS_DATABASE_ID, None, page_size):
+            for project in projects:
+                details = self._parse_project(project)
+                # Fetch page content and task details
+                self.load_project_details(details, detail_fields)
+                yield {field: details[field] for field in fields}
+
+    def load_project_details(self, project: dict, fields: Iterable[str] = PROJECT_DETAIL_FIELDS) -> dict:
+        """
+        Fetches the expensive fields of a project returned by `query_all_projects` on demand.
+
+        Args:
+            project (dict): A project with at least "project_id" and, for "tasks_details", "tasks".
+            fields (iterable of str): Which of PROJECT_DETAIL_FIELDS to fetch.
+
+        Returns:
+            dict: The same project dictionary with the requested fields filled in.
+        """
+        if "page_content" in fields:
+            project["page_content"] = self.get_page_content(project["project_id"])
+        if "tasks_details" in fields:
+            project["tasks_details"] = self.get_all_tasks(project.get("tasks", []))
+        return project
 
     def query_all_tasks(self):
         """
@@ -367,23 +371,28 @@ class NotionHelpers:
         Returns:
             list: A list of task objects, or an empty list if an error occurs.
         """
-        url = f"https://api.notion.com/v1/databases/{TASKS_DATABASE_ID}/query"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
-        
         try:
-            response = requests.post(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            tasks = data.get("results", [])
-            return tasks
+            return list(self.iter_tasks())
         except requests.exceptions.RequestException as e:
             logging.error(f"Error querying tasks: {e}")
             return []
 
+    def iter_tasks(self, page_size: int = NOTION_PAGE_SIZE) -> Iterator[dict]:
+        """
+        Yields the raw task objects of the Notion Tasks database as the result pages arrive.
+
+        Args:
+            page_size (int): Number of tasks requested per page.
+
+        Yields:
+            dict: Each task object.
+
+        Raises:
+            requests.exceptions.RequestException: If a page cannot be retrieved.
+        """
+        for tasks in self._iter_query_pages(TASKS_DATABASE_ID, None, page_size):
+            yield from tasks
+
     def get_all_tasks(self, task_ids):
         """
         Retrieves details for all tasks associated with a project.
@@ -413,41 +422,11 @@ class NotionHelpers:
         Returns:
             dict: A dictionary containing task details, or None if an error occurs.
         """
-        url = f"https://api.notion.com/v1/pages/{task_id}"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
-
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            task = response.json()
+            task = self._request("GET", f"/pages/{task_id}")
 
             # Extract task properties
-            properties = task.get("properties", {})
-            completed_on_date = properties.get("Completed on", {}).get("date", None)
-            completed_on = completed_on_date.get("start", "") if completed_on_date else ""
-            # Extract all fields with default fallbacks
-            task_details = {
-                "task_id": task_id,
-                "task_name": (properties.get("Task name", {}).get("title", [{}])[0].get("plain_text", "") or ""),
-                "status": (properties.get("Status", {}).get("status", {}) or {}).get("name", "") or "",
-                "status_color": (properties.get("Status", {}).get("status", {}) or {}).get("color", "") or "",
-                "due_date": (properties.get("Due", {}).get("date", {}) or {}).get("start", "") or "",
-                "completed_on": (properties.get("Completed on", {}).get("date", {}) or {}).get("start", "") or "",
-                "priority": (properties.get("Priority", {}).get("select", {}) or {}).get("name", "") or "",
-                "priority_color": (properties.get("Priority", {}).get("select", {}) or {}).get("color", "") or "",
-                "tags": [tag.get("name", "") for tag in (properties.get("Tags", {}).get("multi_select", []) or [])],
-                "assignee": [person.get("id", "") for person in (properties.get("Assignee", {}).get("people", []) or [])],
-                "delay": (properties.get("Delay", {}).get("formula", {}) or {}).get("number", "") or "",
-                "sub_tasks": [sub_task.get("id", "") for sub_task in (properties.get("Sub-tasks", {}).get("relation", []) or [])],
-                "parent_task": [parent_task.get("id", "") for parent_task in (properties.get("Parent-task", {}).get("relation", []) or [])],
-                "project": [project.get("id", "") for project in (properties.get("Project", {}).get("relation", []) or [])],
-            }
-
-
+            task_details = self._parse_task(task_id, task)
             return task_details
 
         except requests.exceptions.RequestException as e:
@@ -467,42 +446,12 @@ class NotionHelpers:
         Returns:
             dict: A dictionary containing detailed project information, or None if the project is not found or an error occurs.
         """
-        url = f"https://api.notion.com/v1/pages/{project_id}"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
-
         try:
             # Make the GET request to retrieve the project
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            project = response.json()
+            project = self._request("GET", f"/pages/{project_id}")
 
             # Extract properties
-            properties = project.get("properties", {})
-            project_details = {
-                "project_id": project.get("id", ""),
-                "created_time": project.get("created_time", ""),
-                "last_edited_time": project.get("last_edited_time", ""),
-                "created_by": project.get("created_by", {}).get("id", ""),
-                "last_edited_by": project.get("last_edited_by", {}).get("id", ""),
-                "archived": project.get("archived", False),
-                "icon": project.get("icon", {}).get("emoji", ""),
-                "cover": project.get("cover", None),
-                "parent_type": project.get("parent", {}).get("type", ""),
-                "parent_id": project.get("parent", {}).get("database_id", ""),
-                "url": project.get("url", ""),
-                "project_name": properties.get("Project name", {}).get("title", [{}])[0].get("plain_text", ""),
-                "status": properties.get("Status", {}).get("status", {}).get("name", ""),
-                "status_color": properties.get("Status", {}).get("status", {}).get("color", ""),
-                "owner": [person.get("id") for person in properties.get("Owner", {}).get("people", [])],
-                "dates": properties.get("Dates", {}).get("date", {}),
-                "priority": properties.get("Priority", {}).get("select", {}).get("name", ""),
-                "priority_color": properties.get("Priority", {}).get("select", {}).get("color", ""),
-                "summary": properties.get("Summary", {}).get("rich_text", [{}])[0].get("plain_text", ""),
-            }
+            project_details = self._parse_project_by_id(project)
 
             return project_details
 
@@ -522,38 +471,28 @@ class NotionHelpers:
         Returns:
             list: A list of strings containing the page's text content.
         """
-        url = f"https://api.notion.com/v1/blocks/{page_id}/children"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
-
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            blocks = data.get("results", [])
-            
-            # Extract text content from blocks
-            page_content = []
-            for block in blocks:
-                block_type = block.get("type", "")
-                block_data = block.get(block_type, {})
-                rich_text_list = block_data.get("rich_text", [])
+            return list(self.iter_page_content(page_id))
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error retrieving page content: {e}")
+            return []
 
-                # Concatenate all plain text from rich_text fields
-                block_text = "".join([item.get("plain_text", "") for item in rich_text_list])
+    def iter_page_content(self, page_id, page_size: int = NOTION_PAGE_SIZE) -> Iterator[str]:
+        """
+        Yields the non-empty text of each block of a Notion page as the result pages arrive.
 
-                # Only include non-empty text
-                if block_text.strip():
-                    page_content.append(block_text)
+        Args:
+            page_id (str): The unique ID of the Notion page.
+            page_size (int): Number of blocks requested per page.
 
-            return page_content
+        Yields:
+            str: The text content of each block.
 
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error retrieving page content: {e}")
-            return []
+        Raises:
+            requests.exceptions.RequestException: If a page cannot be retrieved.
+        """
+        for blocks in self._iter_children_pages(page_id, page_size):
+            yield from self._parse_page_text(blocks)
     
     def get_page_content_block_id(self, page_id):
         """
@@ -565,45 +504,29 @@ class NotionHelpers:
         Returns:
             list: A list of dictionaries containing the page's block content, or an empty list if an error occurs.
         """
-        url = f"https://api.notion.com/v1/blocks/{page_id}/children"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
-
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            blocks = data.get("results", [])
-            
-            # Process block content
-            page_content = []
-            for block in blocks:
-                block_type = block.get("type", "")
-                block_data = block.get(block_type, {})
-                text = ""
-
-                # Extract text from text blocks
-                if "text" in block_data:
-                    text = "".join(
-                        [item["plain_text"] for item in block_data.get("text", [])]
-                    )
-                
-                page_content.append({
-                    "block_id": block.get("id", ""),
-                    "type": block_type,
-                    "text": text,
-                    "data": block_data,
-                })
-
-            return page_content
-
+            return list(self.iter_page_content_block_id(page_id))
         except requests.exceptions.RequestException as e:
             logging.error(f"Error retrieving page content: {e}")
             return []
 
+    def iter_page_content_block_id(self, page_id, page_size: int = NOTION_PAGE_SIZE) -> Iterator[dict]:
+        """
+        Yields id, type, text and data of each block of a Notion page as the result pages arrive.
+
+        Args:
+            page_id (str): The unique ID of the Notion page.
+            page_size (int): Number of blocks requested per page.
+
+        Yields:
+            dict: The content of each block.
+
+        Raises:
+            requests.exceptions.RequestException: If a page cannot be retrieved.
+        """
+        for blocks in self._iter_children_pages(page_id, page_size):
+            yield from self._parse_page_blocks(blocks)
+
     def add_tasks_to_project(self, project_id, tasks):
         """
         Adds one or more tasks to a project in the Notion database.
@@ -618,66 +541,35 @@ class NotionHelpers:
                 - assignee (list, optional): List of assignee IDs.
 
         Returns:
-            str: A message indicating success or failure for each task.
+            list of dict: Per task its "task_name", the new "task_id" (None on failure) and the
+                "error" (None on success), see `format_task_results` for a readable summary.
         """
-        url = "https://api.notion.com/v1/pages"
-        headers = {
-            "Authorization": f"Bearer {NOTION_API_KEY}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
-        }
         results = []
 
         for task in tasks:
             try:
-                 # Default `due_date` to today's date if not provided
-                due_date = task.get("due_date")
-                if not due_date:
-                    due_date = datetime.today().strftime('%Y-%m-%d')
-                # Build the task properties
-                properties = {
-                    "Task name": {
-                        "title": [{"text": {"content": task["task_name"]}}]
-                    },
-                    "Project": {
-                        "relation": [{"id": project_id}]
-                    },
-                    "Status": {
-                        "status": {"name": task.get("status")} if task.get("status") else None
-                    },
-                    "Due": {
-                        "date": {"start": task.get("due_date")} if task.get("due_date") else None
-                    },
-                    "Priority": {
-                        "select": {"name": task.get("priority")} if task.get("priority") else None
-                    },
-                    "Assignee": {
-                        "people": [{"id": person_id} for person_id in (task.get("assignee") or [])]
-                    }
-                }
-
-                # Remove None properties
-                properties = {k: v for k, v in properties.items() if v is not None}
-
                 # Define the request payload
-                payload = {
-                    "parent": {"database_id": TASKS_DATABASE_ID},
-                    "properties": properties
-                }
+                payload = self._task_payload(project_id, task)
 
                 # Make the POST request to create the task
-                response = requests.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-
-                # Parse the response
-                task_id = response.json().get("id", "")
-                results.append(f"Task '{task['task_name']}' created successfully with ID: {task_id}")
+                task_id = self._request("POST", "/pages", payload).get("id", "")
+                results.append({"task_name": task["task_name"], "task_id": task_id, "error": None})
 
             except requests.exceptions.RequestException as e:
                 logger.error(f"Error creating task '{task['task_name']}': {e}")
-                results.append(f"Failed to create task '{task['task_name']}': {e}")
+                results.append({"task_name": task["task_name"], "task_id": None, "error": str(e)})
+
+        return results
 
-        return "\n".join(results)
+    def format_task_results(self, results: List[dict]) -> str:
+        """
+        Summarises the results of `add_tasks_to_project`, one line per task.
+        """
+        return "\n".join(
+            f"Task '{result['task_name']}' created successfully with ID: {result['task_id']}" if result["task_id"]
+            else f"Failed to create task '{result['task_name']}': {result['error']}"
+            for result in results
+        )
 
     def add_project(self, project_name, status=None, owner=None, dates=None, priority=None, summary=None):
         """
@@ -693,64 +585,417 @@ class NotionHelpers:
             summary (str): A brief summary of the project (optional).
 
         Returns:
-            str: A message indicating success or failure.
+            tuple: The new project ID (None on failure) and a message indicating success or failure.
+        """
+        try:
+            # Define the request payload
+            payload = self._project_payload(project_name, status, owner, dates, priority, summary)
+
+            # Make the POST request to add the project
+            data = self._request("POST", "/pages", payload)
+            project_id = data.get("id", "")
+            logger.info(f"Project '{project_name}' created successfully with ID: {project_id}")
+            return project_id, f"Project '{project_name}' created successfully with ID: {project_id}"
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error adding project '{project_name}': {e}")
+            if e.response is not None:
+                logger.error(f"Response content: {e.response.text}")
+            return None, f"Failed to add project '{project_name}': {e}"
+
+    # ------------------------------------------------------------------
+    # Paginated requests
+    # ------------------------------------------------------------------
+
+    def _request(self, method: str, path: str, payload: Optional[dict] = None, params: Optional[dict] = None) -> dict:
+        """
+        Sends a request to the Notion API and returns the decoded JSON response.
+
+        Requests are throttled by the shared NOTION_RATE_LIMITER. 429 and 5xx responses
+        and connection errors are retried with jittered exponential backoff, honouring
+        the Retry-After header of 429 responses. Requests that create pages or append
+        blocks are only retried on 429 or if the connection could not be established,
+        so a lost response does not create the content twice.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails or returns an error status.
         """
-    
-        # Default `dates` to today's date if not provided
-        if dates is None:
-            today = datetime.today().strftime('%Y-%m-%d')
-            dates = {"start": today, "end": None}
-        url = "https://api.notion.com/v1/pages"
         headers = {
             "Authorization": f"Bearer {NOTION_API_KEY}",
             "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28",
+            "Notion-Version": NOTION_VERSION,
         }
+        limiter = NOTION_RATE_LIMITER
+        endpoint = limiter.endpoint(method, path)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            limiter.record(endpoint, "requests")
+            DIARY_METRICS.add_notion_request()
+            try:
+                with NOTION_LATENCY.time(endpoint=endpoint):
+                    response = requests.request(method, f"{NOTION_API_URL}{path}", headers=headers, json=payload, params=params)
+            except requests.exceptions.ConnectionError as e:
+                sent = not isinstance(e, requests.exceptions.ConnectTimeout) and not _connection_refused(e)
+                delay = limiter.retry_delay(attempt) if limiter.idempotent(endpoint) or not sent else None
+                if delay is None:
+                    limiter.record(endpoint, "errors")
+                    raise
+                self.logger.warning(f"{endpoint} failed ({e}), retrying in {delay:.1f}s.")
+            else:
+                if response.status_code not in limiter.retry_statuses(endpoint):
+                    if response.status_code >= 400:
+                        limiter.record(endpoint, "errors")
+                    response.raise_for_status()
+                    return response.json()
+                retry_after = response.headers.get("Retry-After")
+                if response.status_code == 429:
+                    limiter.record(endpoint, "throttled")
+                delay = limiter.retry_delay(attempt, retry_after)
+                if delay is None:
+                    limiter.record(endpoint, "errors")
+                    response.raise_for_status()
+                if response.status_code == 429:
+                    limiter.pause(delay)
+                self.logger.warning(f"{endpoint} returned {response.status_code}, retrying in {delay:.1f}s.")
+            limiter.record(endpoint, "retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def _iter_query_pages(self, database_id: str, query_filter: Optional[dict], page_size: int) -> Iterator[List[dict]]:
+        """
+        Yields the results of a database query page by page, following `next_cursor`.
+        """
+        payload = {"page_size": page_size}
+        if query_filter:
+            payload["filter"] = query_filter
+        while True:
+            data = self._request("POST", f"/databases/{database_id}/query", payload)
+            yield data.get("results", [])
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            payload["start_cursor"] = data["next_cursor"]
+
+    def _iter_children_pages(self, block_id: str, page_size: int) -> Iterator[List[dict]]:
+        """
+        Yields the children of a block page by page, following `next_cursor`.
+        """
+        params = {"page_size": page_size}
+        while True:
+            data = self._request("GET", f"/blocks/{block_id}/children", params=params)
+            yield data.get("results", [])
+            if not data.get("has_more") or not data.get("next_cursor"):
+                return
+            params["start_cursor"] = data["next_cursor"]
+
+    # ------------------------------------------------------------------
+    # Response parsing and payload builders shared with AsyncNotionHelpers
+    # ------------------------------------------------------------------
+
+    def _project_fields(self, fields: Optional[Iterable[str]]) -> tuple:
+        """
+        Validates a projection for query_all_projects. None selects all fields.
+        """
+        if fields is None:
+            return PROJECT_FIELDS
+        fields = tuple(fields)
+        unknown = [field for field in fields if field not in PROJECT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown project fields: {', '.join(unknown)}")
+        return fields
+
+    def _project_relation_filters(self, project_ids: List[str]):
+        """
+        Builds "or" filters matching tasks related to any of the given projects.
 
-        try:
-            # Build the properties payload
-            properties = {
-                "Project name": {
-                    "title": [{"text": {"content": project_name}}]
-                },
-                "Status": {
-                    "status": {"name": status} if status else None
-                },
-                "Owner": {
-                    "people": [{"id": person_id} for person_id in (owner or [])]
-                },
-                "Dates": {
-                    "date": {"start": dates.get("start", ""), "end": dates.get("end", "")} if dates else None
-                },
-                "Priority": {
-                    "select": {"name": priority} if priority else None
-                },
-                "Summary": {
-                    "rich_text": [{"text": {"content": summary}}] if summary else None
-                },
+        Returns:
+            list: Tuples of (filter, lookup), where lookup maps normalised relation IDs
+                back to the requested project IDs.
+        """
+        filters = []
+        for start in range(0, len(project_ids), NOTION_FILTER_LIMIT):
+            chunk = project_ids[start:start + NOTION_FILTER_LIMIT]
+            query_filter = {
+                "or": [
+                    {"property": "Project", "relation": {"contains": project_id}}
+                    for project_id in chunk
+                ]
             }
+            lookup = {self._normalise_id(project_id): project_id for project_id in chunk}
+            filters.append((query_filter, lookup))
+        return filters
 
-            # Clean up the properties by removing None values
-            properties = {key: value for key, value in properties.items() if value is not None}
+    def _index_task_names(self, tasks, lookup: Dict[str, str], index: Dict[str, List[str]]):
+        """
+        Adds the names of the given task pages to the lists of their related projects.
+        """
+        for task in tasks:
+            task_names = self._parse_task_names([task])
+            if not task_names:
+                continue
+            relations = task.get("properties", {}).get("Project", {}).get("relation", []) or []
+            for relation in relations:
+                project_id = lookup.get(self._normalise_id(relation.get("id", "")))
+                if project_id is not None:
+                    index[project_id].append(task_names[0])
+
+    def _normalise_id(self, page_id: str) -> str:
+        """
+        Normalises a Notion ID so dashed and undashed forms compare equal.
+        """
+        return (page_id or "").replace("-", "").lower()
 
-            # Define the request payload
-            payload = {
-                "parent": {"database_id": PROJECTS_DATABASE_ID},
-                "properties": properties  
+    def _parse_task_names(self, tasks) -> List[str]:
+        """
+        Extracts the task names from a list of task pages.
+        """
+        task_names = []
+        for task in tasks:
+            task_name = task.get("properties", {}).get("Task name", {}).get("title", [])
+            if task_name:
+                task_names.append(task_name[0].get("plain_text", ""))
+        return task_names
+
+    def _parse_project(self, project) -> dict:
+        """
+        Extracts metadata and project properties from a page of the Projects database.
+        """
+        properties = project.get("properties", {})
+
+        return {
+            # Metadata
+            "project_id": project.get("id", "") or "",
+            "created_time": project.get("created_time", "") or "",
+            "last_edited_time": project.get("last_edited_time", "") or "",
+            "created_by": (project.get("created_by", {}) or {}).get("id", "") or "",
+            "last_edited_by": (project.get("last_edited_by", {}) or {}).get("id", "") or "",
+            "archived": project.get("archived", False),
+            "icon": (project.get("icon", {}) or {}).get("emoji", "") or "",
+            "cover": project.get("cover", None),
+            "parent": (project.get("parent", {}) or {}).get("type", "") or "",
+            "parent_id": (project.get("parent", {}) or {}).get("database_id", "") or "",
+            "url": project.get("url", "") or "",
+            "public_url": project.get("public_url", None),
+
+            # Project Properties
+            "project_name": ((properties.get("Project name", {}).get("title") or [{}])[0].get("plain_text", "") or ""),
+            "status": (properties.get("Status", {}).get("status", {}) or {}).get("name", "") or "",
+            "status_color": (properties.get("Status", {}).get("status", {}) or {}).get("color", "") or "",
+            "owner": [person.get("id", "") for person in (properties.get("Owner", {}).get("people", []) or [])],
+            "completion_percentage": (properties.get("Completion", {}).get("rollup", {}) or {}).get("number", None),
+            "dates": properties.get("Dates", {}).get("date", {}) or {},
+            "priority": (properties.get("Priority", {}).get("select", {}) or {}).get("name", "") or "",
+            "priority_color": (properties.get("Priority", {}).get("select", {}) or {}).get("color", "") or "",
+            "summary": ((properties.get("Summary", {}).get("rich_text") or [{}])[0].get("plain_text", "") or ""),
+            "tasks": [task.get("id", "") for task in (properties.get("Tasks", {}).get("relation", []) or [])],
+            "is_blocking": [relation.get("id", "") for relation in (properties.get("Is Blocking", {}).get("relation", []) or [])],
+            "blocked_by": [relation.get("id", "") for relation in (properties.get("Blocked By", {}).get("relation", []) or [])],
+            "sign_off_project": properties.get("Sign off project?", {}).get("type", "") or "",
+        }
+
+    def _parse_project_by_id(self, project) -> dict:
+        """
+        Extracts the project details returned by `get_project_by_id`.
+        """
+        properties = project.get("properties", {})
+        return {
+            "project_id": project.get("id", ""),
+            "created_time": project.get("created_time", ""),
+            "last_edited_time": project.get("last_edited_time", ""),
+            "created_by": project.get("created_by", {}).get("id", ""),
+            "last_edited_by": project.get("last_edited_by", {}).get("id", ""),
+            "archived": project.get("archived", False),
+            "icon": project.get("icon", {}).get("emoji", ""),
+            "cover": project.get("cover", None),
+            "parent_type": project.get("parent", {}).get("type", ""),
+            "parent_id": project.get("parent", {}).get("database_id", ""),
+            "url": project.get("url", ""),
+            "project_name": properties.get("Project name", {}).get("title", [{}])[0].get("plain_text", ""),
+            "status": properties.get("Status", {}).get("status", {}).get("name", ""),
+            "status_color": properties.get("Status", {}).get("status", {}).get("color", ""),
+            "owner": [person.get("id") for person in properties.get("Owner", {}).get("people", [])],
+            "dates": properties.get("Dates", {}).get("date", {}),
+            "priority": properties.get("Priority", {}).get("select", {}).get("name", ""),
+            "priority_color": properties.get("Priority", {}).get("select", {}).get("color", ""),
+            "summary": properties.get("Summary", {}).get("rich_text", [{}])[0].get("plain_text", ""),
+        }
+
+    def _parse_task(self, task_id, task) -> dict:
+        """
+        Extracts all task fields with default fallbacks from a page of the Tasks database.
+        """
+        properties = task.get("properties", {})
+        return {
+            "task_id": task_id,
+            "task_name": ((properties.get("Task name", {}).get("title") or [{}])[0].get("plain_text", "") or ""),
+            "status": (properties.get("Status", {}).get("status", {}) or {}).get("name", "") or "",
+            "status_color": (properties.get("Status", {}).get("status", {}) or {}).get("color", "") or "",
+            "due_date": (properties.get("Due", {}).get("date", {}) or {}).get("start", "") or "",
+            "completed_on": (properties.get("Completed on", {}).get("date", {}) or {}).get("start", "") or "",
+            "priority": (properties.get("Priority", {}).get("select", {}) or {}).get("name", "") or "",
+            "priority_color": (properties.get("Priority", {}).get("select", {}) or {}).get("color", "") or "",
+            "tags": [tag.get("name", "") for tag in (properties.get("Tags", {}).get("multi_select", []) or [])],
+            "assignee": [person.get("id", "") for person in (properties.get("Assignee", {}).get("people", []) or [])],
+            "delay": (properties.get("Delay", {}).get("formula", {}) or {}).get("number", "") or "",
+            "sub_tasks": [sub_task.get("id", "") for sub_task in (properties.get("Sub-tasks", {}).get("relation", []) or [])],
+            "parent_task": [parent_task.get("id", "") for parent_task in (properties.get("Parent-task", {}).get("relation", []) or [])],
+            "project": [project.get("id", "") for project in (properties.get("Project", {}).get("relation", []) or [])],
+        }
+
+    def _parse_page_text(self, blocks) -> List[str]:
+        """
+        Extracts the non-empty plain text of each block.
+        """
+        page_content = []
+        for block in blocks:
+            block_type = block.get("type", "")
+            block_data = block.get(block_type, {})
+            rich_text_list = block_data.get("rich_text", [])
+
+            # Concatenate all plain text from rich_text fields
+            block_text = "".join([item.get("plain_text", "") for item in rich_text_list])
+
+            # Only include non-empty text
+            if block_text.strip():
+                page_content.append(block_text)
+        return page_content
+
+    def _parse_page_blocks(self, blocks) -> List[dict]:
+        """
+        Extracts id, type, text and raw data of each block.
+        """
+        page_content = []
+        for block in blocks:
+            block_type = block.get("type", "")
+            block_data = block.get(block_type, {})
+            text = ""
+
+            # Extract text from text blocks
+            if "text" in block_data:
+                text = "".join(
+                    [item["plain_text"] for item in block_data.get("text", [])]
+                )
+
+            page_content.append({
+                "block_id": block.get("id", ""),
+                "type": block_type,
+                "text": text,
+                "data": block_data,
+            })
+        return page_content
+
+    def _split_children(self, payload: dict) -> Tuple[dict, List[dict]]:
+        """
+        Splits a page payload into one that fits a single request and the blocks left to append.
+        """
+        children = payload.get("children") or []
+        if len(children) <= NOTION_MAX_CHILDREN:
+            return payload, []
+        return {**payload, "children": children[:NOTION_MAX_CHILDREN]}, children[NOTION_MAX_CHILDREN:]
+
+    def _subpage_payload(self, parent_page_id: str, title: str, text_chunks: List[str]) -> dict:
+        """
+        Builds the payload for a subpage with one paragraph block per text chunk.
+        """
+        blocks = []
+        for chunk in text_chunks:
+            blocks.append({
+                "object": "block",
+                "type": "paragraph",
+                "paragraph": {
+                    "rich_text": [{"type": "text", "text": {"content": chunk}}]
+                }
+            })
+
+        return {
+            "parent": {"page_id": parent_page_id},
+            "properties": {
+                "Name": {
+                    "title": [{"text": {"content": title}}]
+                }
+            },
+            "children": blocks
+        }
+
+    def _case_study_payload(self, dairy_txt: str) -> dict:
+        """
+        Builds the payload for today's diary page in the diary database.
+        """
+        today_title = datetime.now().strftime("%d.%m.%Y")
+        blocks = self.markdown_to_notion_blocks(dairy_txt)
+        return {
+            "parent": {"database_id": DATABASE_ID},
+            "properties": {"Name": {"title": [{"text": {"content": today_title}}]}},
+            "children": blocks
+        }
+
+    def _task_payload(self, project_id: str, task: dict) -> dict:
+        """
+        Builds the payload for a task linked to the given project.
+        """
+        properties = {
+            "Task name": {
+                "title": [{"text": {"content": task["task_name"]}}]
+            },
+            "Project": {
+                "relation": [{"id": project_id}]
+            },
+            "Status": {
+                "status": {"name": task.get("status")} if task.get("status") else None
+            },
+            "Due": {
+                "date": {"start": task.get("due_date")} if task.get("due_date") else None
+            },
+            "Priority": {
+                "select": {"name": task.get("priority")} if task.get("priority") else None
+            },
+            "Assignee": {
+                "people": [{"id": person_id} for person_id in (task.get("assignee") or [])]
             }
+        }
 
-            # Make the POST request to add the project
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+        # Remove None properties
+        properties = {k: v for k, v in properties.items() if v is not None}
 
-            # Parse response
-            data = response.json()
-            project_id = data.get("id", "")
-            logger.info(f"Project '{project_name}' created successfully with ID: {project_id}")
-            return project_id, f"Project '{project_name}' created successfully with ID: {project_id}"
+        return {
+            "parent": {"database_id": TASKS_DATABASE_ID},
+            "properties": properties
+        }
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error adding project '{project_name}': {e}")
-            if e.response:
-                logger.error(f"Response content: {e.response.text}")
-            return f"Failed to add project '{project_name}': {e}"
+    def _project_payload(self, project_name, status=None, owner=None, dates=None, priority=None, summary=None) -> dict:
+        """
+        Builds the payload for a project in the Projects database.
+        """
+        # Default `dates` to today's date if not provided
+        if dates is None:
+            today = datetime.today().strftime('%Y-%m-%d')
+            dates = {"start": today, "end": None}
+
+        properties = {
+            "Project name": {
+                "title": [{"text": {"content": project_name}}]
+            },
+            "Status": {
+                "status": {"name": status} if status else None
+            },
+            "Owner": {
+                "people": [{"id": person_id} for person_id in (owner or [])]
+            },
+            "Dates": {
+                "date": {"start": dates.get("start", ""), "end": dates.get("end", "")} if dates else None
+            },
+            "Priority": {
+                "select": {"name": priority} if priority else None
+            },
+            "Summary": {
+                "rich_text": [{"text": {"content": summary}}] if summary else None
+            },
+        }
+
+        # Clean up the properties by removing None values
+        properties = {key: value for key, value in properties.items() if value is not None}
+
+        return {
+            "parent": {"database_id": PROJECTS_DATABASE_ID},
+            "properties": properties
+        }
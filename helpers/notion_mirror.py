@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# The mirror lives next to data/, independent of the working directory; ":memory:" keeps it in the process only
+NOTION_MIRROR_PATH = os.getenv(
+    "NotionMirrorPath",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "notion_mirror.sqlite"),
+)
+NOTION_MIRROR_ENABLED = os.getenv("NotionMirror", "true").lower() == "true"
+# Seconds a synced database is read locally before changes are fetched again, 0 syncs before every read
+NOTION_MIRROR_SYNC_INTERVAL = float(os.getenv("NotionMirrorSyncInterval", "60"))
+# Seconds between full syncs, which also drop pages deleted in Notion; 0 only syncs incrementally
+NOTION_MIRROR_FULL_SYNC_INTERVAL = float(os.getenv("NotionMirrorFullSyncInterval", str(24 * 3600)))
+
+
+def _normalise_id(page_id: str) -> str:
+    """ Normalises a Notion ID so dashed and undashed forms compare equal."""
+    return (page_id or "").replace("-", "").lower()
+
+
+def _timestamp(seconds: float) -> str:
+    """ A time in the format of Notion's last_edited_time, rounded down to the minute as Notion does."""
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+def _title(page: dict) -> str:
+    """ The plain text of the page's title property."""
+    for value in (page.get("properties") or {}).values():
+        if isinstance(value, dict) and "title" in value:
+            return "".join(item.get("plain_text", "") for item in value.get("title") or [])
+    return ""
+
+
+class NotionMirror:
+    """
+    Local SQLite copy of Notion databases, such as the projects and tasks databases.
+
+    Pages are stored as returned by the API, keyed by database and normalised page ID,
+    together with their title and every relation property in a separate table, so
+    "the task names of these projects" is a local join. `AsyncNotionHelpers` keeps the
+    mirror current: at most every `sync_interval` seconds it queries only the pages
+    edited since the newest `last_edited_time` it has seen, and every
+    `full_sync_interval` seconds it re-reads the whole database to drop deleted pages.
+    Pages it creates itself are applied with `upsert_pages` right away.
+    """
+
+    def __init__(self, path: str = NOTION_MIRROR_PATH, sync_interval: float = NOTION_MIRROR_SYNC_INTERVAL,
+                 full_sync_interval: float = NOTION_MIRROR_FULL_SYNC_INTERVAL):
+        """
+        Args:
+            path (str): SQLite file of the mirror, ":memory:" keeps it in memory.
+            sync_interval (float): Seconds between incremental syncs of a database, 0 syncs before every read.
+            full_sync_interval (float): Seconds between full syncs of a database, 0 disables them.
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self._lock = threading.Lock()
+        self._sync_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+        self._counters: Dict[str, int] = {"syncs": 0, "full_syncs": 0, "pages_synced": 0, "local_writes": 0, "reads": 0}
+        # The SQLite file is opened on first use, so importing the helpers creates no files
+        self._connection: Optional[sqlite3.Connection] = None
+        self._opened = False
+        self._open_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """ Whether the SQLite file can be opened (opening it on first access); callers read from Notion otherwise."""
+        return self._db is not None
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self._opened:
+            with self._open_lock:
+                if not self._opened:
+                    self._connection = self._open(self.path)
+                    self._opened = True
+        return self._connection
+
+    def sync_lock(self) -> asyncio.Lock:
+        """ The lock serialising the syncs of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._sync_locks.get(loop)
+            if lock is None:
+                lock = self._sync_locks[loop] = asyncio.Lock()
+            return lock
+
+    def sync_filter(self, database_id: str, now: Optional[float] = None) -> Optional[dict]:
+        """
+        Decides whether a database has to be synced before it is read.
+
+        Returns:
+            dict: None if the mirror is current. Otherwise {"full": bool, "filter": dict}, where
+                "filter" selects the pages edited since the last sync (None for a full sync).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute(
+                "SELECT watermark, synced_at, full_synced_at FROM sync_state WHERE database_id = ?", (database_id,)
+            ).fetchone()
+        if row is None or (self.full_sync_interval > 0 and now - row[2] >= self.full_sync_interval):
+            return {"full": True, "filter": None}
+        if self.sync_interval > 0 and now - row[1] < self.sync_interval:
+            return None
+        # Notion rounds last_edited_time to the minute, so pages edited in the watermark's minute are fetched again
+        return {"full": False, "filter": {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": row[0]}}}
+
+    def apply_sync(self, database_id: str, pages: List[dict], full: bool, started: float):
+        """
+        Stores the pages returned by a sync and advances the watermark.
+
+        Args:
+            database_id (str): The synced database.
+            pages (list): All pages returned by the sync query.
+            full (bool): Whether the query returned the whole database; older pages missing from it are removed.
+            started (float): time.time() when the sync started.
+        """
+        with self._lock:
+            try:
+                state = self._db.execute(
+                    "SELECT watermark, full_synced_at FROM sync_state WHERE database_id = ?", (database_id,)
+                ).fetchone()
+                watermark = max([page.get("last_edited_time") or "" for page in pages] + [state[0] if state and not full else ""])
+                # An empty database has no edit times, the sync itself marks how far it got
+                watermark = watermark or _timestamp(started)
+                if full:
+                    # Pages missing from a full sync were deleted, unless this process created them during the sync
+                    seen = {_normalise_id(page.get("id", "")) for page in pages}
+                    stale = [(database_id, key) for key, edited in self._db.execute(
+                        "SELECT key, last_edited_time FROM pages WHERE database_id = ?", (database_id,)
+                    ).fetchall() if key not in seen and edited < watermark]
+                    self._db.executemany("DELETE FROM relations WHERE database_id = ? AND page_key = ?", stale)
+                    self._db.executemany("DELETE FROM pages WHERE database_id = ? AND key = ?", stale)
+                self._upsert(database_id, pages)
+                full_synced_at = started if full else (state[1] if state else 0.0)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sync_state (database_id, watermark, synced_at, full_synced_at) VALUES (?, ?, ?, ?)",
+                    (database_id, watermark, started, full_synced_at),
+                )
+                self._db.commit()
+                self._counters["full_syncs" if full else "syncs"] += 1
+                self._counters["pages_synced"] += len(pages)
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.error(f"Error storing the sync of database {database_id} in the Notion mirror: {e}")
+
+    def upsert_pages(self, database_id: str, pages: Iterable[dict]):
+        """ Applies pages created or updated by this process, without touching the sync state."""
+        pages = list(pages)
+        with self._lock:
+            try:
+                self._upsert(database_id, pages)
+                self._db.commit()
+                self._counters["local_writes"] += len(pages)
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.error(f"Error writing pages to the Notion mirror: {e}")
+
+    def add_relation(self, database_id: str, page_id: str, prop: str, target_id: str):
+        """
+        Adds a target to a relation property of a mirrored page, as Notion does for the other
+        side of a two-way relation when a page is created. Unknown pages are ignored.
+        """
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT page FROM pages WHERE database_id = ? AND key = ?", (database_id, _normalise_id(page_id))
+                ).fetchone()
+                if row is None:
+                    return
+                page = json.loads(row[0])
+                value = page.setdefault("properties", {}).setdefault(prop, {"type": "relation", "relation": []})
+                relation = value.setdefault("relation", [])
+                if _normalise_id(target_id) not in {_normalise_id(item.get("id", "")) for item in relation}:
+                    relation.append({"id": target_id})
+                self._upsert(database_id, [page])
+                self._db.commit()
+            except (sqlite3.Error, ValueError) as e:
+                self._db.rollback()
+                logger.error(f"Error updating a relation in the Notion mirror: {e}")
+
+    def pages(self, database_id: str) -> List[dict]:
+        """ All mirrored pages of a database, in the order they were first seen."""
+        with self._lock:
+            rows = self._db.execute("SELECT page FROM pages WHERE database_id = ? ORDER BY rowid", (database_id,)).fetchall()
+            self._counters["reads"] += 1
+        return [json.loads(row[0]) for row in rows]
+
+    def titles_by_relation(self, database_id: str, prop: str, target_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        The titles of the pages of a database whose relation property contains each target.
+
+        Args:
+            database_id (str): The database of the related pages, e.g. the tasks database.
+            prop (str): The relation property, e.g. "Project".
+            target_ids (iterable of str): The targets, e.g. project IDs.
+
+        Returns:
+            dict: Titles per requested target ID, in the order the pages were first seen.
+        """
+        target_ids = list(dict.fromkeys(target_ids))
+        index: Dict[str, List[str]] = {target_id: [] for target_id in target_ids}
+        lookup = {_normalise_id(target_id): target_id for target_id in target_ids}
+        if not lookup:
+            return index
+        placeholders = ", ".join("?" for _ in lookup)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT relations.target_key, pages.title FROM relations JOIN pages "
+                "ON pages.database_id = relations.database_id AND pages.key = relations.page_key "
+                f"WHERE relations.database_id = ? AND relations.property = ? AND relations.target_key IN ({placeholders}) "
+                "ORDER BY pages.rowid",
+                (database_id, prop, *lookup),
+            ).fetchall()
+            self._counters["reads"] += 1
+        for target_key, title in rows:
+            if title:
+                index[lookup[target_key]].append(title)
+        return index
+
+    def clear(self):
+        """ Removes every mirrored page, the next read syncs from scratch."""
+        with self._lock:
+            for table in ("relations", "pages", "sync_state"):
+                self._db.execute(f"DELETE FROM {table}")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """ Returns a snapshot of the sync and read counters and the number of mirrored pages."""
+        with self._lock:
+            stats = dict(self._counters)
+            if self._connection is not None:
+                stats["pages"] = self._connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            return stats
+
+    def _upsert(self, database_id: str, pages: List[dict]):
+        for page in pages:
+            key = _normalise_id(page.get("id", ""))
+            if not key:
+                continue
+            self._db.execute("DELETE FROM relations WHERE database_id = ? AND page_key = ?", (database_id, key))
+            if page.get("archived") or page.get("in_trash"):
+                self._db.execute("DELETE FROM pages WHERE database_id = ? AND key = ?", (database_id, key))
+                continue
+            self._db.execute(
+                "INSERT INTO pages (database_id, key, title, last_edited_time, page) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (database_id, key) DO UPDATE SET title = excluded.title, "
+                "last_edited_time = excluded.last_edited_time, page = excluded.page",
+                (database_id, key, _title(page), page.get("last_edited_time") or "", json.dumps(page)),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO relations (database_id, page_key, property, target_key) VALUES (?, ?, ?, ?)",
+                [
+                    (database_id, key, prop, _normalise_id(item.get("id", "")))
+                    for prop, value in (page.get("properties") or {}).items()
+                    if isinstance(value, dict) and "relation" in value
+                    for item in value.get("relation") or []
+                ],
+            )
+
+    def _open(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Several worker processes may share the file
+            db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+            if path != ":memory:":
+                db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pages (database_id TEXT NOT NULL, key TEXT NOT NULL, title TEXT NOT NULL, "
+                "last_edited_time TEXT NOT NULL, page TEXT NOT NULL, PRIMARY KEY (database_id, key))"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS relations (database_id TEXT NOT NULL, page_key TEXT NOT NULL, "
+                "property TEXT NOT NULL, target_key TEXT NOT NULL, PRIMARY KEY (database_id, page_key, property, target_key))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS relations_target ON relations (database_id, property, target_key)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state (database_id TEXT PRIMARY KEY, watermark TEXT NOT NULL, "
+                "synced_at REAL NOT NULL, full_synced_at REAL NOT NULL)"
+            )
+            db.commit()
+            return db
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error opening the Notion mirror {path}, reading from Notion instead: {e}")
+            return None
+
+
+# Shared by all Notion clients of the process, None if the mirror is disabled
+NOTION_MIRROR = NotionMirror() if NOTION_MIRROR_ENABLED else None
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Notion allows an average of three requests per second per integration
+NOTION_RATE_LIMIT = float(os.getenv("NotionRateLimit", "3"))
+NOTION_BURST = int(os.getenv("NotionBurst", "3"))
+NOTION_MAX_RETRIES = int(os.getenv("NotionMaxRetries", "5"))
+
+# Status codes that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Requests that add content; Notion may have applied them although the response was lost,
+# so they are only retried on 429 (rejected before processing) or if they were never sent
+NON_IDEMPOTENT_ENDPOINTS = {"POST /pages", "PATCH /blocks/{id}/children"}
+NON_IDEMPOTENT_RETRY_STATUSES = {429}
+
+_ID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+
+
+class NotionRateLimiter:
+    """
+    Process-wide token bucket for Notion requests with retry bookkeeping.
+
+    Every request first reserves a token with `acquire` (blocking) or
+    `acquire_async` (awaitable); both draw from the same bucket, so sync and
+    async helpers together stay below the configured rate. A 429 pauses the
+    whole bucket for the `Retry-After` period. Counters are kept per endpoint
+    (method plus path with IDs replaced by "{id}").
+    """
+
+    def __init__(self, rate: float = NOTION_RATE_LIMIT, burst: int = NOTION_BURST, max_retries: int = NOTION_MAX_RETRIES,
+                 base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Args:
+            rate (float): Sustained requests per second.
+            burst (int): Maximum number of requests sent back to back.
+            max_retries (int): Retries per request for 429, 5xx and connection errors.
+            base_delay (float): First backoff delay in seconds, doubled on each retry.
+            max_delay (float): Upper bound for a single backoff delay in seconds.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _reserve(self) -> float:
+        """
+        Takes a token and returns how long the caller has to wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        """ Blocks until the next request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """ Waits without blocking the event loop until the next request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """ Holds back every request for the given number of seconds, e.g. after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Returns the delay before retry number `attempt + 1`, or None if no retries are left.
+
+        Args:
+            attempt (int): Number of retries already made for this request.
+            retry_after (str, optional): Value of the Retry-After header, in seconds.
+        """
+        if attempt >= self.max_retries:
+            return None
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, self.base_delay)
+            except ValueError:
+                pass
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def endpoint(self, method: str, path: str) -> str:
+        """ Returns the counter key for a request, e.g. "POST /databases/{id}/query"."""
+        return f"{method.upper()} {_ID_PATTERN.sub('{id}', path)}"
+
+    def idempotent(self, endpoint: str) -> bool:
+        """ Whether sending a request to the endpoint twice has the same effect as sending it once."""
+        return endpoint not in NON_IDEMPOTENT_ENDPOINTS
+
+    def retry_statuses(self, endpoint: str) -> set:
+        """ The error statuses after which a request to the endpoint may be retried."""
+        return RETRY_STATUSES if self.idempotent(endpoint) else NON_IDEMPOTENT_RETRY_STATUSES
+
+    def record(self, endpoint: str, event: str, count: int = 1):
+        """ Increments the counter `event` ("requests", "retries", "throttled", "errors") of an endpoint."""
+        with self._lock:
+            self._counters[endpoint][event] += count
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """ Returns a snapshot of the per-endpoint counters."""
+        with self._lock:
+            return {endpoint: dict(counters) for endpoint, counters in self._counters.items()}
+
+
+# Shared by every NotionHelpers and AsyncNotionHelpers instance in the process
+NOTION_RATE_LIMITER = NotionRateLimiter()
@@ -1,16 +1,14 @@
+import asyncio
 import logging
 import os
-import json 
 from datetime import date
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import JsonOutputParser
-from pydantic import BaseModel, Field
-from langchain.output_parsers import OutputFixingParser
-from .structured_helper import Task, ProjectOutput
-from .notion_helpers import NotionHelpers
+from .async_notion_helpers import AsyncNotionHelpers
+from .diary_metrics import DIARY_METRICS
+from .llm_registry import LLMRegistry, LLM_REGISTRY
+from .project_index import ProjectIndex
+from .semantic_index import SEMANTIC_INDEX, SemanticIndex, embed, same_numbers
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -22,6 +20,18 @@ DATABASE_ID = os.getenv("NotionDatabaseId")
 OPENAI_KEY = os.getenv("OpenAIKey")
 PROJECTS_DATABASE_ID = os.getenv("ProjectsDatabaseId")
 TASKS_DATABASE_ID = os.getenv("TasksDatabaseId")
+# Maximum number of extracted projects processed at the same time
+PROJECT_CONCURRENCY = int(os.getenv("ProjectConcurrency", "3"))
+# Upper bound for the estimated prompt tokens of one batched task identification, 0 disables batching
+TASK_BATCH_TOKEN_BUDGET = int(os.getenv("TaskBatchTokenBudget", "12000"))
+# Existing projects offered to the extraction per project mention in the diary, 0 offers all projects
+PROJECT_CANDIDATES = int(os.getenv("ProjectCandidates", "5"))
+# Existing tasks of a project put into the task identification prompt, the most relevant to the diary first, 0 puts all
+RELEVANT_TASKS = int(os.getenv("RelevantTasks", "30"))
+# Cosine similarity above which a new task is considered a duplicate of an existing one
+DUPLICATE_THRESHOLD = float(os.getenv("DuplicateThreshold", "0.8"))
+# Rough number of characters per token, used to estimate prompt sizes without a tokenizer
+CHARS_PER_TOKEN = 4
 
 REQUIRED_ENV_VARS = {
     "NotionAPIKey": NOTION_API_KEY,
@@ -33,13 +43,37 @@ REQUIRED_ENV_VARS = {
 
 class ProManHelpers:
     """
-    A helper class for converting Markdown text into Notion-compatible blocks.
+    Matches a diary to the user's Notion projects and adds the tasks it mentions to them.
     """
 
-    def __init__(self):
+    def __init__(self, project_concurrency: int = PROJECT_CONCURRENCY, llm: Optional[LLMRegistry] = None,
+                 task_batch_token_budget: int = TASK_BATCH_TOKEN_BUDGET, project_candidates: int = PROJECT_CANDIDATES,
+                 relevant_tasks: int = RELEVANT_TASKS, duplicate_threshold: float = DUPLICATE_THRESHOLD,
+                 semantic_index: Optional[SemanticIndex] = None):
         """
-        Initializes the NotionHelpers class.
+        Initializes the ProManHelpers class.
+
+        Args:
+            project_concurrency (int): Maximum number of extracted projects processed at the same time.
+            llm (LLMRegistry, optional): Source of the prebuilt LLM chains, defaults to LLM_REGISTRY.
+            task_batch_token_budget (int): Maximum estimated prompt tokens for identifying the tasks of
+                all projects in one call; larger prompts fall back to one call per project. 0 disables batching.
+            project_candidates (int): Existing projects pre-selected per project mention in the diary
+                for the extraction prompt. 0 puts all existing projects into the prompt.
+            relevant_tasks (int): Existing tasks of a project offered to the task identification,
+                selected by their similarity to the diary. 0 offers all existing tasks.
+            duplicate_threshold (float): Similarity between 0 and 1 above which a new task is treated
+                as a duplicate of an existing one and not created.
+            semantic_index (SemanticIndex, optional): Index of the known tasks, grouped by project ID,
+                defaults to the process-wide SEMANTIC_INDEX.
         """
+        self.project_concurrency = max(1, project_concurrency)
+        self.task_batch_token_budget = task_batch_token_budget
+        self.project_candidates = project_candidates
+        self.relevant_tasks = relevant_tasks
+        self.duplicate_threshold = duplicate_threshold
+        self.index = semantic_index or SEMANTIC_INDEX
+        self.llm = llm or LLM_REGISTRY
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
         self.handler = logging.StreamHandler()
@@ -47,26 +81,14 @@ class ProManHelpers:
         self.handler.setFormatter(self.formatter)
         self.logger.addHandler(self.handler)
         
-    def read_md_to_formattable_string(self, file_path):
-        """
-        Read a markdown file and return its content as a string.
-        """
-        try: 
-            
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            logger.debug(f"Successfully read markdown file: {file_path}")
-            return content
-        except Exception as e:
-            logging.error(f"Error while reading markdown file {file_path}: {e}")
-            return "" 
     
-    def generate_projects_and_tasks_in_notion(self, notion_helper: NotionHelpers, dairy_txt):
+    async def generate_projects_and_tasks_in_notion(self, notion_helper: AsyncNotionHelpers, dairy_txt):
         try: 
             
             # Step 1: Query all existing projects
             logger.info("Querying all projects from Notion.")
-            projects = notion_helper.query_all_projects()
+            projects = await notion_helper.query_all_projects(fields=("project_id", "project_name"))
+            projects = self.preselect_projects(projects, dairy_txt)
             project_names = "\n".join(
                 f"Project-Id: {project['project_id']}, Project-Name: {project['project_name']}"
                 for project in projects
@@ -74,231 +96,309 @@ class ProManHelpers:
     
             # Step 2: Extract projects based on the diary text
             logger.info("Extracting projects from diary text.")
-            extracted_projects = self.extract_projects(project_names, dairy_txt)
+            with DIARY_METRICS.stage("extract_projects"):
+                extracted_projects = await self.extract_projects(project_names, dairy_txt)
             if not extracted_projects:
                 logger.warning("No projects were extracted from the diary text.")        
             if isinstance(extracted_projects, dict):
                 extracted_projects = [extracted_projects]  # Convert to a single-item list
             elif not isinstance(extracted_projects, list):
                 logger.warning(f"Unexpected task_results type: {type(extracted_projects)}. Defaulting to empty list.")
-                extracted_projects = extracted_projects
-            # Step 3: Process each result
-            for result in extracted_projects:
-                if result.get("new_project") == True:
-                    try: 
-
-                        project_name=result.get("project_name")
-                        logger.info(f"Adding new project: {project_name}.")
-
-                        project_id, status = notion_helper.add_project(
-                            project_name=project_name,
-                            status="Backlog",
-                            owner=["4ec785d6-aaa2-473f-b892-2dab634925b0"],  # Replace with actual user ID(s)
-                            priority="Low",
-                            summary=result.get("summary")
-                        )
-
-                        task_names_list = notion_helper.get_tasks_by_project(project_id) 
-                        if task_names_list:
-                            task_names_string = "\n".join(task_names_list) + "\n"
-                            task_results = self.identify_tasks_for_project(project_name, task_names_string, dairy_txt)                
-                        elif not task_names_list: 
-                            task_results = self.identify_initial_tasks_for_projects(project_name, dairy_txt)
-                            
-                        tasks = []
-                        if isinstance(task_results, dict):
-                            task_results = [task_results]  # Convert to a single-item list
-                        elif not isinstance(task_results, list):
-                            logger.warning(f"Unexpected task_results type: {type(task_results)}. Defaulting to empty list.")
-                            task_results = task_results
-                        
-                        for task in task_results:
-                            if task.get("new_task"):
-                                task_name= task.get("task_name")
-                                tasks.append(
-                                    {
-                                        "task_name": task_name,
-                                        "status": "Not Started",
-                                        "priority": "Low",
-                                        "assignee": ["4ec785d6-aaa2-473f-b892-2dab634925b0"]  # Replace with actual user IDs
-                                    }
-                                )
-                        if tasks:
-                            logger.info(f"Adding {len(tasks)} tasks to project ID {project_id}.")
-                            result = notion_helper.add_tasks_to_project(project_id, tasks)
-                            logger.debug(f"Add tasks result: {result}")
-                    except Exception as e:
-                        logger.error(f"Error while processing new project {result.get('project_name')}: {e}", exc_info=True)
-                     
-                elif result.get("new_project") == False:
-                    try:
-                        project_id = result.get("project_id")
-                        project_name=result.get("project_name")
-                        task_names_list = notion_helper.get_tasks_by_project(project_id) 
-                        if task_names_list:
-                            task_names_string = "\n".join(task_names_list) + "\n"
-                            task_results = self.identify_tasks_for_project(project_name, task_names_string, dairy_txt)                
-                        elif not task_names_list: 
-                            task_results = self.identify_initial_tasks_for_projects(project_name, dairy_txt)
-                            
-                        tasks = []
-                                        # Ensure task_results is a list
-                        if isinstance(task_results, dict):
-                            task_results = [task_results]  # Convert to a single-item list
-                        elif not isinstance(task_results, list):
-                            logger.warning(f"Unexpected task_results type: {type(task_results)}. Defaulting to empty list.")
-                            task_results = task_results
-                        for task in task_results:
-                            if task.get("new_task"):
-                                task_name= task.get("task_name")
-                                tasks.append(
-                                    {
-                                        "task_name": task_name,
-                                        "status": "Not Started",
-                                        "priority": "Low",
-                                        "assignee": ["4ec785d6-aaa2-473f-b892-2dab634925b0"]  # Replace with actual user IDs
-                                    }
-                                )
-                        if tasks:
-                            logger.info(f"Adding {len(tasks)} tasks to project ID {project_id}.")
-                            result = notion_helper.add_tasks_to_project(project_id, tasks)
-                            logger.debug(f"Add tasks result: {result}")
-                    except Exception as e:
-                        logger.error(f"Error while updating project {result.get('project_name')} (ID: {project_id}): {e}", exc_info=True)
-                else:
-                    logger.warning(f"Unexpected result format: {result}")
+                extracted_projects = []
+            # Step 3: Fetch the existing tasks of all known projects in one batched query
+            existing_project_ids = [
+                result.get("project_id") for result in extracted_projects
+                if isinstance(result, dict) and result.get("new_project") == False and result.get("project_id")
+            ]
+            task_index = await notion_helper.get_tasks_by_projects(existing_project_ids) if existing_project_ids else {}
+
+            # Step 4: Create the new projects and collect the existing tasks of all projects concurrently,
+            # at most `project_concurrency` at a time
+            semaphore = asyncio.Semaphore(self.project_concurrency)
+
+            async def limited(coro):
+                async with semaphore:
+                    return await coro
+
+            async def resolve(result):
+                with DIARY_METRICS.stage("notion_projects"):
+                    return await self.resolve_extracted_project(notion_helper, result, task_index)
+
+            resolved = await asyncio.gather(
+                *(limited(resolve(result)) for result in extracted_projects)
+            )
+            projects = [project for project in resolved if project]
+            if not projects:
+                return
+
+            # Step 5: Identify the tasks of all projects in one call, or per project if that prompt is too large
+            batched_tasks = None
+            if len(projects) > 1:
+                with DIARY_METRICS.stage("identify_tasks"):
+                    batched_tasks = await self.identify_tasks_for_projects(projects, dairy_txt)
+
+            async def process(ref, project):
+                try:
+                    if batched_tasks is not None:
+                        task_results = batched_tasks.get(ref, [])
+                    else:
+                        with DIARY_METRICS.stage("identify_tasks"):
+                            task_results = await self.identify_project_tasks(project, dairy_txt)
+                    with DIARY_METRICS.stage("notion_tasks"):
+                        await self.add_new_tasks(notion_helper, project, task_results)
+                except Exception as e:
+                    logger.error(f"Error while processing project {project.get('project_name')} (ID: {project.get('project_id')}): {e}", exc_info=True)
+
+            await asyncio.gather(*(limited(process(ref, project)) for ref, project in enumerate(projects, start=1)))
         except Exception as e:
             logger.critical(f"Critical failure in generate_projects_and_tasks_in_notion: {e}", exc_info=True)  
 
-    def extract_projects(self, projects_names, dairy_txt) -> str:
-        """ Extracts project details from diary text."""
+    def preselect_projects(self, projects: List[Dict], dairy_txt: str) -> List[Dict]:
+        """
+        Narrows the existing projects down to those the diary may refer to.
+
+        Every "Projekt"/"project" mention in the diary is matched against the project
+        names with a local fuzzy index, and only the best `project_candidates` matches per
+        mention are kept, so the extraction prompt does not grow with the number of projects.
+
+        Args:
+            projects (list): Projects with at least "project_id" and "project_name".
+            dairy_txt (str): The raw diary text.
+
+        Returns:
+            list: The candidate projects, or all projects if pre-selection is disabled or
+                no candidate was found.
+        """
+        if self.project_candidates <= 0 or len(projects) <= self.project_candidates:
+            return projects
+        candidates = ProjectIndex(projects).candidates(dairy_txt, k=self.project_candidates)
+        if not candidates:
+            # An empty project list switches the extraction to the prompt that creates every project anew
+            logger.debug("No project of the diary matched a known project, offering all projects to the extraction.")
+            return projects
+        logger.info(f"Pre-selected {len(candidates)} of {len(projects)} projects for the extraction.")
+        return candidates
+
+    async def resolve_extracted_project(self, notion_helper: AsyncNotionHelpers, result, task_index=None) -> Optional[Dict]:
+        """
+        Creates an extracted project if it is new and looks up the task names of an existing one.
+
+        Args:
+            notion_helper (AsyncNotionHelpers): The Notion client.
+            result (dict): One project as returned by `extract_projects`.
+            task_index (dict, optional): Existing task names per project ID from `get_tasks_by_projects`.
+                Projects missing from the index are queried individually.
+
+        Returns:
+            dict: `project_name`, `project_id` and `task_names` of the project, or None if it was
+                skipped or failed (the error is logged).
+        """
+        project_id = None
+        task_index = task_index or {}
         try:
-            model = ChatOpenAI(model_name='chatgpt-4o-latest', temperature=0, api_key=OPENAI_KEY)
-            if not projects_names:
-                extract_prompt = self.read_md_to_formattable_string(os.path.join('data', 'identify_all_projects.md'))
+            project_name = result.get("project_name")
+            if result.get("new_project") == True:
+                logger.info(f"Adding new project: {project_name}.")
+                project_id, status = await notion_helper.add_project(
+                    project_name=project_name,
+                    status="Backlog",
+                    owner=["4ec785d6-aaa2-473f-b892-2dab634925b0"],  # Replace with actual user ID(s)
+                    priority="Low",
+                    summary=result.get("summary")
+                )
+                if not project_id:
+                    logger.error(status)
+                    return None
+                # A project created just now has no tasks yet
+                task_names_list = []
+            elif result.get("new_project") == False:
+                project_id = result.get("project_id")
+                task_names_list = task_index.get(project_id)
+                if task_names_list is None:
+                    task_names_list = await notion_helper.get_tasks_by_project(project_id)
             else:
-                extract_prompt = self.read_md_to_formattable_string(os.path.join('data', 'extract_projects_prompt_json.md'))
-            prompt_template = ChatPromptTemplate.from_messages([("system", extract_prompt)])
-            parser = JsonOutputParser(pydantic_object=ProjectOutput)
-            chain = prompt_template | model | parser
-           
-            result = chain.invoke({"projects_names": projects_names,  "json_format": parser.get_format_instructions(), "input": dairy_txt})
-
-            try: 
-                result = json.dumps(result)
-            except Exception as json_err:
-                logging.error(f"Error converting result to JSON: {json_err}")
-                err_fix_parser = OutputFixingParser.from_llm(parser=parser, llm=model)
-                result = err_fix_parser.parse(result)
-            
-            try:
-                data = json.loads(result)
-                return data
-            except json.JSONDecodeError as decode_err:
-                logging.error(f"Error decoding JSON: {decode_err}")
-                return ""
-            except TypeError as type_err:
-                logging.error(f"Type error processing JSON data: {type_err}")
-                return ""
-            except Exception as e:
-                logging.error(f"Unexpected error processing JSON data: {e}")
-                return ""
-            
-           
+                logger.warning(f"Unexpected result format: {result}")
+                return None
+            self.index.replace((((project_id, name), name) for name in task_names_list), project_id)
+            return {"project_name": project_name, "project_id": project_id, "task_names": task_names_list}
         except Exception as e:
-            logging.error(f"Error generating case study: {e}", exc_info=True)
-            return "" 
-    
-    
-        
-    def identify_tasks_for_project(self, projects_name, existing_tasks, dairy_txt) -> str:
+            logger.error(f"Error while processing project {result} (ID: {project_id}): {e}", exc_info=True)
+            return None
+
+    async def identify_project_tasks(self, project: Dict, dairy_txt):
+        """ Identifies the tasks of one resolved project with its own LLM call."""
+        if project["task_names"]:
+            task_names_string = "\n".join(self.relevant_task_names(project, dairy_txt)) + "\n"
+            return await self.identify_tasks_for_project(project["project_name"], task_names_string, dairy_txt)
+        return await self.identify_initial_tasks_for_projects(project["project_name"], dairy_txt)
+
+    def relevant_task_names(self, project: Dict, dairy_txt: str) -> List[str]:
+        """
+        The existing tasks of a project that the diary most likely refers to.
+
+        Mature projects have more tasks than are useful in a prompt, so only the
+        `relevant_tasks` most similar to any sentence of the diary are kept, in their
+        original order. Duplicates of the omitted tasks are still caught by `add_new_tasks`.
+
+        Args:
+            project (dict): The project as returned by `resolve_extracted_project`.
+            dairy_txt (str): The raw diary text.
+
+        Returns:
+            list: Task names.
+        """
+        task_names = project["task_names"]
+        if self.relevant_tasks <= 0 or len(task_names) <= self.relevant_tasks:
+            return task_names
+        relevant = {key for key, _, _ in self.index.relevant(dairy_txt, k=self.relevant_tasks, group=project["project_id"])}
+        selected = [name for name in task_names if (project["project_id"], name) in relevant]
+        logger.debug(f"Offering {len(selected)} of {len(task_names)} existing tasks of {project['project_name']}.")
+        return selected
+
+    def drop_duplicate_tasks(self, project_id: str, task_names: List[str]) -> List[str]:
+        """
+        Removes new tasks that duplicate an existing task of the project or an earlier new task.
+
+        Args:
+            project_id (str): The project the tasks are added to.
+            task_names (list): Names of the new tasks.
+
+        Returns:
+            list: The task names to create.
+        """
+        kept: List[str] = []
+        if not task_names:
+            return kept
+        vectors = embed(task_names, self.index.dim)
+        kept_rows: List[int] = []
+        for row, name in enumerate(task_names):
+            duplicate = self.index.duplicate_of(name, project_id, self.duplicate_threshold)
+            if duplicate:
+                logger.info(f"Skipping new task '{name}', it duplicates the existing task '{duplicate[1]}'.")
+                continue
+            if any(float(vectors[kept_row] @ vectors[row]) >= self.duplicate_threshold and same_numbers(name, task_names[kept_row])
+                   for kept_row in kept_rows):
+                logger.info(f"Skipping new task '{name}', it duplicates another new task.")
+                continue
+            kept.append(name)
+            kept_rows.append(row)
+        return kept
+
+    async def add_new_tasks(self, notion_helper: AsyncNotionHelpers, project: Dict, task_results):
         """
+        Adds the tasks marked as new to the project in Notion, skipping duplicates of known tasks.
+
+        Args:
+            notion_helper (AsyncNotionHelpers): The Notion client.
+            project (dict): The project as returned by `resolve_extracted_project`.
+            task_results: Tasks as returned by the task identification, a list or a single dict.
         """
+        project_id = project["project_id"]
+        # Ensure task_results is a list
+        if isinstance(task_results, dict):
+            task_results = [task_results]  # Convert to a single-item list
+        elif not isinstance(task_results, list):
+            logger.warning(f"Unexpected task_results type: {type(task_results)}. Defaulting to empty list.")
+            task_results = []
+
+        task_names = [task.get("task_name") for task in task_results
+                      if isinstance(task, dict) and task.get("new_task") and task.get("task_name")]
+        tasks = []
+        for task_name in self.drop_duplicate_tasks(project_id, task_names):
+            tasks.append(
+                {
+                    "task_name": task_name,
+                    "status": "Not Started",
+                    "priority": "Low",
+                    "assignee": ["4ec785d6-aaa2-473f-b892-2dab634925b0"]  # Replace with actual user IDs
+                }
+            )
+        if tasks:
+            logger.info(f"Adding {len(tasks)} tasks to project ID {project_id}.")
+            add_results = await notion_helper.add_tasks_to_project(project_id, tasks)
+            logger.debug(f"Add tasks result: {notion_helper.format_task_results(add_results)}")
+            created = [result["task_name"] for result in add_results if result["task_id"]]
+            self.index.add((((project_id, name), name) for name in created), project_id)
+
+    async def extract_projects(self, projects_names, dairy_txt) -> list:
+        """ Extracts project details from diary text."""
+        try:
+            stage = self.llm.stage("extract_projects" if projects_names else "identify_all_projects")
+            projects = await stage.chain.ainvoke({"projects_names": projects_names, "input": dairy_txt})
+            return [project.model_dump(mode="json") for project in projects]
+        except Exception as e:
+            logging.error(f"Error extracting projects: {e}", exc_info=True)
+            return []
+        
+    async def identify_tasks_for_project(self, projects_name, existing_tasks, dairy_txt) -> list:
+        """ Identifies the tasks of a project with existing tasks in the diary text."""
         try:
             if not OPENAI_KEY:
                 logger.error("OpenAI API key is not set in environment variables.")
                 raise ValueError("OpenAI API key is not set.")
-            model = ChatOpenAI(model_name='chatgpt-4o-latest', temperature = 0, api_key=OPENAI_KEY)
-
-            identify_prompt = self.read_md_to_formattable_string(os.path.join('data', 'identify_tasks_for_project.md'))
-            #prompt_template = ChatPromptTemplate.from_messages([("system", dairy_prompt), "user", dairy_txt])
-            prompt_template = ChatPromptTemplate.from_messages([("system", identify_prompt)])
-
-            parser = JsonOutputParser(pydantic_object=Task)
-            chain = prompt_template | model | parser
-            
-            #result = chain.invoke({"dairy_example_input": dairy_example_input, "dairy_example_output": dairy_example_output})
-            result = chain.invoke({"projects_name": projects_name,  "json_format": parser.get_format_instructions(), "input": dairy_txt, "existing_tasks": existing_tasks})
-
-            try: 
-                result = json.dumps(result)
-            except Exception as json_err:
-                logging.error(f"Error converting result to JSON: {json_err}")
-                err_fix_parser = OutputFixingParser.from_llm(parser=parser, llm=model)
-                result = err_fix_parser.parse(result)
-            
-            try:
-                data = json.loads(result)
-                #output_data = {key: "\n".join(value) if isinstance(value, list) else value for key, value in data.items()}
-                #output_json = json.dumps(output_data, indent=4)
-                return data#, output_json
-            except json.JSONDecodeError as decode_err:
-                logging.error(f"Error decoding JSON: {decode_err}")
-                return ""
-            except TypeError as type_err:
-                logging.error(f"Type error processing JSON data: {type_err}")
-                return ""
-            except Exception as e:
-                logging.error(f"Unexpected error processing JSON data: {e}")
-                return ""
-            
-           
+            stage = self.llm.stage("identify_tasks")
+            tasks = await stage.chain.ainvoke({"projects_name": projects_name, "input": dairy_txt, "existing_tasks": existing_tasks})
+            return [task.model_dump(mode="json") for task in tasks]
         except Exception as e:
-            logging.error(f"Error generating case study: {e}")
-            return ""         
+            logging.error(f"Error identifying tasks for project {projects_name}: {e}")
+            return []
     
-    def identify_initial_tasks_for_projects(self, projects_name, dairy_txt) -> str:
+    async def identify_initial_tasks_for_projects(self, projects_name, dairy_txt) -> list:
+        """ Identifies the tasks of a project without existing tasks in the diary text."""
+        try:
+            if not OPENAI_KEY:
+                logger.error("OpenAI API key is not set in environment variables.")
+                raise ValueError("OpenAI API key is not set.")
+            stage = self.llm.stage("initial_tasks")
+            tasks = await stage.chain.ainvoke({"projects_name": projects_name, "input": dairy_txt})
+            return [task.model_dump(mode="json") for task in tasks]
+        except Exception as e:
+            logging.error(f"Error identifying initial tasks for project {projects_name}: {e}")
+            return []
+
+    async def identify_tasks_for_projects(self, projects: List[Dict], dairy_txt) -> Optional[Dict[int, list]]:
         """
+        Identifies the tasks of several projects with a single LLM call, so the diary is sent only once.
+
+        Args:
+            projects (list): Projects as returned by `resolve_extracted_project`.
+            dairy_txt (str): The raw diary text.
+
+        Returns:
+            dict: The tasks per project, keyed by the project's 1-based position in `projects`.
+                None if the prompt would exceed the token budget or the call failed, in which
+                case the caller identifies the tasks per project.
         """
+        if self.task_batch_token_budget <= 0:
+            return None
         try:
             if not OPENAI_KEY:
                 logger.error("OpenAI API key is not set in environment variables.")
                 raise ValueError("OpenAI API key is not set.")
-            model = ChatOpenAI(model_name='chatgpt-4o-latest', temperature = 0, api_key=OPENAI_KEY)
+            projects_block = "\n\n".join(
+                f"Project {ref}: {project['project_name']}\nExisting Task Names:\n"
+                + ("\n".join(f"- {name}" for name in self.relevant_task_names(project, dairy_txt)) or "(none)")
+                for ref, project in enumerate(projects, start=1)
+            )
+            stage = self.llm.stage("identify_tasks_batch")
+            prompt_chars = (len(self.llm.prompt_text("identify_tasks_batch")) + len(stage.parser.get_format_instructions())
+                            + len(projects_block) + len(dairy_txt))
+            estimated_tokens = prompt_chars // CHARS_PER_TOKEN
+            if estimated_tokens > self.task_batch_token_budget:
+                logger.info(f"Batched task prompt (~{estimated_tokens} tokens) exceeds the budget of "
+                            f"{self.task_batch_token_budget}, identifying tasks per project.")
+                return None
 
-            identify_prompt = self.read_md_to_formattable_string(os.path.join('data', 'initial_task_creation.md'))
-            #prompt_template = ChatPromptTemplate.from_messages([("system", dairy_prompt), "user", dairy_txt])
-            prompt_template = ChatPromptTemplate.from_messages([("system", identify_prompt)])
+            results = await stage.chain.ainvoke({"projects": projects_block, "input": dairy_txt})
 
-            parser = JsonOutputParser(pydantic_object=Task)
-            chain = prompt_template | model | parser
-            
-            #result = chain.invoke({"dairy_example_input": dairy_example_input, "dairy_example_output": dairy_example_output})
-            result = chain.invoke({"projects_name": projects_name,  "json_format": parser.get_format_instructions(), "input": dairy_txt})
-
-            try: 
-                result = json.dumps(result)
-            except Exception as json_err:
-                logging.error(f"Error converting result to JSON: {json_err}")
-                err_fix_parser = OutputFixingParser.from_llm(parser=parser, llm=model)
-                result = err_fix_parser.parse(result)
-            
-            try:
-                data = json.loads(result)
-                #output_data = {key: "\n".join(value) if isinstance(value, list) else value for key, value in data.items()}
-                #output_json = json.dumps(output_data, indent=4)
-                return data#, output_json
-            except json.JSONDecodeError as decode_err:
-                logging.error(f"Error decoding JSON: {decode_err}")
-                return ""
-            except TypeError as type_err:
-                logging.error(f"Type error processing JSON data: {type_err}")
-                return ""
-            except Exception as e:
-                logging.error(f"Unexpected error processing JSON data: {e}")
-                return ""
-            
-           
+            tasks_by_ref: Dict[int, list] = {}
+            for item in results:
+                if 1 <= item.project_ref <= len(projects):
+                    tasks_by_ref.setdefault(item.project_ref, []).extend(task.model_dump(mode="json") for task in item.tasks)
+                else:
+                    logger.warning(f"Batched task result with unknown project_ref {item.project_ref}, ignoring it.")
+            logger.debug(f"Identified tasks for {len(tasks_by_ref)} of {len(projects)} projects in one call.")
+            return tasks_by_ref
         except Exception as e:
-            logging.error(f"Error generating case study: {e}")
-            return ""
\ No newline at end of file
+            logging.error(f"Error identifying tasks for all projects, falling back to per-project calls: {e}", exc_info=True)
+            return None
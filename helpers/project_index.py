@@ -0,0 +1,194 @@
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Words the diary author says before a project name, including common speech-to-text misspellings
+MENTION_PATTERN = re.compile(r"\b(?:pro[jy]e[ck]{1,2}t\w*)\b[\s:\"'„“”‚‘’»«()-]*", re.IGNORECASE)
+# Words after a mention that are considered part of the project name
+MENTION_WORDS = 5
+# Filler words that may stand between the mention and the name ("Projekt namens ...")
+MENTION_SKIP = 2
+# Candidates compared by edit distance per mention, as a multiple of k
+RERANK_FACTOR = 4
+# Minimum score of a fuzzy match; unrelated words sharing a few letters score around 0.3
+MIN_SCORE = 0.5
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.!?;\n]")
+
+
+def normalise(text: str) -> str:
+    """ Case-folds, strips diacritics (ä -> a) and reduces the text to words separated by single spaces."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(_WORD.findall(stripped))
+
+
+def trigrams(text: str) -> Set[str]:
+    """ Character trigrams of a normalised text, padded so short words and word starts count."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """ Levenshtein distance with two rows."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    """ 1 minus the edit distance relative to the longer string."""
+    if not a and not b:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+class ProjectIndex:
+    """
+    Local fuzzy index over project names.
+
+    Names are normalised and indexed by character trigrams. A query first collects
+    the projects sharing trigrams with it, ranks them by trigram overlap (Dice
+    coefficient) and then re-ranks the best of them by edit distance, which
+    tolerates the misspellings of speech-to-text. `candidates` applies this to every
+    "Projekt"/"project" mention in a diary and adds the projects named verbatim anywhere
+    in it, so the extraction prompt only needs the few existing projects that could have
+    been meant.
+    """
+
+    def __init__(self, projects: Iterable[dict], name_key: str = "project_name"):
+        """
+        Args:
+            projects (iterable of dict): Projects as returned by `query_all_projects`.
+            name_key (str): Key of the project name.
+        """
+        self.projects: List[dict] = []
+        self._names: List[str] = []
+        self._trigrams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for project in projects:
+            name = normalise(project.get(name_key) or "")
+            if not name:
+                continue
+            number = len(self.projects)
+            self.projects.append(project)
+            self._names.append(name)
+            grams = trigrams(name)
+            self._trigrams.append(grams)
+            for gram in grams:
+                self._postings[gram].append(number)
+
+    def __len__(self) -> int:
+        return len(self.projects)
+
+    def search(self, query: str, k: int = 5, min_score: float = MIN_SCORE) -> List[Tuple[dict, float]]:
+        """
+        Returns up to k projects whose names best match the query.
+
+        The query may be longer than the name (e.g. the words following a mention), so
+        it is compared word window by word window, see `_score`.
+
+        Args:
+            query (str): The (possibly misspelled) project name.
+            k (int): Maximum number of results.
+            min_score (float): Minimum combined score between 0 and 1.
+
+        Returns:
+            list: Tuples of (project, score), best first.
+        """
+        query = normalise(query)
+        if not query or k <= 0:
+            return []
+        query_words = query.split()
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in trigrams(query):
+            for number in self._postings.get(gram, ()):
+                overlap[number] += 1
+        if not overlap:
+            return []
+
+        shortlist = sorted(overlap, key=lambda number: overlap[number] / len(self._trigrams[number]), reverse=True)
+        scored = []
+        for number in shortlist[:k * RERANK_FACTOR]:
+            score = self._score(number, query_words)
+            if score >= min_score:
+                scored.append((self.projects[number], score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def _score(self, number: int, query_words: List[str]) -> float:
+        """
+        Best mean of trigram Dice coefficient and edit distance similarity between the name
+        and a window of the query words. Windows start at one of the first MENTION_SKIP + 1
+        words (to skip fillers like "namens" or "für") and have about as many words as the name.
+        """
+        name = self._names[number]
+        name_grams = self._trigrams[number]
+        words = len(name.split())
+        best = 0.0
+        for start in range(min(MENTION_SKIP + 1, len(query_words))):
+            for length in range(max(1, words - 1), words + 2):
+                window = " ".join(query_words[start:start + length])
+                window_grams = trigrams(window)
+                dice = 2 * len(name_grams & window_grams) / (len(name_grams) + len(window_grams))
+                best = max(best, (dice + similarity(name, window)) / 2)
+        return best
+
+    def mentions(self, text: str, words: int = MENTION_WORDS) -> List[str]:
+        """ The words following every "Projekt"/"project" in the text, up to the end of the sentence."""
+        result = []
+        for match in MENTION_PATTERN.finditer(text):
+            rest = text[match.end():match.end() + 200]
+            end = _SENTENCE_END.search(rest)
+            phrase = " ".join(_WORD.findall(rest[:end.start()] if end else rest)[:words])
+            if phrase:
+                result.append(phrase)
+        return result
+
+    def verbatim(self, text: str) -> List[dict]:
+        """ The projects whose normalised name appears as whole words in the text, e.g. "Tagebuch AI"."""
+        padded = f" {normalise(text)} "
+        return [project for project, name in zip(self.projects, self._names) if f" {name} " in padded]
+
+    def candidates(self, text: str, k: int = 5, min_score: float = MIN_SCORE) -> Optional[List[dict]]:
+        """
+        Pre-selects the projects the text may refer to: those named verbatim, then the best
+        fuzzy matches of every "Projekt"/"project" mention.
+
+        Args:
+            text (str): The diary text.
+            k (int): Maximum candidates per mention.
+            min_score (float): Minimum score of a candidate.
+
+        Returns:
+            list: The candidate projects, verbatim names first, then fuzzy matches by score, without
+                duplicates; empty if no mention resembles a known project. None if the text neither
+                mentions a project nor names one, callers should then fall back to all projects.
+        """
+        mentions = self.mentions(text)
+        named = self.verbatim(text)
+        if not mentions and not named:
+            return None
+        # Verbatim names rank above any fuzzy match, whose scores are at most 1
+        best: Dict[int, Tuple[dict, float]] = {id(project): (project, 2.0) for project in named}
+        for phrase in mentions:
+            for project, score in self.search(phrase, k, min_score):
+                if id(project) not in best or best[id(project)][1] < score:
+                    best[id(project)] = (project, score)
+        ranked = sorted(best.values(), key=lambda item: item[1], reverse=True)
+        logger.debug(f"{len(named)} named projects and {len(mentions)} project mentions matched "
+                     f"{len(ranked)} of {len(self.projects)} projects.")
+        return [project for project, _ in ranked]
@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Prompt files live in data/ next to the helpers package, independent of the working directory
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# Minimum number of seconds between two mtime checks of the same prompt file
+PROMPT_CHECK_INTERVAL = float(os.getenv("PromptCheckInterval", "2"))
+
+
+@dataclass
+class _Prompt:
+    text: str
+    mtime: float
+    checked: float
+
+
+class PromptStore:
+    """
+    In-memory store for the prompt files in data/.
+
+    Every prompt is read once (all of them with `load_all` at startup) and then
+    served from memory. At most every `check_interval` seconds a prompt's file
+    is stat'ed, and it is only re-read when its mtime changed, so edited
+    prompts go live without a restart.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, check_interval: float = PROMPT_CHECK_INTERVAL):
+        """
+        Args:
+            data_dir (str): Directory containing the prompt files.
+            check_interval (float): Minimum seconds between two mtime checks of a file.
+        """
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self._prompts: Dict[str, _Prompt] = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        """ Reads every markdown file in the data directory into memory."""
+        for file_name in sorted(os.listdir(self.data_dir)):
+            if file_name.endswith(".md"):
+                self._load(file_name)
+        logger.info(f"Loaded {len(self._prompts)} prompt files from {self.data_dir}.")
+
+    def get(self, file_name: str) -> Tuple[str, float]:
+        """
+        Returns the text of a prompt file and the mtime of the loaded version.
+
+        Args:
+            file_name (str): File name relative to the data directory.
+
+        Raises:
+            OSError: If the file has never been loaded and cannot be read.
+        """
+        prompt = self._prompts.get(file_name)
+        if prompt is None:
+            return self._load(file_name)
+
+        now = time.monotonic()
+        if now - prompt.checked >= self.check_interval:
+            prompt.checked = now
+            try:
+                mtime = os.path.getmtime(self._path(file_name))
+            except OSError as e:
+                logger.error(f"Error checking prompt file {file_name}, keeping loaded version: {e}")
+                return prompt.text, prompt.mtime
+            if mtime != prompt.mtime:
+                logger.info(f"Prompt file {file_name} changed, reloading.")
+                return self._load(file_name)
+        return prompt.text, prompt.mtime
+
+    def text(self, file_name: str) -> str:
+        """ Returns the current text of a prompt file."""
+        return self.get(file_name)[0]
+
+    def _load(self, file_name: str) -> Tuple[str, float]:
+        path = self._path(file_name)
+        with self._lock:
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+            self._prompts[file_name] = _Prompt(text=text, mtime=mtime, checked=time.monotonic())
+        logger.debug(f"Successfully read markdown file: {path}")
+        return text, mtime
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.data_dir, file_name)
+
+
+# Shared by all helpers in the process
+PROMPT_STORE = PromptStore()
@@ -0,0 +1,240 @@
+import logging
+import math
+import os
+import re
+import zlib
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .project_index import normalise
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+# Dimensions of the hashed embeddings
+SEMANTIC_INDEX_DIM = int(os.getenv("SemanticIndexDim", "512"))
+# Weight of the character trigrams of a word relative to the word itself
+TRIGRAM_WEIGHT = 0.5
+
+# Frequent German and English words that carry no meaning for matching tasks
+STOPWORDS = frozenset("""
+der die das den dem des ein eine einen einem einer und oder aber mit fur von zu zum zur im in am an auf aus bei
+ist sind war hat habe ich du er sie es wir ihr mich mir mein meine nicht noch auch dass so wie was als nach
+the a an and or of to for in on at by with from is are was be it this that my i we you not
+""".split())
+
+# Group code of removed rows
+REMOVED = -1
+# Removed rows tolerated before the matrix is compacted, at least this many and at least as many as live rows
+COMPACT_MIN_REMOVED = 256
+
+_SENTENCE = re.compile(r"[^.!?\n]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def _features(text: str) -> Dict[int, float]:
+    """ Hashed bag of words and word trigrams, with sublinear term frequencies and signed buckets."""
+    counts: Dict[str, float] = {}
+    for word in normalise(text).split():
+        if word in STOPWORDS:
+            continue
+        counts[f"w:{word}"] = counts.get(f"w:{word}", 0.0) + 1.0
+        padded = f" {word} "
+        for start in range(len(padded) - 2):
+            gram = f"t:{padded[start:start + 3]}"
+            counts[gram] = counts.get(gram, 0.0) + TRIGRAM_WEIGHT
+    return {zlib.crc32(feature.encode("utf-8")): 1.0 + math.log(count) if count >= 1 else count
+            for feature, count in counts.items()}
+
+
+def same_numbers(a: str, b: str) -> bool:
+    """ Whether both texts contain the same numbers; "Chapter 1" and "Chapter 2" are similar but no duplicates."""
+    return set(_NUMBER.findall(a)) == set(_NUMBER.findall(b))
+
+
+def embed(texts: Iterable[str], dim: int = SEMANTIC_INDEX_DIM) -> np.ndarray:
+    """
+    Embeds texts as L2-normalised hashed feature vectors, so the dot product of two rows is
+    their cosine similarity. Word trigrams make the vectors tolerant to misspellings and
+    inflections ("Skizze"/"Skizzen"). Texts without features get a zero row.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), dim).
+    """
+    texts = list(texts)
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        features = _features(text)
+        if not features:
+            continue
+        hashes = np.fromiter(features.keys(), dtype=np.uint32, count=len(features))
+        weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        signs = np.where((hashes >> 31) & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(vectors[row], (hashes % dim).astype(np.intp), weights * signs)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class SemanticIndex:
+    """
+    In-process vector index over short texts such as project and task names.
+
+    Texts are embedded with `embed` and kept in one growing NumPy matrix, so a query
+    against all of them is a single matrix product. Every entry has a key (e.g. the
+    task's project and name) and a group (e.g. the project ID), searches can be limited
+    to a group. Entries are added incrementally, adding an existing key again replaces it.
+    Removed entries are masked and the matrix is compacted once they outnumber the live ones.
+    """
+
+    def __init__(self, dim: int = SEMANTIC_INDEX_DIM, capacity: int = 1024):
+        """
+        Args:
+            dim (int): Dimensions of the embeddings.
+            capacity (int): Initial number of rows; the matrix doubles when it is full.
+        """
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._groups = np.zeros(capacity, dtype=np.int64)
+        self._keys: List[Hashable] = []
+        self._texts: List[str] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._group_ids: Dict[Hashable, int] = {}
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    def add(self, items: Iterable[Tuple[Hashable, str]], group: Hashable = None):
+        """
+        Adds or replaces entries.
+
+        Args:
+            items (iterable): Tuples of (key, text).
+            group (hashable): Group of the entries, e.g. a project ID.
+        """
+        group_id = self._group_ids.setdefault(group, len(self._group_ids))
+        new = [(key, text) for key, text in items if not self._unchanged(key, text, group_id)]
+        if not new:
+            return
+        vectors = embed((text for _, text in new), self.dim)
+        for (key, text), vector in zip(new, vectors):
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._keys)
+                self._grow(row + 1)
+                self._rows[key] = row
+                self._keys.append(key)
+                self._texts.append(text)
+            else:
+                self._texts[row] = text
+            self._vectors[row] = vector
+            self._groups[row] = group_id
+
+    def replace(self, items: Iterable[Tuple[Hashable, str]], group: Hashable = None):
+        """ Makes the given entries the complete contents of the group, removing its other entries."""
+        items = list(items)
+        keep = {key for key, _ in items}
+        group_id = self._group_ids.get(group)
+        if group_id is not None:
+            self.remove(key for key, row in self._rows.items() if self._groups[row] == group_id and key not in keep)
+        self.add(items, group)
+
+    def remove(self, keys: Iterable[Hashable]):
+        """ Removes entries. Their rows are cleared and no longer match any search."""
+        for key in list(keys):
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._vectors[row] = 0.0
+                self._groups[row] = REMOVED
+                self._removed += 1
+        if self._removed >= max(COMPACT_MIN_REMOVED, len(self._rows)):
+            self._compact()
+
+    def search(self, queries: Iterable[str], k: int = 10, group: Hashable = None,
+               min_score: float = 0.0) -> List[Tuple[Hashable, str, float]]:
+        """
+        Returns the entries most similar to any of the queries.
+
+        Each entry is scored with its best cosine similarity over all queries, so a diary
+        split into sentences finds the tasks any of its sentences is about.
+
+        Args:
+            queries (iterable of str): Query texts.
+            k (int): Maximum number of results.
+            group (hashable, optional): Only search entries of this group.
+            min_score (float): Minimum cosine similarity.
+
+        Returns:
+            list: Tuples of (key, text, score), best first.
+        """
+        queries = [query for query in queries if query.strip()]
+        count = len(self._keys)
+        if not queries or not count or k <= 0:
+            return []
+        rows = np.arange(count)
+        if group is None:
+            rows = rows[self._groups[:count] != REMOVED]
+        else:
+            group_id = self._group_ids.get(group)
+            if group_id is None:
+                return []
+            rows = rows[self._groups[:count] == group_id]
+            if not len(rows):
+                return []
+        scores = (self._vectors[rows] @ embed(queries, self.dim).T).max(axis=1)
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._keys[rows[i]], self._texts[rows[i]], float(scores[i])) for i in top if scores[i] >= min_score]
+
+    def relevant(self, text: str, k: int = 30, group: Hashable = None) -> List[Tuple[Hashable, str, float]]:
+        """ The entries most relevant to a longer text, such as a diary, matched sentence by sentence."""
+        return self.search((sentence.group(0) for sentence in _SENTENCE.finditer(text)), k=k, group=group)
+
+    def duplicate_of(self, text: str, group: Hashable = None, threshold: float = 0.8) -> Optional[Tuple[Hashable, str, float]]:
+        """
+        The most similar entry that is at least `threshold` similar to the text and mentions the
+        same numbers, else None.
+        """
+        matches = self.search([text], k=5, group=group, min_score=threshold)
+        return next((match for match in matches if same_numbers(text, match[1])), None)
+
+    def _unchanged(self, key: Hashable, text: str, group_id: int) -> bool:
+        row = self._rows.get(key)
+        return row is not None and self._texts[row] == text and self._groups[row] == group_id
+
+    def _compact(self):
+        """ Drops the removed rows, keeping the live ones in order."""
+        live = sorted(self._rows.values())
+        capacity = max(len(self._vectors) // 2, 2 * len(live), 1)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        groups = np.zeros(capacity, dtype=np.int64)
+        vectors[:len(live)] = self._vectors[live]
+        groups[:len(live)] = self._groups[live]
+        self._keys = [self._keys[row] for row in live]
+        self._texts = [self._texts[row] for row in live]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._vectors, self._groups = vectors, groups
+        self._removed = 0
+
+    def _grow(self, size: int):
+        if size <= len(self._vectors):
+            return
+        capacity = max(size, 2 * len(self._vectors))
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:len(self._keys)] = self._vectors[:len(self._keys)]
+        groups = np.zeros(capacity, dtype=np.int64)
+        groups[:len(self._keys)] = self._groups[:len(self._keys)]
+        self._vectors, self._groups = vectors, groups
+
+
+# Shared by all diaries in the process
+SEMANTIC_INDEX = SemanticIndex()
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from .diary_metrics import DIARY_METRICS
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _StageNode:
+    func: Callable[..., Awaitable[Any]]
+    deps: Tuple[str, ...]
+
+
+class StageGraph:
+    """
+    A small dependency graph of async stages.
+
+    Every stage is a coroutine function that receives the results of the stages
+    it depends on as keyword arguments. `run` starts all stages at once; each
+    stage waits only for its own dependencies, so independent branches run
+    concurrently and join wherever a stage depends on more than one of them.
+    Each stage is timed and accounted as a stage of the current diary's metrics.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, _StageNode] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], deps: Tuple[str, ...] = ()) -> "StageGraph":
+        """
+        Adds a stage to the graph.
+
+        Args:
+            name (str): Unique stage name, also the keyword its result is passed under.
+            func (callable): Coroutine function called with the results of `deps` as keyword arguments.
+            deps (tuple): Names of stages that have to finish first; they must already be added.
+
+        Returns:
+            StageGraph: The graph itself, for chaining.
+        """
+        if name in self._nodes:
+            raise ValueError(f"Stage {name} is already defined.")
+        missing = [dep for dep in deps if dep not in self._nodes]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(missing)}")
+        self._nodes[name] = _StageNode(func=func, deps=tuple(deps))
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Runs all stages, each as soon as its dependencies are done.
+
+        Returns:
+            dict: The result of every stage by name.
+
+        Raises:
+            Exception: The first stage error, after every other stage has finished or
+                been skipped because one of its dependencies failed.
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, node: _StageNode):
+            kwargs = {dep: await tasks[dep] for dep in node.deps}
+            logger.debug(f"Starting stage {name}.")
+            with DIARY_METRICS.stage(name):
+                return await node.func(**kwargs)
+
+        # Stages can only depend on earlier ones, so insertion order is a topological order
+        for name, node in self._nodes.items():
+            tasks[name] = asyncio.ensure_future(run_stage(name, node))
+
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+        return dict(zip(tasks, results))
@@ -1,7 +1,7 @@
 
 from datetime import date
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class Task(BaseModel):
@@ -15,4 +15,19 @@ class ProjectOutput(BaseModel):
     project_id: Optional[str] = Field(description="Id of the project of existing project.") 
     project_name: str = Field(description="Name of the project.")
     summary: str = Field(description="Brief description or summary of the project.")
-    new_project: bool = Field(description="Indicates if this is a new project.")
\ No newline at end of file
+    new_project: bool = Field(description="Indicates if this is a new project.")
+
+class ProjectTasks(BaseModel):
+    project_ref: int = Field(description="Number of the project in the given project list.")
+    project_name: str = Field(description="Name of the project.")
+    tasks: List[Task] = Field(description="Tasks of the project found in the diary entry.")
+
+
+class ProjectOutputList(BaseModel):
+    items: List[ProjectOutput] = Field(description="All projects found in the diary entry.")
+
+class TaskList(BaseModel):
+    items: List[Task] = Field(description="All tasks found in the diary entry.")
+
+class ProjectTasksList(BaseModel):
+    items: List[ProjectTasks] = Field(description="One entry per given project.")
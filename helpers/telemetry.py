@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .llm_cache import LLM_CACHE
+from .notion_mirror import NOTION_MIRROR
+from .notion_rate_limiter import NOTION_RATE_LIMITER
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """ The exposition lines of the metric's values."""
+
+
+class Counter(_Metric):
+    """ A monotonically increasing value per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        with self._lock:
+            self._values[_labels(labels)] += amount
+
+    def set_total(self, value: float, **labels: Any):
+        """ Mirrors a total that is counted elsewhere, e.g. in a collector."""
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(labels)} {value}" for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """ A value per label set that can go up and down."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Labels, float] = defaultdict(float)
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        with self._lock:
+            self._values[_labels(labels)] += amount
+
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(labels)} {value}" for labels, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """ Cumulative bucket counts, sum and count of observations per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: Any):
+        key = _labels(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """ Observes the duration of the block in seconds."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for labels, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {self._sums[labels]}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Dependency-free registry rendering the Prometheus text exposition format.
+
+    Besides the metrics updated in place, collectors run on every scrape and can
+    refresh gauges and counters from state kept elsewhere (queue depth, rate
+    limiter counters, cache statistics).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """ Registers a function that updates metrics right before they are rendered."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """ Runs the collectors and returns all metrics in the Prometheus text format."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Error in metrics collector {collector}: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            return self._metrics[metric.name]
+        self._metrics[metric.name] = metric
+        return metric
+
+
+@dataclass
+class Span:
+    """ One timed operation of a trace."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    duration: float = 0.0
+    status: str = "ok"
+
+
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Lightweight tracing with spans kept in a context variable.
+
+    A span opened while another one is active becomes its child and shares its
+    trace ID; tasks started inside a span inherit it. Finished spans are logged
+    as JSON on the "helpers.telemetry" logger at DEBUG level and passed to the
+    registered listeners.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[Span], None]] = []
+
+    def add_listener(self, listener: Callable[[Span], None]):
+        """ Registers a function called with every finished span."""
+        self._listeners.append(listener)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """ Opens a span for the block; errors mark it as failed and propagate."""
+        parent = _CURRENT_SPAN.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        token = _CURRENT_SPAN.set(span)
+        started = time.monotonic()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = f"error: {type(e).__name__}"
+            raise
+        finally:
+            span.duration = time.monotonic() - started
+            _CURRENT_SPAN.reset(token)
+            self._finish(span)
+
+    def current(self) -> Optional[Span]:
+        """ Returns the active span, if any."""
+        return _CURRENT_SPAN.get()
+
+    def _finish(self, span: Span):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Span: {json.dumps(span.__dict__, default=str)}")
+        for listener in self._listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                logger.error(f"Error in span listener: {e}")
+
+
+class _LLMLatencyCallback(BaseCallbackHandler):
+    """ Observes the latency of every chat model call in LLM_LATENCY."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[float, str]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any):
+        model = (kwargs.get("invocation_params") or {}).get("model") or (kwargs.get("invocation_params") or {}).get("model_name", "")
+        self._started[run_id] = (time.monotonic(), model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        self._observe(run_id, "ok")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._observe(run_id, "error")
+
+    def _observe(self, run_id: UUID, outcome: str):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_LATENCY.observe(time.monotonic() - started[0], model=started[1], outcome=outcome)
+
+
+# Shared by the whole process
+METRICS = MetricsRegistry()
+TRACER = Tracer()
+
+HTTP_REQUESTS = METRICS.counter("bot_http_requests_total", "HTTP requests by route and status.")
+HTTP_LATENCY = METRICS.histogram("bot_http_request_duration_seconds", "HTTP request latency by route.")
+TURNS_IN_FLIGHT = METRICS.gauge("bot_turns_in_flight", "Bot Framework turns currently being processed.")
+QUEUE_DEPTH = METRICS.gauge("bot_diary_queue_depth", "Diaries waiting for a worker.")
+STAGE_LATENCY = METRICS.histogram("bot_diary_stage_duration_seconds", "Latency of diary pipeline stages.")
+NOTION_LATENCY = METRICS.histogram("notion_request_duration_seconds", "Notion API latency per attempt by endpoint.")
+NOTION_EVENTS = METRICS.counter("notion_requests_events_total", "Notion requests, retries, 429s and errors by endpoint.")
+LLM_LATENCY = METRICS.histogram("llm_request_duration_seconds", "Chat model call latency by model.")
+LLM_LATENCY_CALLBACK = _LLMLatencyCallback()
+EVENT_LOOP_LAG = METRICS.histogram("bot_event_loop_lag_seconds", "Delay of event loop callbacks beyond their schedule.", LAG_BUCKETS)
+LLM_CACHE_EVENTS = METRICS.counter("llm_cache_events_total", "LLM response cache hits, misses and evictions.")
+NOTION_MIRROR_EVENTS = METRICS.counter("notion_mirror_events_total", "Syncs, synced pages, local writes and reads of the Notion mirror.")
+
+
+async def monitor_event_loop_lag(interval: float = 0.25):
+    """
+    Observes how late the event loop wakes up a sleeping task, until cancelled.
+
+    Blocking calls on the loop (synchronous I/O, CPU-heavy parsing) delay every
+    other turn; they show up here as lag well above a millisecond.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - scheduled))
+
+
+def _collect_notion_events():
+    for endpoint, counters in NOTION_RATE_LIMITER.stats().items():
+        for event, count in counters.items():
+            NOTION_EVENTS.set_total(count, endpoint=endpoint, event=event)
+
+
+def _collect_llm_cache_events():
+    if LLM_CACHE is None:
+        return
+    stats = LLM_CACHE.stats()
+    for event in ("memory_hits", "disk_hits", "misses", "evictions"):
+        LLM_CACHE_EVENTS.set_total(stats.get(event, 0), event=event)
+
+
+def _collect_notion_mirror_events():
+    if NOTION_MIRROR is None:
+        return
+    stats = NOTION_MIRROR.stats()
+    for event in ("syncs", "full_syncs", "pages_synced", "local_writes", "reads"):
+        NOTION_MIRROR_EVENTS.set_total(stats.get(event, 0), event=event)
+
+
+METRICS.add_collector(_collect_notion_events)
+METRICS.add_collector(_collect_llm_cache_events)
+METRICS.add_collector(_collect_notion_mirror_events)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Make the helpers package importable when pytest is run from any directory
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
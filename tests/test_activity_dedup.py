@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import pytest
+
+# Importing the bots package validates the bot's settings
+for name in ("NotionAPIKey", "NotionDatabaseId", "OpenAIKey", "ProjectsDatabaseId", "TasksDatabaseId"):
+    os.environ.setdefault(name, "test")
+
+from bots.activity_dedup import ActivityDeduplicator  # noqa: E402
+
+KEY = ("conversation", "activity")
+
+
+def test_redelivery_after_cancelled_job_is_processed():
+    async def scenario():
+        dedup = ActivityDeduplicator()
+        assert dedup.claim(KEY) is None
+        job = asyncio.create_task(dedup.resolve(KEY, asyncio.sleep(60)))
+        await asyncio.sleep(0)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+
+        assert dedup.claim(KEY) is None
+        return await dedup.resolve(KEY, asyncio.sleep(0, result="reply"))
+
+    assert asyncio.run(scenario()) == "reply"
+
+
+def test_waiting_duplicate_takes_over_when_first_delivery_is_cancelled():
+    async def scenario():
+        dedup = ActivityDeduplicator()
+        first = asyncio.create_task(dedup.run(KEY, lambda: asyncio.sleep(60)))
+        await asyncio.sleep(0)
+        duplicate = asyncio.create_task(dedup.run(KEY, lambda: asyncio.sleep(0, result="duplicate")))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await duplicate
+
+    assert asyncio.run(scenario()) == "duplicate"
+
+
+def test_duplicate_gives_up_after_wait():
+    async def scenario():
+        dedup = ActivityDeduplicator(wait=0.01)
+        first = asyncio.create_task(dedup.run(KEY, lambda: asyncio.sleep(60)))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await dedup.run(KEY, lambda: asyncio.sleep(0))
+        first.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,21 @@
+from helpers.dairy_helpers import split_diary
+
+
+def test_split_diary_keeps_chunks_within_max_chars():
+    text = "Erstens " + "a" * 45 + ". Montag " + "b" * 10 + ". " + "c" * 24 + ". " + "d" * 94 + "."
+    chunks = split_diary(text, 100)
+    assert max(len(chunk) for chunk in chunks) <= 100
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
+
+
+def test_split_diary_counts_paragraph_breaks():
+    text = "\n\n".join(f"Absatz {number} " + "x" * 20 + "." for number in range(20))
+    chunks = split_diary(text, 120)
+    assert max(len(chunk) for chunk in chunks) <= 120
+    assert len(chunks) > 1
+
+
+def test_split_diary_cuts_at_day_boundary():
+    text = "Montag " + "a" * 30 + ". " + "b" * 30 + ". Dienstag " + "c" * 30 + ". " + "d" * 30 + "."
+    chunks = split_diary(text, 100)
+    assert chunks[1].startswith("Dienstag")
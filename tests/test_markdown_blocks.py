@@ -0,0 +1,65 @@
+from helpers.markdown_blocks import NOTION_RICH_TEXT_LIMIT, NOTION_TEXT_LIMIT, iter_notion_blocks, parse_inline
+from helpers.notion_helpers import NOTION_MAX_CHILDREN, NotionHelpers
+
+
+def runs(text):
+    return [(item["text"]["content"], set(item.get("annotations", ())), item["text"].get("link", {}).get("url"))
+            for item in parse_inline(text)]
+
+
+def test_web_and_mail_links():
+    assert runs("see [the docs](https://example.com/a_b) now") == [
+        ("see ", set(), None), ("the docs", set(), "https://example.com/a_b"), (" now", set(), None)]
+    assert runs("[mail](mailto:me@example.com)") == [("mail", set(), "mailto:me@example.com")]
+    assert runs("[**bold**](http://example.com)") == [("bold", {"bold"}, "http://example.com")]
+
+
+def test_other_link_targets_stay_text():
+    for text in ("[notes](notes.md)", "[top](#top)", "[word](here)", "[x](javascript:alert)"):
+        assert runs(text) == [(text, set(), None)]
+
+
+def test_nested_emphasis():
+    assert runs("**bold *both* bold** ~~gone~~") == [
+        ("bold ", {"bold"}, None), ("both", {"bold", "italic"}, None), (" bold", {"bold"}, None),
+        (" ", set(), None), ("gone", {"strikethrough"}, None)]
+    assert runs("***all***") == [("all", {"bold", "italic"}, None)]
+
+
+def test_unmatched_and_empty_delimiters_stay_text():
+    assert runs("2 * 3 and a **start") == [("2 * 3 and a **start", set(), None)]
+    assert runs("snake_case_name") == [("snake_case_name", set(), None)]
+    assert runs("******x") == [("******x", set(), None)]
+    assert runs("**** x") == [("**** x", set(), None)]
+
+
+def test_long_text_is_split_into_rich_text_objects():
+    text = "a" * (2 * NOTION_TEXT_LIMIT + 10)
+    contents = [item["text"]["content"] for item in parse_inline(text)]
+    assert [len(content) for content in contents] == [NOTION_TEXT_LIMIT, NOTION_TEXT_LIMIT, 10]
+    assert "".join(contents) == text
+
+
+def test_block_with_too_many_rich_text_objects_is_split():
+    # Alternating bold and plain runs, one rich text object each
+    paragraph = " ".join("**b** i" for _ in range(NOTION_RICH_TEXT_LIMIT + 1))
+    blocks = list(iter_notion_blocks(paragraph))
+    assert [len(block["paragraph"]["rich_text"]) for block in blocks] == [NOTION_RICH_TEXT_LIMIT, NOTION_RICH_TEXT_LIMIT, 2]
+
+
+def test_page_children_are_sent_in_batches():
+    helper = NotionHelpers()
+    requests = []
+
+    def request(method, endpoint, payload):
+        requests.append((method, endpoint, len(payload["children"])))
+        return {"id": "page"}
+
+    helper._request = request
+    children = [{"object": "block", "type": "divider", "divider": {}}] * (2 * NOTION_MAX_CHILDREN + 1)
+    helper.create_page({"parent": {"page_id": "parent"}, "children": children})
+    assert requests == [
+        ("POST", "/pages", NOTION_MAX_CHILDREN),
+        ("PATCH", "/blocks/page/children", NOTION_MAX_CHILDREN),
+        ("PATCH", "/blocks/page/children", 1),
+    ]
@@ -0,0 +1,39 @@
+from helpers.project_index import ProjectIndex
+
+PROJECTS = [
+    {"project_id": str(number), "project_name": name}
+    for number, name in enumerate([
+        "Garten", "Tagebuch AI", "Website Relaunch", "Kundenportal",
+        "Quantenphysik Kurs", "Steuererklärung 2024", "Umzug", "Buch schreiben",
+    ])
+]
+
+
+def names(projects):
+    return [project["project_name"] for project in projects]
+
+
+def test_unrelated_mention_selects_no_project():
+    index = ProjectIndex(PROJECTS)
+    assert "Garten" not in names(index.candidates("Heute am Projekt Quantencomputer gearbeitet."))
+
+
+def test_misspelled_mention_selects_project():
+    index = ProjectIndex(PROJECTS)
+    assert names(index.candidates("Im Projekt Websiet Relaunch die Startseite gebaut."))[0] == "Website Relaunch"
+
+
+def test_project_named_without_mention_is_selected():
+    index = ProjectIndex(PROJECTS)
+    candidates = index.candidates("Für das Projekt XYZ Angebote verglichen. Tagebuch AI: Feature bauen.")
+    assert "Tagebuch AI" in names(candidates)
+
+
+def test_named_project_without_any_mention_is_selected():
+    index = ProjectIndex(PROJECTS)
+    assert names(index.candidates("Umzug geplant und Kartons gekauft.")) == ["Umzug"]
+
+
+def test_no_mention_and_no_name_returns_none():
+    index = ProjectIndex(PROJECTS)
+    assert index.candidates("Heute war ein ruhiger Tag.") is None
@@ -0,0 +1,12 @@
+from helpers.semantic_index import COMPACT_MIN_REMOVED, SemanticIndex
+
+
+def test_replace_compacts_removed_rows():
+    index = SemanticIndex(dim=64, capacity=16)
+    for round in range(3 * COMPACT_MIN_REMOVED // 10):
+        index.replace([((round, i), f"Task {i} of round {round}") for i in range(10)], "project")
+    assert len(index) == 10
+    assert len(index._keys) < 2 * COMPACT_MIN_REMOVED
+    last = 3 * COMPACT_MIN_REMOVED // 10 - 1
+    key, text, _ = index.search([f"Task 3 of round {last}"], k=1, group="project")[0]
+    assert key == (last, 3) and text == f"Task 3 of round {last}"